@@ -0,0 +1 @@
+"""后端基准测试工具：合成数据生成、模拟 akshare 数据源和压测运行器"""
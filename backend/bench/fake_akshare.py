@@ -0,0 +1,57 @@
+"""
+模拟 akshare 数据源
+
+提供与 main.py 用到的 akshare 接口同名、同返回格式的函数，数据由 datagen 合成，
+压测时通过 install() 替换 sys.modules['akshare']，避免访问外部网络。
+"""
+import sys
+import types
+import pandas as pd
+from bench.datagen import generate_bars, make_codes, make_name, trading_days
+
+# 模拟数据的年限和种子（由运行器在 install 时设置）
+_settings = {'years': 5.0, 'seed': 0, 'stock_count': 100}
+
+
+def stock_zh_a_spot() -> pd.DataFrame:
+    """模拟A股实时行情列表（只包含代码和名称列）"""
+    codes = make_codes(_settings['stock_count'])
+    return pd.DataFrame({
+        '代码': codes,
+        '名称': [make_name(code) for code in codes],
+    })
+
+
+def stock_zh_index_daily(symbol: str) -> pd.DataFrame:
+    """模拟指数日线接口：返回 date, open, close, high, low, volume"""
+    df = generate_bars(symbol, trading_days(_settings['years']), _settings['seed'])
+    return df[['date', 'open', 'close', 'high', 'low', 'volume']]
+
+
+def stock_zh_a_hist(symbol: str, period: str = "daily", start_date: str = "19700101",
+                    end_date: str = "20500101", adjust: str = "") -> pd.DataFrame:
+    """模拟个股日线接口：返回中文列名 日期, 开盘, 收盘, 最高, 最低, 成交量"""
+    prefix = 'sh' if symbol.startswith('6') else 'sz'
+    df = generate_bars(prefix + symbol, trading_days(_settings['years']), _settings['seed'])
+    dates = pd.to_datetime(df['date'])
+    df = df[(dates >= pd.Timestamp(start_date)) & (dates <= pd.Timestamp(end_date))]
+    return df.rename(columns={
+        'date': '日期',
+        'open': '开盘',
+        'close': '收盘',
+        'high': '最高',
+        'low': '最低',
+        'volume': '成交量',
+    })[['日期', '开盘', '收盘', '最高', '最低', '成交量']]
+
+
+def install(years: float = 5.0, seed: int = 0, stock_count: int = 100):
+    """用模拟数据源替换 akshare 模块（需在导入 main 之前调用）"""
+    _settings.update(years=years, seed=seed, stock_count=stock_count)
+
+    module = types.ModuleType('akshare')
+    module.stock_zh_a_spot = stock_zh_a_spot
+    module.stock_zh_index_daily = stock_zh_index_daily
+    module.stock_zh_a_hist = stock_zh_a_hist
+    sys.modules['akshare'] = module
+    return module
@@ -0,0 +1,360 @@
+"""
+后端压测运行器
+
+用合成数据填充一个独立的基准测试库，并对数据库方法和完整的 GET /api/stock/{code}
+接口进行并发压测，输出吞吐量和 p50/p99 延迟，结果保存为 JSON 以便跨提交对比。
+
+用法（在 backend 目录下执行）：
+    python -m bench.runner run --codes 50 --years 5 --concurrency 16 --requests 1000
+    python -m bench.runner compare bench/results/a.json bench/results/b.json
+
+--backend mysql（默认）时连接参数取自 DB_HOST/DB_PORT/DB_USER/DB_PASSWORD 环境变量，
+库名默认为 stock_data_bench，每次运行都会重建（不会写入正式的 stock_data 库）；
+--backend sqlite 时在临时目录中新建数据库文件，无需数据库服务。
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from bench import fake_akshare
+from bench.datagen import generate_dataset, make_codes, make_name, trading_days
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def summarize(name: str, latencies: Sequence[float], elapsed: float, concurrency: int,
+              errors: int = 0, **extra) -> Dict:
+    """汇总单个压测场景的吞吐量和延迟分位数（毫秒）"""
+    values = np.asarray(latencies) * 1000
+    result = {
+        'name': name,
+        'ops': len(values),
+        'errors': errors,
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 4),
+        'throughput': round(len(values) / elapsed, 2) if elapsed > 0 else None,
+        'p50_ms': round(float(np.percentile(values, 50)), 3) if len(values) else None,
+        'p99_ms': round(float(np.percentile(values, 99)), 3) if len(values) else None,
+        'mean_ms': round(float(values.mean()), 3) if len(values) else None,
+    }
+    result.update(extra)
+    return result
+
+
+def measure(name: str, fn: Callable, args_list: List[tuple], concurrency: int) -> Dict:
+    """以给定并发度执行 fn(*args)，记录每次调用的耗时"""
+    latencies: List[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def call(args):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            fn(*args)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(call, args_list))
+    return summarize(name, latencies, time.perf_counter() - start, concurrency, errors)
+
+
+def prepare_database(args):
+    """设置连接环境变量并重建基准测试库"""
+    os.environ['DB_BACKEND'] = args.backend
+    if args.backend == 'sqlite':
+        path = os.path.join(tempfile.mkdtemp(prefix='stock_bench_'), f"{args.db_name}.db")
+        os.environ['SQLITE_PATH'] = path
+        return
+
+    if args.db_name == 'stock_data':
+        raise SystemExit("基准测试不能使用正式库 stock_data，请通过 --db-name 指定其他库名")
+
+    os.environ['DB_NAME'] = args.db_name
+    import pymysql
+    from config import DB_CONFIG
+
+    conn = pymysql.connect(
+        host=DB_CONFIG['host'],
+        port=DB_CONFIG['port'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        charset=DB_CONFIG['charset'],
+    )
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{args.db_name}`")
+            cursor.execute(f"CREATE DATABASE `{args.db_name}` DEFAULT CHARSET utf8mb4")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def seed(db, args) -> Dict:
+    """写入合成数据，同时作为 insert_batch 的压测场景"""
+    latencies = []
+    rows = 0
+    start = time.perf_counter()
+    for code, df in generate_dataset(args.codes, args.years, args.seed):
+        t0 = time.perf_counter()
+        db.insert_batch(code, df)
+        latencies.append(time.perf_counter() - t0)
+        rows += len(df)
+        db.add_stock_info(code, make_name(code), '上交所' if code.startswith('sh') else '深交所')
+    elapsed = time.perf_counter() - start
+    return summarize('insert_batch', latencies, elapsed, 1,
+                     rows=rows, rows_per_s=round(rows / elapsed, 2))
+
+
+class ApiServer:
+    """在后台线程中启动 uvicorn，压测完整的 HTTP 请求路径"""
+
+    def __init__(self, app):
+        import uvicorn
+
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+
+        config = uvicorn.Config(app, host='127.0.0.1', port=self.port,
+                                log_level='warning', access_log=False)
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def http_getter(port: int) -> Callable:
+    """返回一个每个线程复用长连接的 GET 函数"""
+    local = threading.local()
+
+    def get(path: str):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+        except Exception:
+            conn.close()
+            local.conn = None
+            raise
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}")
+
+    return get
+
+
+def measure_startup(repeats: int) -> Dict:
+    """在子进程中导入 main，测量 API 进程启动耗时和常驻内存"""
+    code = 'import json, main; print(json.dumps(main.get_status()))'
+    env = dict(os.environ, DB_AUTO_MIGRATE='0')
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    latencies = []
+    rss = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=backend_dir, env=env)
+        latencies.append(time.perf_counter() - t0)
+        rss.append(json.loads(output.decode().strip().splitlines()[-1])['rss_mb'])
+    return summarize('startup (import main)', latencies, time.perf_counter() - start, 1,
+                     rss_mb=round(float(np.mean(rss)), 1))
+
+
+def git_commit() -> str:
+    """当前提交的短哈希（不在 git 仓库中时返回 unknown）"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+def run(args):
+    prepare_database(args)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        from database import db
+        db.init_database()
+    fake_akshare.install(years=args.years, seed=args.seed, stock_count=args.codes)
+
+    rng = random.Random(args.seed)
+    results = []
+
+    results.append(measure_startup(args.startup_repeats))
+
+    # main.py 和 database.py 在请求路径中大量打印日志，压测期间屏蔽标准输出
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        import main
+
+        results.append(seed(db, args))
+
+        codes = make_codes(args.codes)
+        dates = trading_days(args.years).strftime('%Y-%m-%d')
+        n = args.requests
+        c = args.concurrency
+
+        results.append(measure(
+            'query_latest', db.query_latest,
+            [(rng.choice(codes), args.days) for _ in range(n)], c
+        ))
+
+        ranges = []
+        for _ in range(n):
+            start = rng.randrange(0, max(1, len(dates) - 250))
+            ranges.append((rng.choice(codes), dates[start], dates[min(len(dates) - 1, start + 250)]))
+        results.append(measure('query_by_date_range', db.query_by_date_range, ranges, c))
+
+        keywords = []
+        for _ in range(n):
+            code = rng.choice(codes)
+            keywords.append((rng.choice([code, code[2:5], make_name(code)[4:], 'csgf']),))
+        results.append(measure('search_stocks', db.search_stocks, keywords, c))
+
+        with ApiServer(main.app) as server:
+            get = http_getter(server.port)
+            results.append(measure(
+                'GET /api/stock/{code}', get,
+                [(f"/api/stock/{rng.choice(codes)}?days={args.days}",) for _ in range(n)], c
+            ))
+
+            # 冷启动路径：数据库中没有数据，触发模拟 akshare 自动同步
+            cold_codes = make_codes(args.codes + args.cold_requests)[args.codes:]
+            results.append(measure(
+                'GET /api/stock/{code} (auto-sync)', get,
+                [(f"/api/stock/{code}?days={args.days}",) for code in cold_codes], c
+            ))
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'params': {
+                'backend': args.backend,
+                'codes': args.codes,
+                'years': args.years,
+                'seed': args.seed,
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'days': args.days,
+                'cold_requests': args.cold_requests,
+                'startup_repeats': args.startup_repeats,
+            },
+        },
+        'results': results,
+    }
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(
+        args.output,
+        f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['meta']['commit']}.json"
+    )
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print_report(report)
+    print(f"\n结果已保存到 {path}")
+
+
+def print_report(report: Dict):
+    """以表格形式打印压测结果"""
+    print(f"提交: {report['meta']['commit']}  参数: {report['meta']['params']}")
+    print(f"{'场景':<36}{'次数':>8}{'错误':>6}{'吞吐(/s)':>12}{'p50(ms)':>10}{'p99(ms)':>10}")
+    for r in report['results']:
+        print(f"{r['name']:<36}{r['ops']:>8}{r['errors']:>6}{r['throughput'] or 0:>12.1f}"
+              f"{r['p50_ms'] or 0:>10.2f}{r['p99_ms'] or 0:>10.2f}")
+
+
+def compare(args):
+    """对比两次压测结果（b 相对 a 的变化）"""
+    with open(args.baseline, encoding='utf-8') as f:
+        a = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        b = json.load(f)
+
+    def delta(old, new):
+        if not old or new is None:
+            return '    n/a'
+        return f"{(new - old) / old * 100:+7.1f}%"
+
+    print(f"基线: {a['meta']['commit']}  对比: {b['meta']['commit']}")
+    print(f"{'场景':<36}{'吞吐(/s)':>22}{'p50(ms)':>22}{'p99(ms)':>22}")
+    baseline = {r['name']: r for r in a['results']}
+    for r in b['results']:
+        old = baseline.get(r['name'])
+        if not old:
+            continue
+        print(f"{r['name']:<36}"
+              f"{r['throughput'] or 0:>12.1f} {delta(old['throughput'], r['throughput'])}"
+              f"{r['p50_ms'] or 0:>12.2f} {delta(old['p50_ms'], r['p50_ms'])}"
+              f"{r['p99_ms'] or 0:>12.2f} {delta(old['p99_ms'], r['p99_ms'])}")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description='后端压测')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='生成合成数据并执行压测')
+    run_parser.add_argument('--codes', type=int, default=50, help='合成股票数量')
+    run_parser.add_argument('--years', type=float, default=5, help='每只股票的数据年限')
+    run_parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    run_parser.add_argument('--requests', type=int, default=1000, help='每个场景的请求数')
+    run_parser.add_argument('--concurrency', type=int, default=16, help='并发线程数')
+    run_parser.add_argument('--days', type=int, default=250, help='查询最近N天')
+    run_parser.add_argument('--cold-requests', type=int, default=10,
+                            help='触发自动同步的冷启动请求数')
+    run_parser.add_argument('--startup-repeats', type=int, default=5,
+                            help='启动耗时测量次数')
+    run_parser.add_argument('--backend', choices=['mysql', 'sqlite'], default='mysql',
+                            help='存储后端（sqlite 使用临时文件，无需数据库服务）')
+    run_parser.add_argument('--db-name', default='stock_data_bench',
+                            help='基准测试库名（每次运行都会重建）')
+    run_parser.add_argument('--output', default=RESULTS_DIR, help='结果输出目录')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = sub.add_parser('compare', help='对比两次压测结果')
+    compare_parser.add_argument('baseline', help='基线结果 JSON')
+    compare_parser.add_argument('candidate', help='对比结果 JSON')
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,297 @@
+"""
+缠论算法模块（后端）
+
+与前端 utils/chanlun.ts 的分型、笔识别规则保持一致，
+用于服务端批量计算（自选股快照、选股扫描等），输入为按日期升序的 OHLC 序列。
+"""
+from typing import Dict, List, Optional, Sequence
+
+
+def _merge_bar(result: List[Dict], i: int, open_: float, high: float, low: float, close: float) -> bool:
+    """
+    处理一根K线的包含关系：与最后一根处理后的K线存在包含关系时合并，否则追加
+    处理后K线额外记录高点所在原始K线的低点（high_index_low）和低点所在原始K线的高点（low_index_high），用于判断笔的有效性
+    :return: 是否追加了新的处理后K线
+    """
+    if result:
+        previous = result[-1]
+        is_contained = (
+            (high <= previous['high'] and low >= previous['low'])
+            or (high >= previous['high'] and low <= previous['low'])
+        )
+    else:
+        is_contained = False
+
+    if not is_contained:
+        result.append({
+            'index': i,
+            'high': high,
+            'low': low,
+            'high_index': i,
+            'low_index': i,
+            'high_index_low': low,
+            'low_index_high': high,
+        })
+        return True
+
+    # 判断走势方向
+    if len(result) >= 2:
+        is_up = previous['high'] >= result[-2]['high']
+    else:
+        is_up = close >= open_
+
+    if is_up:
+        if high > previous['high']:
+            previous['high_index'] = i
+            previous['high_index_low'] = low
+        if low > previous['low']:
+            previous['low_index'] = i
+            previous['low_index_high'] = high
+        previous['high'] = max(previous['high'], high)
+        previous['low'] = max(previous['low'], low)
+    else:
+        if high < previous['high']:
+            previous['high_index'] = i
+            previous['high_index_low'] = low
+        if low < previous['low']:
+            previous['low_index'] = i
+            previous['low_index_high'] = high
+        previous['high'] = min(previous['high'], high)
+        previous['low'] = min(previous['low'], low)
+
+    previous['index'] = i
+    return False
+
+
+def process_containment(
+    open_: Sequence[float],
+    high: Sequence[float],
+    low: Sequence[float],
+    close: Sequence[float]
+) -> List[Dict]:
+    """
+    处理K线包含关系
+    - 向上走势：取两根K线的高点中的较高值和低点中的较高值
+    - 向下走势：取两根K线的高点中的较低值和低点中的较低值
+    :return: 处理后的K线列表，每项包含 index/high/low/high_index/low_index
+    """
+    result: List[Dict] = []
+    for i in range(len(high)):
+        _merge_bar(result, i, float(open_[i]), float(high[i]), float(low[i]), float(close[i]))
+    return result
+
+
+def _fractal_candidate(left: Dict, middle: Dict, right: Dict) -> Optional[Dict]:
+    """以 middle 为中间K线的顶分型或底分型，不构成分型时返回 None"""
+    if (middle['high'] > left['high'] and middle['high'] > right['high']
+            and middle['low'] > left['low'] and middle['low'] > right['low']):
+        return {
+            'type': 'top',
+            'index': middle['high_index'],
+            'price': middle['high'],
+            'processed_index': middle['index'],
+        }
+    if (middle['low'] < left['low'] and middle['low'] < right['low']
+            and middle['high'] < left['high'] and middle['high'] < right['high']):
+        return {
+            'type': 'bottom',
+            'index': middle['low_index'],
+            'price': middle['low'],
+            'processed_index': middle['index'],
+        }
+    return None
+
+
+def _opposite_price(middle: Dict, fractal: Dict) -> float:
+    """分型所在原始K线的另一端价格：顶分型取该K线低点，底分型取该K线高点"""
+    return middle['high_index_low'] if fractal['type'] == 'top' else middle['low_index_high']
+
+
+def _accept_fractal(valid: List[Dict], candidate: Dict):
+    """按顺序筛选分型：顶底交替且间隔足够时追加，同类分型保留更极端的一个"""
+    if not valid:
+        valid.append(candidate)
+        return
+
+    last = valid[-1]
+    if candidate['type'] != last['type']:
+        if candidate['processed_index'] - last['processed_index'] >= 4:
+            valid.append(candidate)
+    elif candidate['type'] == 'top' and candidate['price'] > last['price']:
+        valid[-1] = candidate
+    elif candidate['type'] == 'bottom' and candidate['price'] < last['price']:
+        valid[-1] = candidate
+
+
+def identify_fractals(
+    open_: Sequence[float],
+    high: Sequence[float],
+    low: Sequence[float],
+    close: Sequence[float]
+) -> List[Dict]:
+    """
+    识别有效分型（顶底交替，且间隔至少3根处理后的K线）
+    与前端一致，间隔按处理后K线对应的原始K线索引（合并K线取最后一根的索引）计算
+    :return: 分型列表，每项包含 type/index/price/processed_index
+    """
+    processed = process_containment(open_, high, low, close)
+    if len(processed) < 5:
+        return []
+
+    valid: List[Dict] = []
+    for i in range(1, len(processed) - 1):
+        candidate = _fractal_candidate(processed[i - 1], processed[i], processed[i + 1])
+        if candidate:
+            _accept_fractal(valid, candidate)
+
+    return valid
+
+
+def _make_pen(current: Dict, nxt: Dict, opposite: float) -> Optional[Dict]:
+    """
+    连接相邻两个分型的笔，不满足方向或长度要求时返回 None
+    :param opposite: 起点分型所在原始K线的另一端价格（底分型为高点，顶分型为低点）
+    """
+    if current['type'] == nxt['type']:
+        return None
+
+    if current['type'] == 'bottom':
+        pen_type = 'up'
+        if nxt['price'] <= opposite:
+            return None
+    else:
+        pen_type = 'down'
+        if nxt['price'] >= opposite:
+            return None
+
+    if abs(nxt['index'] - current['index']) + 1 < 5:
+        return None
+
+    return {
+        'type': pen_type,
+        'start_index': current['index'],
+        'end_index': nxt['index'],
+        'start_price': current['price'],
+        'end_price': nxt['price'],
+        'length': abs(nxt['price'] - current['price']),
+    }
+
+
+def identify_pens(
+    high: Sequence[float],
+    low: Sequence[float],
+    fractals: List[Dict]
+) -> List[Dict]:
+    """
+    识别笔：连接相邻的顶底分型，整笔至少5根K线且满足方向要求
+    :return: 笔列表，每项包含 type/start_index/end_index/start_price/end_price/length
+    """
+    pens: List[Dict] = []
+
+    for current, nxt in zip(fractals, fractals[1:]):
+        if current['type'] == 'bottom':
+            opposite = float(high[current['index']])
+        else:
+            opposite = float(low[current['index']])
+
+        pen = _make_pen(current, nxt, opposite)
+        if pen:
+            pens.append(pen)
+
+    return pens
+
+
+class ChanlunState:
+    """
+    增量识别分型和笔：按时间顺序追加K线，result() 与对全部K线调用 analyze_chanlun 的结果相同
+
+    除最后一根外的处理后K线已经确定，以它们为右侧K线的分型也随之确定；
+    除最后一个外的有效分型不会再被替换，它们之间的笔也已确定。
+    因此只需保留最后三根处理后K线，追加K线时只处理新确定的部分，不重新扫描历史。
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._processed: List[Dict] = []
+        self._processed_count = 0
+        self._fractals: List[Dict] = []
+        # 尚未生成笔的分型所在原始K线的另一端价格（按原始K线索引）
+        self._opposite: Dict[int, float] = {}
+        self._pens: List[Dict] = []
+        self._paired = 0
+
+    def append(
+        self,
+        open_: Sequence[float],
+        high: Sequence[float],
+        low: Sequence[float],
+        close: Sequence[float]
+    ):
+        """追加一批按日期升序、位于已有K线之后的K线"""
+        for o, h, l, c in zip(open_, high, low, close):
+            if _merge_bar(self._processed, self.count, float(o), float(h), float(l), float(c)):
+                self._processed_count += 1
+                if len(self._processed) >= 4:
+                    # 新K线追加后，倒数第二根处理后K线确定，以它为右侧K线的分型随之确定
+                    self._commit(*self._processed[-4:-1])
+                    del self._processed[:-3]
+            self.count += 1
+
+    def _commit(self, left: Dict, middle: Dict, right: Dict):
+        candidate = _fractal_candidate(left, middle, right)
+        if candidate is None:
+            return
+
+        self._opposite[candidate['index']] = _opposite_price(middle, candidate)
+        _accept_fractal(self._fractals, candidate)
+
+        # 除最后一个分型外都已确定，相邻两个都确定的分型之间的笔不会再变化
+        while self._paired + 2 < len(self._fractals):
+            current, nxt = self._fractals[self._paired], self._fractals[self._paired + 1]
+            pen = _make_pen(current, nxt, self._opposite[current['index']])
+            if pen:
+                self._pens.append(pen)
+            self._paired += 1
+
+        self._opposite = {
+            fractal['index']: self._opposite[fractal['index']] for fractal in self._fractals[self._paired:]
+        }
+
+    def result(self) -> Dict[str, List[Dict]]:
+        """当前全部K线的分型和笔（最后一根处理后K线尚未确定，按当前状态临时计算）"""
+        if self._processed_count < 5:
+            return {'fractals': [], 'pens': []}
+
+        fractals = list(self._fractals)
+        opposite = dict(self._opposite)
+        candidate = _fractal_candidate(*self._processed[-3:])
+        if candidate:
+            opposite[candidate['index']] = _opposite_price(self._processed[-2], candidate)
+            _accept_fractal(fractals, candidate)
+
+        pens = list(self._pens)
+        for current, nxt in zip(fractals[self._paired:], fractals[self._paired + 1:]):
+            pen = _make_pen(current, nxt, opposite[current['index']])
+            if pen:
+                pens.append(pen)
+
+        return {'fractals': fractals, 'pens': pens}
+
+
+def analyze_chanlun(
+    open_: Sequence[float],
+    high: Sequence[float],
+    low: Sequence[float],
+    close: Sequence[float]
+) -> Dict[str, List[Dict]]:
+    """
+    完整的缠论分析：识别分型和笔
+    """
+    fractals = identify_fractals(open_, high, low, close)
+    pens = identify_pens(high, low, fractals)
+    return {'fractals': fractals, 'pens': pens}
+
+
+def latest_pen_direction(pens: List[Dict]) -> Optional[str]:
+    """最新一笔的方向（up/down），没有笔时返回 None"""
+    return pens[-1]['type'] if pens else None
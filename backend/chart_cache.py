@@ -0,0 +1,134 @@
+"""
+K线接口响应缓存
+
+ETag 由 (代码, 内容版本, 查询窗口) 计算，内容版本包括数据范围、最早/最新一条的收盘价和股票名称，
+只需一次单行查询即可判断数据是否变化（新增K线、复权重写历史价格、股票更名都会改变 ETag）：
+客户端带 If-None-Match 且未变化时直接返回 304，不读取K线数据。
+常用窗口的响应体缓存为序列化后的 JSON 以及 gzip/brotli 压缩结果，重复请求跳过查询、JSON 编码和压缩。
+brotli 为可选依赖，未安装时只提供 gzip。
+"""
+import gzip
+import hashlib
+import importlib.util
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+BROTLI_AVAILABLE = importlib.util.find_spec('brotli') is not None
+
+# 缓存的响应数量上限（按最近使用淘汰）
+CHART_CACHE_SIZE = 256
+# 小于该字节数的响应不压缩
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+_chart_cache: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+_chart_lock = threading.Lock()
+
+
+def make_etag(code: str, version: Dict, start_date: Optional[str], end_date: Optional[str], days: int) -> str:
+    """
+    根据内容版本和查询窗口计算 ETag（弱校验：同一内容的不同压缩编码共用）
+    :param version: get_chart_version 的结果
+    """
+    key = (f"{code}|{version['earliest']}|{version['latest']}|{version['total']}|"
+           f"{version['first_close']!r}|{version['last_close']!r}|{version['name']}|"
+           f"{start_date}|{end_date}|{days}")
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:20]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 请求头是否包含该 ETag（按弱比较）"""
+    if not if_none_match:
+        return False
+
+    value = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == value:
+            return True
+    return False
+
+
+def accepted_encodings(accept_encoding: Optional[str]) -> set:
+    """解析 Accept-Encoding 请求头，返回客户端接受的编码（忽略 q=0）"""
+    encodings = set()
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if name and params not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            encodings.add(name.lower())
+    return encodings
+
+
+class CachedResponse:
+    """一个序列化后的响应体，各压缩编码在首次需要时生成并保存"""
+
+    def __init__(self, etag: str, payload: Dict):
+        self.etag = etag
+        # 与 FastAPI JSONResponse 相同的序列化方式
+        self.json = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+        self._encoded: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def body(self, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """
+        按客户端接受的编码返回响应体，优先 brotli，其次 gzip
+        :return: (响应体, Content-Encoding)，未压缩时编码为 None
+        """
+        if len(self.json) < MIN_COMPRESS_SIZE:
+            return self.json, None
+
+        accepted = accepted_encodings(accept_encoding)
+        if BROTLI_AVAILABLE and 'br' in accepted:
+            return self._encode('br'), 'br'
+        if 'gzip' in accepted:
+            return self._encode('gzip'), 'gzip'
+        return self.json, None
+
+    def _encode(self, encoding: str) -> bytes:
+        with self._lock:
+            body = self._encoded.get(encoding)
+            if body is None:
+                if encoding == 'br':
+                    import brotli
+                    body = brotli.compress(self.json, quality=BROTLI_QUALITY)
+                else:
+                    body = gzip.compress(self.json, compresslevel=GZIP_LEVEL, mtime=0)
+                self._encoded[encoding] = body
+            return body
+
+
+def get_cached(key: Tuple) -> Optional[CachedResponse]:
+    """查找缓存的响应（key 为 (代码, 开始日期, 结束日期, 天数)），调用方需再比较 ETag"""
+    with _chart_lock:
+        cached = _chart_cache.get(key)
+        if cached is not None:
+            _chart_cache.move_to_end(key)
+        return cached
+
+
+def store(key: Tuple, etag: str, payload: Dict) -> CachedResponse:
+    """序列化并缓存响应"""
+    cached = CachedResponse(etag, payload)
+
+    with _chart_lock:
+        _chart_cache[key] = cached
+        _chart_cache.move_to_end(key)
+        while len(_chart_cache) > CHART_CACHE_SIZE:
+            _chart_cache.popitem(last=False)
+
+    return cached
+
+
+def invalidate(code: str):
+    """K线写入后，删除该代码的全部缓存响应（提前释放内存，过期的响应本身也会因 ETag 变化而不再命中）"""
+    with _chart_lock:
+        for key in [key for key in _chart_cache if key[0] == code]:
+            del _chart_cache[key]
@@ -0,0 +1,223 @@
+"""
+多股票对比分析模块
+
+将多只股票按交易日历对齐（停牌日沿用前一收盘价），计算归一化走势、
+收益率相关系数矩阵，以及相对基准指数的滚动相关系数和 Beta。
+对齐后的价格面板按 (代码列表, 日期范围) 缓存，并记录读取时各代码的 (最新日期, K线数量)：
+每次命中先用一条聚合查询核对，其他进程写入K线后缓存自动失效；本进程写入时也按代码主动删除。
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from database import db
+
+# 对齐面板缓存上限
+PANEL_CACHE_SIZE = 32
+
+_panel_cache: "OrderedDict[Tuple, Tuple[Tuple, pd.DataFrame]]" = OrderedDict()
+_panel_lock = threading.Lock()
+
+
+def _build_panel(codes: List[str], start_date: Optional[str], end_date: Optional[str],
+                 calendar_code: Optional[str]) -> pd.DataFrame:
+    """
+    从数据库读取收盘价并对齐为 日期 × 代码 的价格面板
+    :param calendar_code: 作为交易日历的代码（一般为基准指数），没有数据时使用所有代码日期的并集
+    """
+    df = db.query_close_frame(codes, start_date, end_date)
+    if df.empty:
+        return pd.DataFrame(columns=codes, dtype='float64')
+
+    panel = df.pivot(index='date', columns='code', values='close').sort_index()
+    panel = panel.reindex(columns=codes)
+
+    if calendar_code and calendar_code in df['code'].values:
+        calendar = panel.index[panel[calendar_code].notna()]
+        panel = panel.loc[calendar]
+
+    # 停牌日沿用前一交易日收盘价；上市前保持为空
+    return panel.ffill().astype('float64')
+
+
+def get_panel(codes: List[str], start_date: Optional[str] = None, end_date: Optional[str] = None,
+              calendar_code: Optional[str] = None) -> pd.DataFrame:
+    """获取对齐后的价格面板（带缓存，命中时核对数据版本）"""
+    key = (tuple(codes), start_date, end_date, calendar_code)
+    # 先读版本再读数据：读取期间有写入时，下次命中会因版本不同而重建
+    versions = db.get_data_versions(codes)
+    version = tuple(versions.get(code) for code in codes)
+
+    with _panel_lock:
+        cached = _panel_cache.get(key)
+        if cached is not None and cached[0] == version:
+            _panel_cache.move_to_end(key)
+            return cached[1]
+
+    panel = _build_panel(codes, start_date, end_date, calendar_code)
+
+    with _panel_lock:
+        _panel_cache[key] = (version, panel)
+        _panel_cache.move_to_end(key)
+        while len(_panel_cache) > PANEL_CACHE_SIZE:
+            _panel_cache.popitem(last=False)
+
+    return panel
+
+
+def invalidate_panels(code: str):
+    """K线写入后，删除包含该代码的对齐面板缓存（提前释放内存，过期的面板本身也会因版本不同而不再命中）"""
+    with _panel_lock:
+        for key in [key for key in _panel_cache if code in key[0]]:
+            del _panel_cache[key]
+
+
+def correlation_matrix(returns: np.ndarray) -> np.ndarray:
+    """
+    计算收益率相关系数矩阵（按两两都有数据的交易日计算）
+    :param returns: T × N 收益率矩阵，缺失值为 NaN
+    """
+    mask = ~np.isnan(returns)
+    x = np.where(mask, returns, 0.0)
+    m = mask.astype('float64')
+
+    n = m.T @ m
+    sum_x = x.T @ m                 # [i, j]: 两者都有数据时 x_i 之和
+    sum_xx = (x * x).T @ m
+    sum_xy = x.T @ x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sum_xy - sum_x * sum_x.T / n
+        var = sum_xx - sum_x * sum_x / n
+        corr = cov / np.sqrt(var * var.T)
+
+    corr[n < 2] = np.nan
+    return corr
+
+
+def _rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """按列计算滚动窗口求和（前 window-1 行为 NaN）"""
+    cumsum = np.cumsum(values, axis=0)
+    result = np.full(values.shape, np.nan)
+    result[window - 1:] = cumsum[window - 1:]
+    result[window:] -= cumsum[:-window]
+    return result
+
+
+def rolling_vs_benchmark(returns: np.ndarray, benchmark: np.ndarray,
+                         window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算每只股票相对基准的滚动相关系数和滚动 Beta
+    :param returns: T × N 收益率矩阵
+    :param benchmark: 长度为 T 的基准收益率
+    :return: (滚动相关系数 T × N, 滚动Beta T × N)
+    """
+    bench = benchmark[:, None]
+    mask = ~np.isnan(returns) & ~np.isnan(bench)
+    m = mask.astype('float64')
+    x = np.where(mask, returns, 0.0)
+    y = np.where(mask, bench, 0.0)
+
+    n = _rolling_sum(m, window)
+    sx = _rolling_sum(x, window)
+    sy = _rolling_sum(y, window)
+    sxx = _rolling_sum(x * x, window)
+    syy = _rolling_sum(y * y, window)
+    sxy = _rolling_sum(x * y, window)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+        beta = cov / var_y
+
+    # 窗口内有效数据不足一半时不输出
+    insufficient = ~(n >= max(2, window // 2))
+    corr[insufficient] = np.nan
+    beta[insufficient] = np.nan
+    return corr, beta
+
+
+def beta_vs_benchmark(returns: np.ndarray, benchmark: np.ndarray) -> np.ndarray:
+    """
+    计算全区间 Beta（按股票与基准都有数据的交易日计算）
+    :return: 长度为 N 的 Beta 数组
+    """
+    bench = benchmark[:, None]
+    mask = ~np.isnan(returns) & ~np.isnan(bench)
+    x = np.where(mask, returns, 0.0)
+    y = np.where(mask, bench, 0.0)
+    n = mask.sum(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = (x * y).sum(axis=0) - x.sum(axis=0) * y.sum(axis=0) / n
+        var_y = (y * y).sum(axis=0) - y.sum(axis=0) ** 2 / n
+        beta = cov / var_y
+
+    beta[n < 2] = np.nan
+    return beta
+
+
+def _to_list(values: np.ndarray) -> List:
+    """numpy 数组转为 JSON 友好的列表（NaN 转为 None）"""
+    values = np.round(values.astype('float64'), 6)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def compare_stocks(codes: List[str], benchmark: str, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None, window: int = 60) -> Dict:
+    """
+    多股票对比分析
+    :param codes: 股票代码列表（数据库格式）
+    :param benchmark: 基准指数代码（如 sh000001）
+    :param window: 滚动窗口（交易日数）
+    :return: 归一化走势、相关系数矩阵、滚动相关系数和 Beta
+    """
+    all_codes = codes if benchmark in codes else codes + [benchmark]
+    panel = get_panel(all_codes, start_date, end_date, calendar_code=benchmark)
+
+    prices = panel[codes].to_numpy()
+    if prices.shape[0] == 0:
+        return {
+            "dates": [], "codes": codes, "benchmark": benchmark, "window": window,
+            "rebased": {}, "correlation": [], "window_correlation": [], "beta": {},
+            "return_dates": [], "rolling_correlation": {}, "rolling_beta": {}
+        }
+
+    # 归一化走势：以每只股票第一个有效收盘价为 1
+    first_valid = np.argmax(~np.isnan(prices), axis=0)
+    base = prices[first_valid, np.arange(prices.shape[1])]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rebased = prices / base
+
+    # 面板列顺序与 all_codes 相同：前 len(codes) 列与 codes 一一对应，
+    # 基准不在 codes 中时追加为最后一列，否则就是 codes 中的那一列
+    all_prices = panel.to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        all_returns = all_prices[1:] / all_prices[:-1] - 1
+    returns = all_returns[:, :len(codes)]
+    bench_returns = all_returns[:, all_codes.index(benchmark)]
+
+    corr = correlation_matrix(returns)
+    window_corr = correlation_matrix(returns[-window:])
+    rolling_corr, rolling_beta = rolling_vs_benchmark(returns, bench_returns, window)
+    beta = beta_vs_benchmark(returns, bench_returns)
+
+    dates = [d.strftime('%Y-%m-%d') if hasattr(d, 'strftime') else str(d) for d in panel.index]
+    return_dates = dates[1:]
+
+    return {
+        "dates": dates,
+        "codes": codes,
+        "benchmark": benchmark,
+        "window": window,
+        "rebased": {code: _to_list(rebased[:, i]) for i, code in enumerate(codes)},
+        "correlation": _to_list(corr),
+        "window_correlation": _to_list(window_corr),
+        "beta": dict(zip(codes, _to_list(beta))),
+        "return_dates": return_dates,
+        "rolling_correlation": {code: _to_list(rolling_corr[:, i]) for i, code in enumerate(codes)},
+        "rolling_beta": {code: _to_list(rolling_beta[:, i]) for i, code in enumerate(codes)},
+    }
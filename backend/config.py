@@ -1,23 +1,56 @@
 """数据库配置"""
+import os
 
-# MySQL数据库配置
+# MySQL数据库配置（可通过环境变量覆盖，便于基准测试等场景指向其他库）
 DB_CONFIG = {
-    'host': 'localhost',
-    'port': 3306,
-    'user': 'root',
-    'password': 'xA123456',  # 请修改为你的MySQL密码
-    'database': 'stock_data',
+    'host': os.getenv('DB_HOST', 'localhost'),
+    'port': int(os.getenv('DB_PORT', 3306)),
+    'user': os.getenv('DB_USER', 'root'),
+    'password': os.getenv('DB_PASSWORD', 'xA123456'),  # 请修改为你的MySQL密码
+    'database': os.getenv('DB_NAME', 'stock_data'),
     'charset': 'utf8mb4'
 }
 
-# 或者使用环境变量（更安全）
-# import os
-
-# DB_CONFIG = {
-#     'host': os.getenv('DB_HOST', 'localhost'),
-#     'port': int(os.getenv('DB_PORT', 3306)),
-#     'user': os.getenv('DB_USER', 'root'),
-#     'password': os.getenv('DB_PASSWORD', 'your_password'),
-#     'database': os.getenv('DB_NAME', 'stock_data'),
-#     'charset': 'utf8mb4'
-# }
+# 存储后端：mysql（默认）或 sqlite（嵌入式，单机部署无需数据库服务）
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql')
+
+# SQLite 数据库文件路径
+SQLITE_PATH = os.getenv(
+    'SQLITE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stock_data.db')
+)
+
+# 连接池初始化时创建的空闲连接数（0 表示按需创建，进程启动时不连接数据库）
+DB_POOL_MIN_CACHED = int(os.getenv('DB_POOL_MIN_CACHED', 0))
+
+# MySQL 连接池参数（DBUtils PooledDB）
+DB_POOL_CONFIG = {
+    # 最大连接数，默认与 FastAPI 同步接口线程池大小（40）一致，避免请求排队等待连接
+    'maxconnections': int(os.getenv('DB_POOL_MAX_CONNECTIONS', 40)),
+    'mincached': DB_POOL_MIN_CACHED,
+    'maxcached': int(os.getenv('DB_POOL_MAX_CACHED', 10)),
+    'maxshared': int(os.getenv('DB_POOL_MAX_SHARED', 3)),
+    'blocking': os.getenv('DB_POOL_BLOCKING', '1') == '1',
+    # 0-不检查，1-取出连接时检查（每个请求只取一次连接），7-总是检查
+    'ping': int(os.getenv('DB_POOL_PING', 1)),
+}
+
+# 是否将K线接口的内容版本（数据范围、首末收盘价、股票名称）和K线数据两条查询合并为一次往返（MySQL 多语句）
+DB_PIPELINE_QUERIES = os.getenv('DB_PIPELINE_QUERIES', '0') == '1'
+
+# 启动时是否自动执行建表检查；默认关闭（每个 worker 启动都执行全部建表语句），
+# 首次部署和每次升级后执行一次 python migrate.py
+DB_AUTO_MIGRATE = os.getenv('DB_AUTO_MIGRATE', '0') == '1'
+
+# 收盘后数据流水线
+# 是否在 API 进程内启动定时调度（多 worker 部署时只在一个进程中开启，或改用 python pipeline.py 定时执行）
+PIPELINE_ENABLED = os.getenv('PIPELINE_ENABLED', '0') == '1'
+# 每个交易日（周一至周五）的执行时间 HH:MM
+PIPELINE_RUN_AT = os.getenv('PIPELINE_RUN_AT', '15:30')
+# 按股票并行的线程数
+PIPELINE_WORKERS = int(os.getenv('PIPELINE_WORKERS', 8))
+# 运行状态文件
+PIPELINE_STATE_PATH = os.getenv(
+    'PIPELINE_STATE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline_state.json')
+)
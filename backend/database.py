@@ -1,15 +1,19 @@
 """数据库操作模块"""
-import pymysql
-from typing import List, Dict, Optional
-import pandas as pd
-from config import DB_CONFIG
-from dbutils.pooled_db import PooledDB
-
-try:
-    from pypinyin import lazy_pinyin, Style
-    PINYIN_AVAILABLE = True
-except ImportError:
-    PINYIN_AVAILABLE = False
+import importlib.util
+from abc import ABC, abstractmethod
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Dict, Optional, Tuple, TYPE_CHECKING
+from config import DB_CONFIG, DB_BACKEND, DB_POOL_CONFIG, DB_PIPELINE_QUERIES
+
+# pandas 只在写入和分析路径中使用，延迟导入以加快 API 进程启动
+if TYPE_CHECKING:
+    import pandas as pd
+
+# pypinyin 加载拼音词典较慢，这里只检查是否安装，首次生成拼音时再导入
+PINYIN_AVAILABLE = importlib.util.find_spec('pypinyin') is not None
+if not PINYIN_AVAILABLE:
     print("警告: pypinyin 库未安装，拼音搜索功能将不可用")
 
 
@@ -23,6 +27,8 @@ def get_pinyin(text: str) -> tuple:
         return '', ''
 
     try:
+        from pypinyin import lazy_pinyin, Style
+
         # 获取全拼（小写，无音调）
         pinyin_full = ''.join(lazy_pinyin(text, style=Style.NORMAL))
 
@@ -35,33 +41,475 @@ def get_pinyin(text: str) -> tuple:
         return '', ''
 
 
-class StockDatabase:
+class ConnectionScope:
+    """
+    请求级连接作用域
+
+    作用域内第一次查询时从连接池取出连接，之后的查询复用同一个连接，
+    请求结束时调用 release() 归还连接池。一个请求只在一个线程中执行，无需加锁。
+    """
+
+    def __init__(self, checkout: Callable):
+        self._checkout = checkout
+        self._conn = None
+
+    def connection(self):
+        """获取作用域内的连接（close() 不会归还连接池）"""
+        if self._conn is None:
+            self._conn = self._checkout()
+        return _ScopedConnection(self._conn)
+
+    def release(self):
+        """归还作用域持有的连接"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            conn.close()
+
+
+class _ScopedConnection:
+    """作用域内的连接代理：各查询方法结束时的 close() 为空操作"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        pass
+
+
+class _CountedConnection:
+    """连接池连接代理：close() 归还连接时更新使用中的连接数"""
+
+    def __init__(self, conn, on_release: Callable):
+        self._conn = conn
+        self._on_release = on_release
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if self._on_release is not None:
+            on_release, self._on_release = self._on_release, None
+            self._conn.close()
+            on_release()
+
+
+# 当前请求的连接作用域（由 main.py 的中间件设置，未设置时每次查询单独取连接）
+current_scope: ContextVar[Optional[ConnectionScope]] = ContextVar('db_connection_scope', default=None)
+
+
+def release_request_connection():
+    """
+    在耗时的网络请求（如从 akshare 下载数据）之前归还当前请求持有的连接，
+    避免下载期间占用连接池；之后的查询会重新取出一个连接
+    """
+    scope = current_scope.get()
+    if scope is not None:
+        scope.release()
+
+
+def format_bar(row: Dict) -> Dict:
+    """将数据库返回的一行日线数据转换为接口格式（日期字符串、价格 float）"""
+    return {
+        'date': row['date'] if isinstance(row['date'], str) else row['date'].strftime('%Y-%m-%d'),
+        'open': float(row['open']),
+        'high': float(row['high']),
+        'low': float(row['low']),
+        'close': float(row['close']),
+        'volume': float(row['volume'])
+    }
+
+
+def format_active_pivots(rows: List[Dict]) -> Dict[str, Dict]:
+    """
+    将 stock_pivot 查询结果按股票整理
+    :return: {code: {'code', 'last_date', 'levels': {级别: 当前中枢，没有时为 None}}}
+    """
+    def to_str(value):
+        return value if isinstance(value, str) or value is None else value.strftime('%Y-%m-%d')
+
+    result: Dict[str, Dict] = {}
+    for row in rows:
+        item = result.setdefault(row['code'], {
+            'code': row['code'],
+            'last_date': to_str(row['last_date']),
+            'levels': {},
+        })
+        if row['pivot_type'] is None:
+            item['levels'][row['level']] = None
+            continue
+
+        item['levels'][row['level']] = {
+            'type': row['pivot_type'],
+            'zg': float(row['zg']),
+            'zd': float(row['zd']),
+            'zz': float(row['zz']),
+            'gg': float(row['gg']),
+            'dd': float(row['dd']),
+            'start_date': to_str(row['start_date']),
+            'end_date': to_str(row['end_date']),
+            'member_count': row['member_count'],
+            'expansions': row['expansions'].split(',') if row['expansions'] else [],
+        }
+    return result
+
+
+def pivot_values(code: str, last_date: str, levels: Dict[str, Optional[Dict]]) -> List[tuple]:
+    """stock_pivot 每个级别一行的写入参数（没有当前中枢的级别只记录 last_date）"""
+    values = []
+    for level, pivot in levels.items():
+        if pivot is None:
+            values.append((code, level, last_date) + (None,) * 10)
+            continue
+        values.append((
+            code, level, last_date, pivot['type'],
+            pivot['zg'], pivot['zd'], pivot['zz'], pivot['gg'], pivot['dd'],
+            pivot['start_date'], pivot['end_date'], pivot['member_count'], ','.join(pivot['expansions'])
+        ))
+    return values
+
+
+def format_data_range(row: Optional[Dict]) -> Optional[Dict]:
+    """将 MIN/MAX/COUNT 查询结果转换为数据范围字典，没有数据时返回 None"""
+    if not row or not row['total']:
+        return None
+
+    def to_str(value):
+        return value if isinstance(value, str) or value is None else value.strftime('%Y-%m-%d')
+
+    return {
+        'earliest': to_str(row['earliest']),
+        'latest': to_str(row['latest']),
+        'total': row['total']
+    }
+
+
+def format_chart_version(row: Optional[Dict]) -> Optional[Dict]:
+    """将 CHART_VERSION 查询结果转换为K线内容版本（数据范围 + 首末收盘价 + 股票名称），没有数据时返回 None"""
+    version = format_data_range(row)
+    if not version:
+        return None
+
+    version['first_close'] = float(row['first_close'])
+    version['last_close'] = float(row['last_close'])
+    version['name'] = row['name']
+    return version
+
+
+class BaseStockDatabase(ABC):
+    """
+    存储后端接口
+
+    所有后端返回相同结构的数据（日期为 YYYY-MM-DD 字符串，价格为 float），
+    具体实现由 config.DB_BACKEND 选择：mysql（默认）或 sqlite（嵌入式，无需数据库服务）
+    """
+
+    @abstractmethod
+    def init_database(self):
+        """初始化数据库表"""
+
+    @abstractmethod
+    def insert_batch(self, code: str, df: 'pd.DataFrame') -> int:
+        """批量插入日线数据（跳过已存在的日期），返回新插入条数"""
+
+    @abstractmethod
+    def query_by_date_range(self, code: str, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None) -> List[Dict]:
+        """按日期范围查询数据"""
+
+    @abstractmethod
+    def query_latest(self, code: str, days: int = 100) -> List[Dict]:
+        """查询最近N天的数据"""
+
+    @abstractmethod
+    def query_close_panel(self, codes: List[str], start_date: Optional[str] = None,
+                          end_date: Optional[str] = None) -> List[Dict]:
+        """一次查询多只股票的收盘价"""
+
+    @abstractmethod
+    def get_data_range(self, code: str) -> Optional[Dict]:
+        """获取某个股票的数据范围"""
+
+    @abstractmethod
+    def get_chart_version(self, code: str) -> Optional[Dict]:
+        """
+        一次查询返回K线内容版本：数据范围、最早/最新一条的收盘价和股票名称
+        复权调整会改变最早的收盘价，更名会改变名称，用于计算K线接口的 ETag
+        """
+
+    @abstractmethod
+    def get_data_versions(self, codes: List[str]) -> Dict[str, Tuple[str, int]]:
+        """一次查询多只股票的 (最新日期, K线数量)，没有数据的代码不返回"""
+
+    @abstractmethod
+    def update_sync_record(self, code: str, total_records: int):
+        """更新同步记录"""
+
+    @abstractmethod
+    def add_stock_info(self, code: str, name: str, market: str = None, stock_type: str = 'stock'):
+        """添加股票信息（自动生成拼音）"""
+
+    @abstractmethod
+    def get_all_stocks(self, stock_type: Optional[str] = None) -> List[Dict]:
+        """获取所有股票列表"""
+
+    @abstractmethod
+    def search_stocks(self, keyword: str) -> List[Dict]:
+        """搜索股票（按代码、名称或拼音）"""
+
+    @abstractmethod
+    def get_stock_name(self, code: str) -> Optional[str]:
+        """按代码精确查询股票名称"""
+
+    @abstractmethod
+    def get_daily_codes(self) -> List[str]:
+        """获取所有已有日线数据的股票代码"""
+
+    @abstractmethod
+    def upsert_snapshot(self, snapshot: Dict):
+        """写入或更新个股最新状态快照"""
+
+    @abstractmethod
+    def upsert_rollups(self, code: str, period: str, rows: List[Dict]) -> int:
+        """写入或更新周线/月线汇总（按周期起始日期覆盖），返回写入条数"""
+
+    @abstractmethod
+    def query_rollups(self, code: str, period: str, start_date: Optional[str] = None,
+                      end_date: Optional[str] = None) -> List[Dict]:
+        """按日期范围查询周线/月线汇总"""
+
+    @abstractmethod
+    def upsert_active_pivots(self, code: str, last_date: str, levels: Dict[str, Optional[Dict]]):
+        """写入各级别当前中枢（每个级别一行，没有当前中枢的级别价格为空）"""
+
+    @abstractmethod
+    def get_active_pivots(self, codes: List[str]) -> Dict[str, Dict]:
+        """一次查询多只股票已保存的各级别当前中枢，没有保存过的股票不在结果中"""
+
+    @abstractmethod
+    def create_watchlist(self, user_id: str, name: str) -> int:
+        """创建自选股分组，返回分组ID"""
+
+    @abstractmethod
+    def get_watchlists(self, user_id: str) -> List[Dict]:
+        """获取用户的所有自选股分组（含成员数量）"""
+
+    @abstractmethod
+    def get_watchlist(self, watchlist_id: int) -> Optional[Dict]:
+        """获取单个自选股分组"""
+
+    @abstractmethod
+    def delete_watchlist(self, watchlist_id: int):
+        """删除自选股分组及其成员"""
+
+    @abstractmethod
+    def add_watchlist_item(self, watchlist_id: int, code: str) -> bool:
+        """添加自选股成员，已存在时返回 False"""
+
+    @abstractmethod
+    def remove_watchlist_item(self, watchlist_id: int, code: str) -> bool:
+        """移除自选股成员"""
+
+    @abstractmethod
+    def get_watchlist_snapshot(self, watchlist_id: int) -> List[Dict]:
+        """一次查询返回自选股分组内所有成员的最新状态快照"""
+
+    def query_chart_bundle(self, code: str, start_date: Optional[str] = None,
+                           end_date: Optional[str] = None, days: int = 100) -> Dict:
+        """
+        K线接口需要的数据：内容版本（含数据范围和股票名称）、K线数据
+        未指定日期范围时返回最近 days 天的数据；后端可覆盖为一次往返完成
+        :return: {'data_range': ..., 'version': ..., 'rows': [...], 'name': ...}
+        """
+        version = self.get_chart_version(code)
+        if not version:
+            return {'data_range': None, 'version': None, 'rows': [], 'name': self.get_stock_name(code)}
+
+        if start_date or end_date:
+            rows = self.query_by_date_range(code, start_date, end_date)
+        else:
+            rows = self.query_latest(code, days)
+
+        return {'data_range': format_data_range(version), 'version': version, 'rows': rows, 'name': version['name']}
+
+    def connection_scope(self) -> Optional[ConnectionScope]:
+        """创建请求级连接作用域，不需要时返回 None（如 SQLite 已按线程复用连接）"""
+        return None
+
+    def pool_stats(self) -> Dict:
+        """连接池使用统计（取连接等待时间等），没有连接池的后端返回空字典"""
+        return {}
+
+    def query_frame(self, code: str, start_date: Optional[str] = None,
+                    end_date: Optional[str] = None) -> 'pd.DataFrame':
+        """按日期范围查询数据并返回 DataFrame（后端可覆盖为原生 DataFrame 读取）"""
+        import pandas as pd
+        rows = self.query_by_date_range(code, start_date, end_date)
+        return pd.DataFrame(rows, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+
+    def query_close_frame(self, codes: List[str], start_date: Optional[str] = None,
+                          end_date: Optional[str] = None) -> 'pd.DataFrame':
+        """一次查询多只股票的收盘价并返回 DataFrame（code/date/close 列）"""
+        import pandas as pd
+        rows = self.query_close_panel(codes, start_date, end_date)
+        return pd.DataFrame(rows, columns=['code', 'date', 'close'])
+
+    def query_bars_frame(self, codes: List[str], start_date: Optional[str] = None,
+                         end_date: Optional[str] = None) -> 'pd.DataFrame':
+        """
+        一次读取多只股票的日线数据（用于全市场批量扫描）
+        :return: DataFrame（code/date/open/high/low/close/volume 列，按代码、日期升序）
+        """
+        import pandas as pd
+        columns = ['code', 'date', 'open', 'high', 'low', 'close', 'volume']
+        frames = [self.query_frame(code, start_date, end_date).assign(code=code) for code in codes]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)[columns]
+
+
+class StockDatabase(BaseStockDatabase):
+    """MySQL 存储后端"""
+
     def __init__(self):
+        import pymysql
+        from dbutils.pooled_db import PooledDB
+
         self.config = DB_CONFIG
-        # 创建数据库连接池
+        self.pipeline = DB_PIPELINE_QUERIES
+        connect_kwargs = {}
+        if self.pipeline:
+            # 允许一次发送多条语句，K线接口的两条查询合并为一次往返
+            from pymysql.constants import CLIENT
+            connect_kwargs['client_flag'] = CLIENT.MULTI_STATEMENTS
+
+        # 创建数据库连接池（参数见 config.DB_POOL_CONFIG）
         self.pool = PooledDB(
             creator=pymysql,  # 使用 pymysql 作为数据库模块
-            maxconnections=10,  # 连接池允许的最大连接数
-            mincached=2,  # 初始化时，连接池中至少创建的空闲连接
-            maxcached=5,  # 连接池中最多闲置的连接
-            maxshared=3,  # 连接池中最多共享的连接数量
-            blocking=True,  # 连接池中如果没有可用连接后，是否阻塞等待
+            maxconnections=DB_POOL_CONFIG['maxconnections'],  # 连接池允许的最大连接数
+            mincached=DB_POOL_CONFIG['mincached'],  # 初始化时创建的空闲连接，默认0即按需创建
+            maxcached=DB_POOL_CONFIG['maxcached'],  # 连接池中最多闲置的连接
+            maxshared=DB_POOL_CONFIG['maxshared'],  # 连接池中最多共享的连接数量
+            blocking=DB_POOL_CONFIG['blocking'],  # 连接池中如果没有可用连接后，是否阻塞等待
             maxusage=None,  # 一个连接最多被重复使用的次数，None表示无限制
             setsession=[],  # 开始会话前执行的命令列表
-            ping=1,  # ping MySQL服务端，检查是否服务可用
+            ping=DB_POOL_CONFIG['ping'],  # ping MySQL服务端，检查是否服务可用
             host=self.config['host'],
             port=self.config['port'],
             user=self.config['user'],
             password=self.config['password'],
             database=self.config['database'],
             charset=self.config['charset'],
-            cursorclass=pymysql.cursors.DictCursor
+            cursorclass=pymysql.cursors.DictCursor,
+            **connect_kwargs
         )
+
+        # 取连接等待时间统计
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+            'slow_checkouts': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+        }
         print("数据库连接池初始化成功")
 
+    def _checkout(self):
+        """从连接池取出连接并记录等待时间"""
+        started = time.perf_counter()
+        conn = self.pool.connection()
+        wait_ms = (time.perf_counter() - started) * 1000
+
+        with self._stats_lock:
+            stats = self._stats
+            stats['checkouts'] += 1
+            stats['in_use'] += 1
+            stats['peak_in_use'] = max(stats['peak_in_use'], stats['in_use'])
+            stats['total_wait_ms'] += wait_ms
+            stats['max_wait_ms'] = max(stats['max_wait_ms'], wait_ms)
+            # 超过 1ms 视为需要等待（新建连接或连接池已满）
+            if wait_ms > 1:
+                stats['slow_checkouts'] += 1
+
+        return _CountedConnection(conn, self._on_release)
+
+    def _on_release(self):
+        with self._stats_lock:
+            self._stats['in_use'] -= 1
+
     def get_connection(self):
-        """从连接池获取数据库连接"""
-        return self.pool.connection()
+        """获取数据库连接：请求作用域内复用同一个连接，否则从连接池取出"""
+        scope = current_scope.get()
+        if scope is not None:
+            return scope.connection()
+        return self._checkout()
+
+    def connection_scope(self) -> ConnectionScope:
+        """创建请求级连接作用域"""
+        return ConnectionScope(self._checkout)
+
+    def pool_stats(self) -> Dict:
+        """连接池使用统计"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        checkouts = stats['checkouts']
+        stats['avg_wait_ms'] = round(stats['total_wait_ms'] / checkouts, 3) if checkouts else 0.0
+        stats['total_wait_ms'] = round(stats['total_wait_ms'], 3)
+        stats['max_wait_ms'] = round(stats['max_wait_ms'], 3)
+        stats['max_connections'] = DB_POOL_CONFIG['maxconnections']
+        stats['pipeline'] = self.pipeline
+        return stats
+
+    DATA_RANGE_SQL = '''
+        SELECT MIN(date) as earliest, MAX(date) as latest, COUNT(*) as total
+        FROM stock_daily
+        WHERE code = %s
+    '''
+
+    STOCK_NAME_SQL = "SELECT name FROM stock_info WHERE code = %s LIMIT 1"
+
+    # 首末收盘价和名称都是按主键/唯一键的单行查找
+    CHART_VERSION_SQL = '''
+        SELECT MIN(date) as earliest, MAX(date) as latest, COUNT(*) as total,
+            (SELECT close FROM stock_daily WHERE code = %s ORDER BY date ASC LIMIT 1) as first_close,
+            (SELECT close FROM stock_daily WHERE code = %s ORDER BY date DESC LIMIT 1) as last_close,
+            (SELECT name FROM stock_info WHERE code = %s LIMIT 1) as name
+        FROM stock_daily
+        WHERE code = %s
+    '''
+
+    @staticmethod
+    def _bars_sql(code: str, start_date: Optional[str], end_date: Optional[str]) -> tuple:
+        """按日期范围查询日线的 SQL 和参数"""
+        sql = "SELECT date, open, high, low, close, volume FROM stock_daily WHERE code = %s"
+        params = [code]
+
+        if start_date:
+            sql += " AND date >= %s"
+            params.append(start_date)
+
+        if end_date:
+            sql += " AND date <= %s"
+            params.append(end_date)
+
+        return sql + " ORDER BY date ASC", params
+
+    @staticmethod
+    def _latest_sql(code: str, days: int) -> tuple:
+        """查询最近N天日线的 SQL 和参数（按日期降序）"""
+        sql = '''
+            SELECT date, open, high, low, close, volume
+            FROM stock_daily
+            WHERE code = %s
+            ORDER BY date DESC
+            LIMIT %s
+        '''
+        return sql, [code, days]
 
     def init_database(self):
         """初始化数据库表"""
@@ -119,14 +567,97 @@ class StockDatabase:
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='股票基础信息表'
         ''')
 
+        # 创建自选股分组表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS watchlist (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id VARCHAR(64) NOT NULL COMMENT '用户标识',
+                name VARCHAR(100) NOT NULL COMMENT '自选股分组名称',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE KEY uk_user_name (user_id, name),
+                KEY idx_user (user_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='自选股分组表'
+        ''')
+
+        # 创建自选股成员表
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS watchlist_item (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                watchlist_id INT NOT NULL COMMENT '自选股分组ID',
+                code VARCHAR(20) NOT NULL COMMENT '股票代码',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE KEY uk_watchlist_code (watchlist_id, code),
+                KEY idx_code (code)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='自选股成员表'
+        ''')
+
+        # 创建周线/月线汇总表（由收盘后数据流水线按日线增量汇总）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_rollup (
+                code VARCHAR(20) NOT NULL COMMENT '股票代码',
+                period VARCHAR(10) NOT NULL COMMENT '周期（week-周线，month-月线）',
+                period_start DATE NOT NULL COMMENT '周期起始日期',
+                date DATE NOT NULL COMMENT '周期内最后一个交易日',
+                open DECIMAL(10, 3) NOT NULL COMMENT '开盘价',
+                high DECIMAL(10, 3) NOT NULL COMMENT '最高价',
+                low DECIMAL(10, 3) NOT NULL COMMENT '最低价',
+                close DECIMAL(10, 3) NOT NULL COMMENT '收盘价',
+                volume BIGINT NOT NULL COMMENT '成交量',
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (code, period, period_start)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='周线月线汇总表'
+        ''')
+
+        # 创建各级别当前中枢表（由收盘后数据流水线和K线写入后刷新）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_pivot (
+                code VARCHAR(20) NOT NULL COMMENT '股票代码',
+                level VARCHAR(10) NOT NULL COMMENT '级别（daily-日线，weekly-周线）',
+                last_date DATE NOT NULL COMMENT '计算时的最新K线日期',
+                pivot_type VARCHAR(10) COMMENT '中枢类型（up/down），没有当前中枢时为空',
+                zg DECIMAL(12, 4) COMMENT '中枢上沿',
+                zd DECIMAL(12, 4) COMMENT '中枢下沿',
+                zz DECIMAL(12, 4) COMMENT '中枢中轴',
+                gg DECIMAL(12, 4) COMMENT '成员最高点',
+                dd DECIMAL(12, 4) COMMENT '成员最低点',
+                start_date DATE COMMENT '中枢开始日期',
+                end_date DATE COMMENT '中枢最后成员结束日期',
+                member_count INT COMMENT '成员走势段数量',
+                expansions VARCHAR(50) COMMENT '扩张标记，逗号分隔',
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (code, level)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='各级别当前中枢表'
+        ''')
+
+        # 创建个股最新状态快照表（写入K线时刷新）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stock_snapshot (
+                code VARCHAR(20) NOT NULL PRIMARY KEY COMMENT '股票代码',
+                last_date DATE COMMENT '最新K线日期',
+                last_close DECIMAL(10, 3) COMMENT '最新收盘价',
+                prev_close DECIMAL(10, 3) COMMENT '前一日收盘价',
+                change_pct DECIMAL(10, 4) COMMENT '涨跌幅（%）',
+                dif DOUBLE COMMENT 'MACD DIF',
+                dea DOUBLE COMMENT 'MACD DEA',
+                macd DOUBLE COMMENT 'MACD柱',
+                macd_state VARCHAR(20) COMMENT 'MACD状态',
+                pen_direction VARCHAR(10) COMMENT '最新笔方向',
+                pen_start_date DATE COMMENT '最新笔起始日期',
+                total_bars INT COMMENT 'K线总数',
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='个股最新状态快照表'
+        ''')
+
         conn.commit()
         cursor.close()
         conn.close()
 
         print("数据库表初始化完成")
 
-    def insert_batch(self, code: str, df: pd.DataFrame) -> int:
+    def insert_batch(self, code: str, df: 'pd.DataFrame') -> int:
         """批量插入数据（使用INSERT IGNORE避免重复）"""
+        import pandas as pd
+
         if df.empty:
             return 0
 
@@ -173,8 +704,44 @@ class StockDatabase:
         cursor = conn.cursor()
 
         try:
-            sql = "SELECT date, open, high, low, close, volume FROM stock_daily WHERE code = %s"
-            params = [code]
+            sql, params = self._bars_sql(code, start_date, end_date)
+            cursor.execute(sql, params)
+            return [format_bar(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+
+    def query_latest(self, code: str, days: int = 100) -> List[Dict]:
+        """查询最近N天的数据"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            sql, params = self._latest_sql(code, days)
+            cursor.execute(sql, params)
+            # 转换格式并按日期升序
+            return [format_bar(row) for row in reversed(cursor.fetchall())]
+        finally:
+            cursor.close()
+            conn.close()
+
+    def query_close_panel(
+        self,
+        codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict]:
+        """一次查询多只股票的收盘价（用于多股票对齐）"""
+        if not codes:
+            return []
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            placeholders = ', '.join(['%s'] * len(codes))
+            sql = f"SELECT code, date, close FROM stock_daily WHERE code IN ({placeholders})"
+            params = list(codes)
 
             if start_date:
                 sql += " AND date >= %s"
@@ -184,56 +751,50 @@ class StockDatabase:
                 sql += " AND date <= %s"
                 params.append(end_date)
 
-            sql += " ORDER BY date ASC"
-
             cursor.execute(sql, params)
             rows = cursor.fetchall()
 
-            # 转换日期格式
             for row in rows:
-                if row['date']:
-                    row['date'] = row['date'].strftime('%Y-%m-%d')
-                row['open'] = float(row['open'])
-                row['high'] = float(row['high'])
-                row['low'] = float(row['low'])
+                row['date'] = row['date'].strftime('%Y-%m-%d')
                 row['close'] = float(row['close'])
-                row['volume'] = float(row['volume'])
 
             return rows
         finally:
             cursor.close()
             conn.close()
 
-    def query_latest(self, code: str, days: int = 100) -> List[Dict]:
-        """查询最近N天的数据"""
+    def query_bars_frame(
+        self,
+        codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> 'pd.DataFrame':
+        """一次查询多只股票的日线数据（用于全市场批量扫描）"""
+        import pandas as pd
+
+        columns = ['code', 'date', 'open', 'high', 'low', 'close', 'volume']
+        if not codes:
+            return pd.DataFrame(columns=columns)
+
         conn = self.get_connection()
         cursor = conn.cursor()
 
         try:
-            sql = '''
-                SELECT date, open, high, low, close, volume
-                FROM stock_daily
-                WHERE code = %s
-                ORDER BY date DESC
-                LIMIT %s
-            '''
+            placeholders = ', '.join(['%s'] * len(codes))
+            sql = f"SELECT {', '.join(columns)} FROM stock_daily WHERE code IN ({placeholders})"
+            params = list(codes)
 
-            cursor.execute(sql, (code, days))
-            rows = cursor.fetchall()
+            if start_date:
+                sql += " AND date >= %s"
+                params.append(start_date)
 
-            # 转换格式并按日期升序
-            result = []
-            for row in reversed(rows):
-                result.append({
-                    'date': row['date'].strftime('%Y-%m-%d'),
-                    'open': float(row['open']),
-                    'high': float(row['high']),
-                    'low': float(row['low']),
-                    'close': float(row['close']),
-                    'volume': float(row['volume'])
-                })
-
-            return result
+            if end_date:
+                sql += " AND date <= %s"
+                params.append(end_date)
+
+            cursor.execute(sql + " ORDER BY code ASC, date ASC", params)
+            rows = [dict(format_bar(row), code=row['code']) for row in cursor.fetchall()]
+            return pd.DataFrame(rows, columns=columns)
         finally:
             cursor.close()
             conn.close()
@@ -244,25 +805,92 @@ class StockDatabase:
         cursor = conn.cursor()
 
         try:
-            sql = '''
-                SELECT
-                    MIN(date) as earliest,
-                    MAX(date) as latest,
-                    COUNT(*) as total
+            cursor.execute(self.DATA_RANGE_SQL, (code,))
+            return format_data_range(cursor.fetchone())
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_chart_version(self, code: str) -> Optional[Dict]:
+        """一次查询返回K线内容版本：数据范围、首末收盘价和股票名称"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(self.CHART_VERSION_SQL, (code,) * 4)
+            return format_chart_version(cursor.fetchone())
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_data_versions(self, codes: List[str]) -> Dict[str, Tuple[str, int]]:
+        """一次查询多只股票的 (最新日期, K线数量)"""
+        if not codes:
+            return {}
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            placeholders = ', '.join(['%s'] * len(codes))
+            cursor.execute(f'''
+                SELECT code, MAX(date) as latest, COUNT(*) as total
                 FROM stock_daily
-                WHERE code = %s
-            '''
+                WHERE code IN ({placeholders})
+                GROUP BY code
+            ''', list(codes))
+            return {row['code']: (row['latest'].strftime('%Y-%m-%d'), row['total']) for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_stock_name(self, code: str) -> Optional[str]:
+        """按代码精确查询股票名称"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
 
-            cursor.execute(sql, (code,))
+        try:
+            cursor.execute(self.STOCK_NAME_SQL, (code,))
             row = cursor.fetchone()
+            return row['name'] if row else None
+        finally:
+            cursor.close()
+            conn.close()
+
+    def query_chart_bundle(self, code: str, start_date: Optional[str] = None,
+                           end_date: Optional[str] = None, days: int = 100) -> Dict:
+        """
+        K线接口需要的数据：内容版本（含数据范围和股票名称）、K线数据
+        开启 DB_PIPELINE_QUERIES 时两条查询作为一个多语句请求发送，只需一次网络往返
+        """
+        if not self.pipeline:
+            return super().query_chart_bundle(code, start_date, end_date, days)
+
+        if start_date or end_date:
+            bars_sql, bars_params = self._bars_sql(code, start_date, end_date)
+            latest = False
+        else:
+            bars_sql, bars_params = self._latest_sql(code, days)
+            latest = True
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            sql = ';\n'.join([self.CHART_VERSION_SQL, bars_sql])
+            cursor.execute(sql, [code] * 4 + bars_params)
+
+            version_row = cursor.fetchone()
+            cursor.nextset()
+            rows = cursor.fetchall()
 
-            if row and row['total'] > 0:
-                return {
-                    'earliest': row['earliest'].strftime('%Y-%m-%d') if row['earliest'] else None,
-                    'latest': row['latest'].strftime('%Y-%m-%d') if row['latest'] else None,
-                    'total': row['total']
-                }
-            return None
+            rows = reversed(rows) if latest else rows
+            return {
+                'data_range': format_data_range(version_row),
+                'version': format_chart_version(version_row),
+                'rows': [format_bar(row) for row in rows],
+                'name': version_row['name'] if version_row else None
+            }
         finally:
             cursor.close()
             conn.close()
@@ -385,6 +1013,315 @@ class StockDatabase:
             cursor.close()
             conn.close()
 
+    def get_daily_codes(self) -> List[str]:
+        """获取所有已有日线数据的股票代码"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("SELECT DISTINCT code FROM stock_daily")
+            return [row['code'] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+
+    def upsert_snapshot(self, snapshot: Dict):
+        """写入或更新个股最新状态快照"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            sql = '''
+                INSERT INTO stock_snapshot
+                (code, last_date, last_close, prev_close, change_pct,
+                 dif, dea, macd, macd_state, pen_direction, pen_start_date, total_bars)
+                VALUES (%(code)s, %(last_date)s, %(last_close)s, %(prev_close)s, %(change_pct)s,
+                        %(dif)s, %(dea)s, %(macd)s, %(macd_state)s, %(pen_direction)s,
+                        %(pen_start_date)s, %(total_bars)s)
+                ON DUPLICATE KEY UPDATE
+                    last_date = VALUES(last_date),
+                    last_close = VALUES(last_close),
+                    prev_close = VALUES(prev_close),
+                    change_pct = VALUES(change_pct),
+                    dif = VALUES(dif),
+                    dea = VALUES(dea),
+                    macd = VALUES(macd),
+                    macd_state = VALUES(macd_state),
+                    pen_direction = VALUES(pen_direction),
+                    pen_start_date = VALUES(pen_start_date),
+                    total_bars = VALUES(total_bars)
+            '''
+
+            cursor.execute(sql, snapshot)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def upsert_rollups(self, code: str, period: str, rows: List[Dict]) -> int:
+        """写入或更新周线/月线汇总"""
+        if not rows:
+            return 0
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            sql = '''
+                INSERT INTO stock_rollup
+                (code, period, period_start, date, open, high, low, close, volume)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    date = VALUES(date),
+                    open = VALUES(open),
+                    high = VALUES(high),
+                    low = VALUES(low),
+                    close = VALUES(close),
+                    volume = VALUES(volume)
+            '''
+
+            values = [
+                (code, period, row['period_start'], row['date'], row['open'],
+                 row['high'], row['low'], row['close'], int(row['volume']))
+                for row in rows
+            ]
+            cursor.executemany(sql, values)
+            conn.commit()
+            return len(values)
+        finally:
+            cursor.close()
+            conn.close()
+
+    def query_rollups(
+        self,
+        code: str,
+        period: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict]:
+        """按日期范围查询周线/月线汇总"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            sql = '''
+                SELECT date, open, high, low, close, volume
+                FROM stock_rollup
+                WHERE code = %s AND period = %s
+            '''
+            params = [code, period]
+
+            if start_date:
+                sql += " AND date >= %s"
+                params.append(start_date)
+
+            if end_date:
+                sql += " AND date <= %s"
+                params.append(end_date)
+
+            cursor.execute(sql + " ORDER BY period_start ASC", params)
+            return [format_bar(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            conn.close()
+
+    def upsert_active_pivots(self, code: str, last_date: str, levels: Dict[str, Optional[Dict]]):
+        """写入各级别当前中枢"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            sql = '''
+                INSERT INTO stock_pivot
+                (code, level, last_date, pivot_type, zg, zd, zz, gg, dd,
+                 start_date, end_date, member_count, expansions)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    last_date = VALUES(last_date),
+                    pivot_type = VALUES(pivot_type),
+                    zg = VALUES(zg),
+                    zd = VALUES(zd),
+                    zz = VALUES(zz),
+                    gg = VALUES(gg),
+                    dd = VALUES(dd),
+                    start_date = VALUES(start_date),
+                    end_date = VALUES(end_date),
+                    member_count = VALUES(member_count),
+                    expansions = VALUES(expansions)
+            '''
+
+            cursor.executemany(sql, pivot_values(code, last_date, levels))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_active_pivots(self, codes: List[str]) -> Dict[str, Dict]:
+        """一次查询多只股票已保存的各级别当前中枢"""
+        if not codes:
+            return {}
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            placeholders = ', '.join(['%s'] * len(codes))
+            cursor.execute(
+                f"SELECT * FROM stock_pivot WHERE code IN ({placeholders}) ORDER BY code, level",
+                codes
+            )
+            return format_active_pivots(cursor.fetchall())
+        finally:
+            cursor.close()
+            conn.close()
+
+    def create_watchlist(self, user_id: str, name: str) -> int:
+        """创建自选股分组，返回分组ID"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                "INSERT INTO watchlist (user_id, name) VALUES (%s, %s)",
+                (user_id, name)
+            )
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_watchlists(self, user_id: str) -> List[Dict]:
+        """获取用户的所有自选股分组（含成员数量）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            sql = '''
+                SELECT w.id, w.name, COUNT(i.id) AS total
+                FROM watchlist w
+                LEFT JOIN watchlist_item i ON i.watchlist_id = w.id
+                WHERE w.user_id = %s
+                GROUP BY w.id, w.name
+                ORDER BY w.id ASC
+            '''
+
+            cursor.execute(sql, (user_id,))
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_watchlist(self, watchlist_id: int) -> Optional[Dict]:
+        """获取单个自选股分组"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                "SELECT id, user_id, name FROM watchlist WHERE id = %s",
+                (watchlist_id,)
+            )
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def delete_watchlist(self, watchlist_id: int):
+        """删除自选股分组及其成员"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("DELETE FROM watchlist_item WHERE watchlist_id = %s", (watchlist_id,))
+            cursor.execute("DELETE FROM watchlist WHERE id = %s", (watchlist_id,))
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+
+    def add_watchlist_item(self, watchlist_id: int, code: str) -> bool:
+        """添加自选股成员，已存在时返回 False"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                "INSERT IGNORE INTO watchlist_item (watchlist_id, code) VALUES (%s, %s)",
+                (watchlist_id, code)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            cursor.close()
+            conn.close()
+
+    def remove_watchlist_item(self, watchlist_id: int, code: str) -> bool:
+        """移除自选股成员"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                "DELETE FROM watchlist_item WHERE watchlist_id = %s AND code = %s",
+                (watchlist_id, code)
+            )
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            cursor.close()
+            conn.close()
+
+    def get_watchlist_snapshot(self, watchlist_id: int) -> List[Dict]:
+        """一次查询返回自选股分组内所有成员的最新状态快照"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            sql = '''
+                SELECT
+                    i.code, info.name,
+                    s.last_date, s.last_close, s.change_pct,
+                    s.dif, s.dea, s.macd, s.macd_state,
+                    s.pen_direction, s.pen_start_date,
+                    p.pivot_type, p.zg AS pivot_zg, p.zd AS pivot_zd
+                FROM watchlist_item i
+                LEFT JOIN stock_snapshot s ON s.code = i.code
+                LEFT JOIN stock_pivot p ON p.code = i.code AND p.level = 'daily'
+                LEFT JOIN stock_info info ON info.code = i.code
+                WHERE i.watchlist_id = %s
+                ORDER BY i.id ASC
+            '''
+
+            cursor.execute(sql, (watchlist_id,))
+            rows = cursor.fetchall()
+
+            for row in rows:
+                for key in ('last_date', 'pen_start_date'):
+                    if row[key]:
+                        row[key] = row[key].strftime('%Y-%m-%d')
+                for key in ('last_close', 'change_pct', 'pivot_zg', 'pivot_zd'):
+                    if row[key] is not None:
+                        row[key] = float(row[key])
+
+            return rows
+        finally:
+            cursor.close()
+            conn.close()
+
+
+def create_database(backend: str = DB_BACKEND) -> BaseStockDatabase:
+    """
+    根据配置创建存储后端
+    :param backend: mysql 或 sqlite
+    """
+    if backend == 'sqlite':
+        from sqlite_database import SQLiteStockDatabase
+        return SQLiteStockDatabase()
+    if backend == 'mysql':
+        return StockDatabase()
+    raise ValueError(f"不支持的存储后端: {backend}")
+
 
 # 全局数据库实例
-db = StockDatabase()
+db = create_database()
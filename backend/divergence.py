@@ -0,0 +1,306 @@
+"""
+背驰判断模块
+
+按缠论需求文档的背驰判断规则，比较相邻两段同向走势（笔或线段）的 MACD 柱面积：
+价格创新高（新低）而红柱（绿柱）面积减小即为顶（底）背驰。
+MACD 柱面积保存为前缀和，任意区间的面积 O(1) 得到；
+全市场扫描按代码分块，每个进程一次读取一批股票的K线并行计算。
+单股分析和全市场扫描默认读取相同的历史窗口，MACD 预热和笔的划分一致，两者给出相同的背驰。
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from database import db
+from indicators import calculate_macd
+from chanlun import analyze_chanlun
+from pivot import PivotTracker, build_segments
+
+# 全市场扫描时每批读取的股票数量
+SCAN_CHUNK_SIZE = 200
+# 单股分析和全市场扫描默认读取的历史天数（MACD 需要足够的预热数据）
+LOOKBACK_DAYS = 730
+
+
+def default_start_date() -> str:
+    """默认读取K线的开始日期（最近 LOOKBACK_DAYS 天）"""
+    return (datetime.now() - timedelta(days=LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+
+
+def prefix_sum(values: Sequence[float]) -> np.ndarray:
+    """前缀和：result[i] 为前 i 个值之和，区间 [start, end] 之和为 result[end + 1] - result[start]"""
+    return np.concatenate(([0.0], np.cumsum(np.asarray(values, dtype='float64'))))
+
+
+class MACDArea:
+    """MACD 柱面积（红柱、绿柱分别保存前缀和）"""
+
+    def __init__(self, histogram: Sequence[float]):
+        histogram = np.asarray(histogram, dtype='float64')
+        self.red = prefix_sum(np.where(histogram > 0, histogram, 0.0))
+        self.green = prefix_sum(np.where(histogram < 0, -histogram, 0.0))
+
+    def red_area(self, start: int, end: int) -> float:
+        """[start, end] 区间（含两端）的红柱面积"""
+        return float(self.red[end + 1] - self.red[start])
+
+    def green_area(self, start: int, end: int) -> float:
+        """[start, end] 区间（含两端）的绿柱面积（取正值）"""
+        return float(self.green[end + 1] - self.green[start])
+
+    def leg_area(self, leg: Dict) -> float:
+        """一段走势的同向面积：向上段取红柱面积，向下段取绿柱面积"""
+        if leg['type'] == 'up':
+            return self.red_area(leg['start_index'], leg['end_index'])
+        return self.green_area(leg['start_index'], leg['end_index'])
+
+
+def _leg_summary(leg: Dict, area: float) -> Dict:
+    return {
+        'start_index': leg['start_index'],
+        'end_index': leg['end_index'],
+        'start_price': leg['start_price'],
+        'end_price': leg['end_price'],
+        'area': round(area, 6),
+    }
+
+
+def detect_divergences(
+    legs: List[Dict],
+    histogram: Sequence[float],
+    dif: Sequence[float],
+    volume: Optional[Sequence[float]] = None,
+    level: str = 'pen'
+) -> List[Dict]:
+    """
+    比较相邻两段同向走势，识别顶背驰和底背驰
+    - 顶背驰：向上段创新高，红柱面积小于前一向上段
+    - 底背驰：向下段创新低，绿柱面积小于前一向下段
+    - 趋势背驰：此前最近两个中枢都与当前段同向、且后一个中枢的 [ZD, ZG] 完全在前一个之上（之下），
+      当前段离开后一个中枢并越过其 GG（DD）；否则为盘整背驰
+    :param legs: 走势段列表（笔或线段），每项包含 type/start_index/end_index/start_price/end_price
+    :param histogram: MACD 柱（与K线一一对应）
+    :param dif: DIF 线，用于判断黄白线高度是否同步创新高（新低）
+    :param volume: 成交量，用于判断是否伴随量能萎缩
+    :param level: 走势段级别，写入结果
+    :return: 背驰列表，strength 为面积缩小比例，confidence 为辅助条件（DIF、量能）满足程度
+    """
+    area = MACDArea(histogram)
+    dif = np.asarray(dif, dtype='float64')
+    volume_sum = prefix_sum(volume) if volume is not None else None
+
+    def dif_extreme(leg: Dict) -> float:
+        values = dif[leg['start_index']:leg['end_index'] + 1]
+        return float(values.max() if leg['type'] == 'up' else values.min())
+
+    def average_volume(leg: Dict) -> float:
+        start, end = leg['start_index'], leg['end_index']
+        return float(volume_sum[end + 1] - volume_sum[start]) / (end - start + 1)
+
+    def beyond(leg: Dict, other: Dict) -> bool:
+        if leg['type'] == 'up':
+            return leg['end_price'] > other['end_price']
+        return leg['end_price'] < other['end_price']
+
+    def in_trend(current: Dict) -> bool:
+        # 中枢只由当前段之前的走势段构成
+        pivots = tracker.pivots
+        if len(pivots) < 2:
+            return False
+        earlier, last = pivots[-2], pivots[-1]
+        if earlier['type'] != current['type'] or last['type'] != current['type']:
+            return False
+        if current['type'] == 'up':
+            return last['zd'] > earlier['zg'] and current['end_price'] > last['gg']
+        return last['zg'] < earlier['zd'] and current['end_price'] < last['dd']
+
+    tracker = PivotTracker(level)
+    events: List[Dict] = []
+
+    for k in range(len(legs)):
+        if k:
+            tracker.add_leg(k - 1, legs[k - 1])
+        if k < 2:
+            continue
+
+        previous, current = legs[k - 2], legs[k]
+        if previous['type'] != current['type'] or not beyond(current, previous):
+            continue
+
+        previous_area = area.leg_area(previous)
+        current_area = area.leg_area(current)
+        if previous_area <= 0 or current_area >= previous_area:
+            continue
+
+        is_up = current['type'] == 'up'
+        confirmations = 0
+        checks = 1
+
+        # 黄白线未创新高（新低）
+        if is_up:
+            confirmations += dif_extreme(current) < dif_extreme(previous)
+        else:
+            confirmations += dif_extreme(current) > dif_extreme(previous)
+
+        # 量能萎缩
+        if volume_sum is not None:
+            checks += 1
+            confirmations += average_volume(current) < average_volume(previous)
+
+        events.append({
+            'type': 'top' if is_up else 'bottom',
+            'kind': 'trend' if in_trend(current) else 'consolidation',
+            'level': level,
+            'start_index': previous['start_index'],
+            'end_index': current['end_index'],
+            'price': current['end_price'],
+            'previous_leg': _leg_summary(previous, previous_area),
+            'leg': _leg_summary(current, current_area),
+            'strength': round(1 - current_area / previous_area, 4),
+            'confidence': round(confirmations / checks, 4),
+        })
+
+    return events
+
+
+def analyze_divergence(df: pd.DataFrame, level: str = 'pen') -> Dict:
+    """
+    对一只股票按日期升序的K线数据做背驰分析
+    :param df: K线数据（date/open/high/low/close/volume 列）
+    :param level: pen-笔级别，segment-线段级别
+    :return: {'pen_count': 笔数量, 'events': 背驰列表（附带起止日期）}
+    """
+    if df.empty:
+        return {'pen_count': 0, 'events': []}
+
+    opens = df['open'].to_numpy(dtype='float64')
+    highs = df['high'].to_numpy(dtype='float64')
+    lows = df['low'].to_numpy(dtype='float64')
+    closes = df['close'].to_numpy(dtype='float64')
+    volumes = df['volume'].to_numpy(dtype='float64')
+    dates = [str(d)[:10] for d in df['date'].tolist()]
+
+    macd = calculate_macd(closes)
+    pens = analyze_chanlun(opens, highs, lows, closes)['pens']
+    legs = build_segments(pens) if level == 'segment' else pens
+    events = detect_divergences(legs, macd['macd'], macd['dif'], volumes, level=level)
+
+    for event in events:
+        event['start_date'] = dates[event['start_index']]
+        event['end_date'] = dates[event['end_index']]
+
+    return {'pen_count': len(pens), 'events': events}
+
+
+def get_divergence(code: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                   level: str = 'pen') -> Dict:
+    """
+    单只股票的背驰分析
+    :param code: 股票代码（数据库格式）
+    :param start_date: 读取K线的开始日期，默认与全市场扫描相同（最近 LOOKBACK_DAYS 天）
+    :param level: pen-笔级别，segment-线段级别
+    """
+    if start_date is None:
+        start_date = default_start_date()
+
+    df = db.query_frame(code, start_date, end_date)
+    result = analyze_divergence(df, level)
+    return {
+        'code': code,
+        'level': level,
+        'start_date': start_date,
+        'total_bars': len(df),
+        'pen_count': result['pen_count'],
+        'events': result['events'],
+        'latest': result['events'][-1] if result['events'] else None,
+    }
+
+
+def _scan_chunk(codes: List[str], start_date: Optional[str], recent_bars: int) -> List[Dict]:
+    """扫描一批股票，返回最近 recent_bars 根K线内完成的背驰"""
+    bars = db.query_bars_frame(codes, start_date)
+    results = []
+
+    for code, df in bars.groupby('code', sort=False):
+        events = analyze_divergence(df)['events']
+        cutoff = len(df) - recent_bars
+        recent = [event for event in events if event['end_index'] >= cutoff]
+        if recent:
+            results.append({
+                'code': code,
+                'last_date': str(df['date'].iloc[-1])[:10],
+                'last_close': float(df['close'].iloc[-1]),
+                'events': recent,
+            })
+
+    return results
+
+
+def filter_signals(results: List[Dict], type: Optional[str] = None, kind: Optional[str] = None) -> List[Dict]:
+    """
+    按背驰类型和种类筛选扫描结果，去掉筛选后没有背驰的股票
+    :param type: top-顶背驰，bottom-底背驰
+    :param kind: trend-趋势背驰，consolidation-盘整背驰
+    """
+    if not type and not kind:
+        return results
+
+    matched = []
+    for item in results:
+        events = [
+            event for event in item['events']
+            if (not type or event['type'] == type) and (not kind or event['kind'] == kind)
+        ]
+        if events:
+            matched.append({**item, 'events': events})
+    return matched
+
+
+def scan_divergences(
+    codes: Optional[List[str]] = None,
+    start_date: Optional[str] = None,
+    recent_bars: int = 5,
+    workers: Optional[int] = None
+) -> Dict:
+    """
+    全市场背驰扫描
+    :param codes: 股票代码列表，默认为所有已有日线数据的股票
+    :param start_date: 读取K线的开始日期，默认为最近 LOOKBACK_DAYS 天（与单股分析相同）
+    :param recent_bars: 只返回最近 N 根K线内完成的背驰
+    :param workers: 并行进程数，默认为 CPU 核数；1 表示在当前进程中计算
+    """
+    started = time.perf_counter()
+
+    if codes is None:
+        codes = db.get_daily_codes()
+    if start_date is None:
+        start_date = default_start_date()
+
+    chunks = [codes[i:i + SCAN_CHUNK_SIZE] for i in range(0, len(codes), SCAN_CHUNK_SIZE)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(chunks)))
+
+    if workers == 1:
+        chunk_results = [_scan_chunk(chunk, start_date, recent_bars) for chunk in chunks]
+    else:
+        # 使用 spawn 启动子进程，避免 fork 复制父进程连接池中的数据库连接
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            chunk_results = list(executor.map(
+                _scan_chunk, chunks, [start_date] * len(chunks), [recent_bars] * len(chunks)
+            ))
+
+    results = [item for chunk in chunk_results for item in chunk]
+
+    return {
+        'scanned': len(codes),
+        'matched': len(results),
+        'start_date': start_date,
+        'recent_bars': recent_bars,
+        'workers': workers,
+        'elapsed_seconds': round(time.perf_counter() - started, 3),
+        'results': results,
+    }
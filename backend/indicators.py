@@ -0,0 +1,57 @@
+"""技术指标计算模块"""
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+
+
+def calculate_ema(values, period: int) -> np.ndarray:
+    """
+    计算EMA（指数移动平均），第一个值取第一个价格，与前端 indicators.ts 保持一致
+    :param values: 价格序列
+    :param period: 周期
+    :return: EMA序列
+    """
+    series = pd.Series(values, dtype='float64')
+    return series.ewm(span=period, adjust=False).mean().to_numpy()
+
+
+def calculate_macd(
+    closes,
+    fast_period: int = 12,
+    slow_period: int = 26,
+    signal_period: int = 9
+) -> Dict[str, np.ndarray]:
+    """
+    计算MACD指标
+    :param closes: 收盘价序列
+    :return: {'dif': DIF线, 'dea': DEA线, 'macd': MACD柱状图（(DIF-DEA)*2）}
+    """
+    closes = np.asarray(closes, dtype='float64')
+    if closes.size == 0:
+        empty = np.empty(0)
+        return {'dif': empty, 'dea': empty, 'macd': empty}
+
+    dif = calculate_ema(closes, fast_period) - calculate_ema(closes, slow_period)
+    dea = calculate_ema(dif, signal_period)
+    macd = (dif - dea) * 2
+
+    return {'dif': dif, 'dea': dea, 'macd': macd}
+
+
+def macd_state(dif: np.ndarray, dea: np.ndarray) -> Optional[str]:
+    """
+    判断最新一根K线的MACD状态
+    :return: golden_cross-金叉，dead_cross-死叉，bullish-多头，bearish-空头
+    """
+    if len(dif) == 0:
+        return None
+
+    above = dif[-1] >= dea[-1]
+    if len(dif) >= 2:
+        was_above = dif[-2] >= dea[-2]
+        if above and not was_above:
+            return 'golden_cross'
+        if not above and was_above:
+            return 'dead_cross'
+
+    return 'bullish' if above else 'bearish'
@@ -1,19 +1,53 @@
-from fastapi import FastAPI, HTTPException, Query, BackgroundTasks
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timedelta
-import akshare as ak
-import pandas as pd
-from typing import List, Dict, Optional
-from database import db
+from typing import List, Dict, Literal, Optional
+from config import DB_AUTO_MIGRATE, DB_BACKEND, PIPELINE_ENABLED
+from database import db, current_scope, release_request_connection
+import chart_cache
+from market_data import DEFAULT_INDICES, fetch_daily_bars, fetch_stock_list, market_of, normalize_stock_code
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    服务启动时执行建表检查（DB_AUTO_MIGRATE=1 时）和定时调度，退出时停止调度
+    不放在模块顶层：背驰扫描以 spawn 方式启动的子进程会重新导入 main，导入本身不能有副作用
+    """
+    global STARTUP_SECONDS
+    started = time.perf_counter()
+
+    # 默认不执行建表检查，由 python migrate.py 在部署时执行一次
+    if DB_AUTO_MIGRATE:
+        try:
+            await run_in_threadpool(db.init_database)
+            print("数据库初始化成功")
+        except Exception as e:
+            print(f"数据库初始化失败: {e}")
 
-app = FastAPI(title="Stock Analysis API")
+    # 启动收盘后数据流水线的定时调度（多 worker 部署时只在一个进程中开启）
+    if PIPELINE_ENABLED:
+        from pipeline import scheduler
+        scheduler.start()
 
-# 初始化数据库
-try:
-    db.init_database()
-    print("数据库初始化成功")
-except Exception as e:
-    print(f"数据库初始化失败: {e}")
+    STARTUP_SECONDS += time.perf_counter() - started
+    print(f"API 进程启动耗时 {STARTUP_SECONDS:.3f}s，内存占用 {process_memory_mb() or 0:.1f}MB")
+
+    yield
+
+    if PIPELINE_ENABLED:
+        scheduler.stop()
+
+
+app = FastAPI(title="Stock Analysis API", lifespan=lifespan)
 
 # 配置CORS
 app.add_middleware(
@@ -25,11 +59,62 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def db_connection_scope(request: Request, call_next):
+    """
+    每个请求最多同时持有一个连接池连接，请求内的所有查询复用该连接，响应后归还
+    （接口在下载 akshare 数据前调用 release_request_connection 提前归还）
+    """
+    scope = db.connection_scope()
+    if scope is None:
+        return await call_next(request)
+
+    token = current_scope.set(scope)
+    try:
+        return await call_next(request)
+    finally:
+        current_scope.reset(token)
+        await run_in_threadpool(scope.release)
+
+
+def process_memory_mb() -> Optional[float]:
+    """当前进程的常驻内存（MB），无法获取时返回 None"""
+    try:
+        # Linux：/proc/self/statm 第二列为常驻页数
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 返回字节，Linux 返回 KB
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        return None
+
+
 @app.get("/")
 def read_root():
     return {"message": "Stock Analysis API is running"}
 
 
+@app.get("/api/status")
+def get_status():
+    """
+    进程状态：启动耗时、当前内存占用和连接池等待统计（用于评估 worker 扩容成本和连接池大小）
+    """
+    return {
+        "pid": os.getpid(),
+        "db_backend": DB_BACKEND,
+        "auto_migrate": DB_AUTO_MIGRATE,
+        "startup_seconds": round(STARTUP_SECONDS, 4),
+        "rss_mb": round(process_memory_mb() or 0, 1),
+        "pool": db.pool_stats()
+    }
+
+
 @app.get("/api/stocks/list")
 def get_stock_list(type: Optional[str] = Query(None, description="类型筛选：stock-股票，index-指数")):
     """
@@ -70,7 +155,8 @@ def sync_stock_list():
         print("开始同步股票列表...")
 
         # 使用akshare获取A股股票列表
-        df = ak.stock_zh_a_spot()
+        release_request_connection()
+        df = fetch_stock_list()
 
         if df is None or df.empty:
             raise HTTPException(status_code=404, detail="No stock list from akshare")
@@ -83,29 +169,14 @@ def sync_stock_list():
             try:
                 code = row['代码']
                 name = row['名称']
-
-                # 判断市场
-                if code.startswith('6'):
-                    market = '上交所'
-                elif code.startswith('0') or code.startswith('3'):
-                    market = '深交所'
-                else:
-                    market = '其他'
-
-                db.add_stock_info(code, name, market, 'stock')
+                db.add_stock_info(code, name, market_of(code), 'stock')
                 inserted += 1
             except Exception as e:
                 print(f"插入股票 {code} 失败: {e}")
                 continue
 
         # 同时添加常用指数
-        indices = [
-            ('sh000001', '上证指数', '上交所', 'index'),
-            ('sz399001', '深证成指', '深交所', 'index'),
-            ('sz399006', '创业板指', '深交所', 'index'),
-        ]
-
-        for code, name, market, type_ in indices:
+        for code, name, market, type_ in DEFAULT_INDICES:
             db.add_stock_info(code, name, market, type_)
 
         print(f"同步完成，更新了 {inserted} 支股票")
@@ -132,42 +203,24 @@ def sync_stock_data(code: str):
         # 规范化股票代码
         db_code, pure_code, is_index = normalize_stock_code(code)
 
-        # 根据类型选择不同的akshare接口
-        if is_index:
-            # 指数使用专门的接口
-            print(f"使用指数接口获取数据: {db_code}")
-            df = ak.stock_zh_index_daily(symbol=db_code)
-        else:
-            # 股票使用前复权接口
-            print(f"使用股票接口获取数据: {pure_code}")
-            df = ak.stock_zh_a_hist(symbol=pure_code, adjust="qfq")
+        release_request_connection()
+        df = fetch_daily_bars(db_code, pure_code, is_index)
 
-        if df is None or df.empty:
+        if df.empty:
             raise HTTPException(status_code=404, detail=f"No data for {code}")
 
-        # 确保date列是datetime类型并统一列名
-        if is_index:
-            # 指数接口返回：date, open, close, high, low, volume
-            df['date'] = pd.to_datetime(df['date'])
-        else:
-            # 股票接口返回：日期, 开盘, 收盘, 最高, 最低, 成交量
-            df['date'] = pd.to_datetime(df['日期'])
-            df = df.rename(columns={
-                '开盘': 'open',
-                '最高': 'high',
-                '最低': 'low',
-                '收盘': 'close',
-                '成交量': 'volume'
-            })
-
         print(f"从akshare获取到 {len(df)} 条数据")
 
         # 批量插入数据库
-        inserted = db.insert_batch(db_code, df[['date', 'open', 'high', 'low', 'close', 'volume']])
+        inserted = db.insert_batch(db_code, df)
 
         # 更新同步记录
         db.update_sync_record(db_code, len(df))
 
+        # 刷新个股快照和对比分析缓存
+        if inserted > 0:
+            on_bars_written(db_code)
+
         # 获取数据库中的数据范围
         data_range = db.get_data_range(db_code)
 
@@ -186,37 +239,54 @@ def sync_stock_data(code: str):
         raise HTTPException(status_code=500, detail=f"Sync failed: {str(e)}")
 
 
-def normalize_stock_code(code: str) -> tuple:
-    """
-    规范化股票代码
-    :param code: 输入的股票代码（可能是 600000 或 sh600000 格式）
-    :return: (数据库中的代码, akshare使用的代码, 是否是指数)
-    """
-    code = code.lower().strip()
+def refresh_snapshot_safely(db_code: str):
+    """刷新个股快照，失败时只打印日志，不影响数据同步结果"""
+    from snapshot import refresh_snapshot
+
+    try:
+        refresh_snapshot(db_code)
+    except Exception as e:
+        print(f"刷新 {db_code} 快照失败: {e}")
+
+
+def refresh_pivots_safely(db_code: str):
+    """刷新保存的当前中枢，失败时只打印日志，不影响数据同步结果"""
+    from pivot import refresh_active_pivots
+
+    try:
+        refresh_active_pivots(db_code)
+    except Exception as e:
+        print(f"刷新 {db_code} 中枢失败: {e}")
 
-    # 判断是否已经带有市场前缀
-    if code.startswith('sh') or code.startswith('sz'):
-        db_code = code  # 数据库中存储的格式：sh600000
-        pure_code = code[2:]  # akshare使用的格式：600000
-    else:
-        pure_code = code  # 输入就是纯数字：600000
-        # 根据代码判断市场
-        if code.startswith('6'):
-            db_code = 'sh' + code  # 6开头是上交所
-        elif code.startswith('0') or code.startswith('3'):
-            db_code = 'sz' + code  # 0或3开头是深交所
-        else:
-            db_code = code  # 其他情况保持原样
 
-    # 判断是否是指数（000001是上证指数，399001是深证成指等）
-    is_index = code in ['000001', 'sh000001', '399001', 'sz399001', '399006', 'sz399006']
+def on_bars_written(db_code: str):
+    """K线写入后刷新依赖该股票数据的派生状态"""
+    from comparison import invalidate_panels
 
-    return db_code, pure_code, is_index
+    invalidate_panels(db_code)
+    chart_cache.invalidate(db_code)
+    refresh_snapshot_safely(db_code)
+    refresh_pivots_safely(db_code)
+
+
+def chart_headers(etag: str) -> Dict[str, str]:
+    """K线响应的缓存相关响应头（客户端每次使用前用 If-None-Match 重新验证）"""
+    return {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+
+def chart_response(cached: "chart_cache.CachedResponse", request: Request) -> Response:
+    """按客户端接受的压缩编码返回缓存的K线响应体"""
+    body, encoding = cached.body(request.headers.get("accept-encoding"))
+    headers = chart_headers(cached.etag)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/api/stock/{code}")
 def get_stock_data(
     code: str,
+    request: Request,
     start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
     end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
     days: int = Query(100, description="获取最近多少天的数据")
@@ -228,10 +298,8 @@ def get_stock_data(
     :param start_date: 开始日期，格式：YYYY-MM-DD
     :param end_date: 结束日期，格式：YYYY-MM-DD
     :param days: 如果没有指定日期范围，则获取最近N天的数据
-    :return: K线数据列表
+    :return: K线数据列表（带 ETag，数据未变化时对 If-None-Match 返回 304）
     """
-    import time
-
     try:
         # 规范化股票代码
         db_code, pure_code, is_index = normalize_stock_code(code)
@@ -240,31 +308,37 @@ def get_stock_data(
         print(f"原始代码: {code}, 数据库代码: {db_code}, akshare代码: {pure_code}, 是否指数: {is_index}")
         print(f"参数: start_date={start_date}, end_date={end_date}, days={days}")
 
-        # 检查数据库中是否有该股票的数据（使用数据库格式的代码）
-        data_range = db.get_data_range(db_code)
+        # 条件请求和缓存命中只需查询内容版本，ETag 未变化时不读取K线数据
+        cache_key = (db_code, start_date, end_date, days)
+        if_none_match = request.headers.get("if-none-match")
+        cached = chart_cache.get_cached(cache_key)
+
+        if if_none_match or cached:
+            version = db.get_chart_version(db_code)
+            if version:
+                etag = chart_cache.make_etag(db_code, version, start_date, end_date, days)
+                if chart_cache.etag_matches(if_none_match, etag):
+                    return Response(status_code=304, headers=chart_headers(etag))
+                if cached and cached.etag == etag:
+                    return chart_response(cached, request)
+
+        # 内容版本（数据范围、股票名称）和K线数据一起查询（开启 DB_PIPELINE_QUERIES 时只需一次往返）
+        bundle = db.query_chart_bundle(db_code, start_date, end_date, days)
+        auto_synced = not bundle['data_range']
 
         # 如果数据库中没有数据，自动同步
-        if not data_range:
+        if auto_synced:
             print(f"数据库中没有股票 {db_code} 的数据，开始自动同步...")
 
             try:
-                # 获取股票信息（名称等）
-                stock_info = db.search_stocks(db_code)
-                stock_name = stock_info[0]['name'] if stock_info else "未知股票"
+                stock_name = bundle['name'] or "未知股票"
 
                 print(f"正在同步 {stock_name} ({db_code}) 的历史数据...")
 
-                # 根据类型选择不同的akshare接口
-                if is_index:
-                    # 指数使用专门的接口
-                    print(f"使用指数接口获取数据: {db_code}")
-                    df = ak.stock_zh_index_daily(symbol=db_code)
-                else:
-                    # 股票使用前复权接口（使用纯数字代码）
-                    print(f"使用股票接口获取数据: {pure_code}")
-                    df = ak.stock_zh_a_hist(symbol=pure_code, period="daily", adjust="qfq")
-
-                if df is None or df.empty:
+                release_request_connection()
+                df = fetch_daily_bars(db_code, pure_code, is_index)
+
+                if df.empty:
                     raise HTTPException(
                         status_code=404,
                         detail=f"无法从 akshare 获取股票 {db_code} 的数据，请检查股票代码是否正确"
@@ -272,30 +346,16 @@ def get_stock_data(
 
                 print(f"从 akshare 获取到 {len(df)} 条数据")
 
-                # 转换数据格式为统一的列名
-                # 指数接口返回的列名是英文，股票接口返回的是中文
-                if is_index:
-                    # 指数接口返回：date, open, close, high, low, volume
-                    df['date'] = pd.to_datetime(df['date'])
-                else:
-                    # 股票接口返回：日期, 开盘, 收盘, 最高, 最低, 成交量
-                    df['date'] = pd.to_datetime(df['日期'])
-                    df = df.rename(columns={
-                        '开盘': 'open',
-                        '最高': 'high',
-                        '最低': 'low',
-                        '收盘': 'close',
-                        '成交量': 'volume'
-                    })
-
                 # 批量插入数据库（使用数据库格式的代码）
-                inserted = db.insert_batch(db_code, df[['date', 'open', 'high', 'low', 'close', 'volume']])
+                inserted = db.insert_batch(db_code, df)
 
                 print(f"自动同步完成，插入 {inserted} 条数据")
 
-                # 等待一下再查询，确保数据已写入
-                time.sleep(0.5)
+                # 刷新个股快照和对比分析缓存
+                on_bars_written(db_code)
 
+            except HTTPException:
+                raise
             except Exception as sync_error:
                 print(f"自动同步失败: {sync_error}")
                 raise HTTPException(
@@ -303,16 +363,11 @@ def get_stock_data(
                     detail=f"自动同步数据失败: {str(sync_error)}"
                 )
 
-        # 从数据库查询数据（使用数据库格式的代码）
-        if start_date and end_date:
-            result = db.query_by_date_range(db_code, start_date, end_date)
-            print(f"数据库返回 {len(result)} 条数据")
-        elif start_date or end_date:
-            result = db.query_by_date_range(db_code, start_date, end_date)
-            print(f"数据库返回 {len(result)} 条数据")
-        else:
-            result = db.query_latest(db_code, days)
-            print(f"数据库返回最近 {len(result)} 条数据")
+            # 写入已提交，重新查询
+            bundle = db.query_chart_bundle(db_code, start_date, end_date, days)
+
+        result = bundle['rows']
+        print(f"数据库返回 {len(result)} 条数据")
 
         if not result:
             raise HTTPException(
@@ -320,33 +375,357 @@ def get_stock_data(
                 detail=f"未能获取到股票 {db_code} 的数据"
             )
 
-        # 获取数据库中该股票的最早日期（如果之前没有查询过）
-        if not data_range:
-            data_range = db.get_data_range(db_code)
-
+        data_range = bundle['data_range']
         earliest_date_in_db = data_range['earliest'] if data_range else None
         print(f"数据库最早日期: {earliest_date_in_db}")
 
-        # 获取股票名称
-        stock_info = db.search_stocks(db_code)
-        stock_name = stock_info[0]['name'] if stock_info else db_code
+        stock_name = bundle['name'] or db_code
 
-        return {
+        payload = {
             "code": db_code,  # 返回数据库格式的代码
             "name": stock_name,
             "data": result,
             "total": len(result),
             "from_database": True,
-            "auto_synced": not bool(data_range),  # 标记是否是自动同步的
+            "auto_synced": auto_synced,  # 标记是否是自动同步的
             "earliestDate": earliest_date_in_db  # 数据库中的最早日期
         }
 
+        # 自动同步的响应带有一次性的标记，不缓存
+        if auto_synced:
+            return payload
+
+        etag = chart_cache.make_etag(db_code, bundle['version'], start_date, end_date, days)
+        return chart_response(chart_cache.store(cache_key, etag, payload), request)
+
     except HTTPException:
         raise
     except Exception as e:
         print(f"查询失败: {e}")
         raise HTTPException(status_code=500, detail=f"Error fetching data: {str(e)}")
 
+
+@app.post("/api/sync/snapshots")
+def sync_snapshots():
+    """
+    为数据库中所有已有日线数据的股票重建快照
+    """
+    from snapshot import refresh_snapshot
+
+    try:
+        codes = db.get_daily_codes()
+        refreshed = 0
+        for db_code in codes:
+            try:
+                if refresh_snapshot(db_code):
+                    refreshed += 1
+            except Exception as e:
+                print(f"刷新 {db_code} 快照失败: {e}")
+                continue
+
+        return {
+            "success": True,
+            "total": len(codes),
+            "refreshed": refreshed
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.get("/api/compare")
+def compare(
+    codes: str = Query(..., description="股票代码列表，逗号分隔"),
+    benchmark: Literal["sh000001", "sz399001", "sz399006"] = Query(
+        "sh000001", description="基准指数：sh000001-上证指数，sz399001-深证成指，sz399006-创业板指"
+    ),
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
+    window: int = Query(60, ge=2, description="滚动窗口（交易日数）")
+):
+    """
+    多股票对比分析：按交易日历对齐后返回归一化走势、收益率相关系数矩阵、
+    相对基准的滚动相关系数和 Beta
+    """
+    from comparison import compare_stocks
+
+    try:
+        db_codes = []
+        for code in codes.split(','):
+            if code.strip():
+                db_code = normalize_stock_code(code)[0]
+                if db_code not in db_codes:
+                    db_codes.append(db_code)
+
+        if not db_codes:
+            raise HTTPException(status_code=400, detail="请至少指定一只股票")
+
+        return compare_stocks(db_codes, benchmark, start_date, end_date, window)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.get("/api/divergence/{code}")
+def get_divergence(
+    code: str,
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD，默认与全市场扫描相同（最近730天）"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD"),
+    level: str = Query("pen", pattern="^(pen|segment)$", description="走势级别：pen-笔，segment-线段")
+):
+    """
+    单只股票的背驰分析（顶背驰、底背驰，区分盘整背驰和趋势背驰）
+    """
+    from divergence import get_divergence as analyze
+
+    try:
+        db_code = normalize_stock_code(code)[0]
+        result = analyze(db_code, start_date, end_date, level)
+        if not result['total_bars']:
+            raise HTTPException(status_code=404, detail=f"数据库中没有股票 {db_code} 在 {result['start_date']} 之后的数据")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.get("/api/scan/divergence")
+def scan_divergence(
+    recent_bars: int = Query(5, ge=1, description="只返回最近N根K线内完成的背驰"),
+    type: Optional[str] = Query(None, description="背驰类型筛选：top-顶背驰，bottom-底背驰"),
+    kind: Optional[str] = Query(None, description="背驰种类筛选：trend-趋势背驰，consolidation-盘整背驰"),
+    workers: Optional[int] = Query(None, ge=1, description="并行进程数，默认为CPU核数")
+):
+    """
+    全市场背驰扫描：对所有已有日线数据的股票计算背驰，返回最近完成的背驰信号
+    """
+    from divergence import filter_signals, scan_divergences
+
+    try:
+        result = scan_divergences(recent_bars=recent_bars, workers=workers)
+        result['results'] = filter_signals(result['results'], type, kind)
+        result['matched'] = len(result['results'])
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.get("/api/pivots")
+def get_active_pivots(codes: str = Query(..., description="股票代码列表，逗号分隔")):
+    """
+    批量获取各股票每个级别当前中枢的 ZG/ZD/GG/DD（没有数据的股票返回 null）
+    读取收盘后数据流水线和K线写入时保存的结果，一次查询返回全部股票
+    """
+    from pivot import active_pivots
+
+    try:
+        db_codes = []
+        for code in codes.split(','):
+            if code.strip():
+                db_code = normalize_stock_code(code.strip())[0]
+                if db_code not in db_codes:
+                    db_codes.append(db_code)
+        return active_pivots(db_codes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.get("/api/pivots/{code}")
+def get_pivots(code: str):
+    """
+    多级别线段和中枢：日线笔构成日线线段和中枢，日线线段再构成周线级别的线段和中枢
+    """
+    from pivot import get_structure
+
+    try:
+        db_code = normalize_stock_code(code)[0]
+        result = get_structure(db_code)
+        if result is None:
+            raise HTTPException(status_code=404, detail=f"数据库中没有股票 {db_code} 在 {result['start_date']} 之后的数据")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.get("/api/pipeline/status")
+def get_pipeline_status():
+    """
+    收盘后数据流水线状态：定时调度、最近一次运行各阶段的耗时和变化数量、待重试的股票数
+    """
+    from pipeline import pipeline, scheduler
+
+    return {**pipeline.status(), "scheduler": scheduler.status()}
+
+
+@app.post("/api/pipeline/run")
+def run_pipeline(full: bool = Query(False, description="是否全量处理所有已有日线数据的股票")):
+    """
+    立即在后台运行一次收盘后数据流水线
+    """
+    from pipeline import pipeline
+
+    if not pipeline.start('manual', full):
+        raise HTTPException(status_code=409, detail="流水线正在运行")
+    return {"success": True, "message": "流水线已开始运行"}
+
+
+@app.get("/api/pipeline/signals")
+def get_pipeline_signals(
+    type: Optional[str] = Query(None, description="背驰类型筛选：top-顶背驰，bottom-底背驰"),
+    kind: Optional[str] = Query(None, description="背驰种类筛选：trend-趋势背驰，consolidation-盘整背驰")
+):
+    """
+    流水线选股阶段保存的背驰信号（无需重新扫描全市场）
+    """
+    from pipeline import pipeline
+    from divergence import filter_signals
+
+    results = filter_signals(pipeline.signals(), type, kind)
+    return {"matched": len(results), "results": results}
+
+
+@app.get("/api/stock/{code}/rollup")
+def get_stock_rollup(
+    code: str,
+    period: str = Query("week", pattern="^(week|month)$", description="周期：week-周线，month-月线"),
+    start_date: Optional[str] = Query(None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="结束日期 YYYY-MM-DD")
+):
+    """
+    获取流水线汇总的周线/月线数据
+    """
+    try:
+        db_code, _, _ = normalize_stock_code(code)
+        data = db.query_rollups(db_code, period, start_date, end_date)
+        if not data:
+            raise HTTPException(status_code=404, detail=f"No {period} rollup for {code}")
+
+        return {
+            "code": db_code,
+            "period": period,
+            "data": data,
+            "count": len(data)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.get("/api/watchlists")
+def get_watchlists(user_id: str = Query("default", description="用户标识")):
+    """
+    获取用户的自选股分组列表
+    """
+    try:
+        watchlists = db.get_watchlists(user_id)
+        return {
+            "user_id": user_id,
+            "total": len(watchlists),
+            "watchlists": watchlists
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.post("/api/watchlists")
+def create_watchlist(
+    name: str = Query(..., description="自选股分组名称"),
+    user_id: str = Query("default", description="用户标识")
+):
+    """
+    创建自选股分组
+    """
+    try:
+        watchlist_id = db.create_watchlist(user_id, name)
+        return {"success": True, "id": watchlist_id, "name": name}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+def get_watchlist_or_404(watchlist_id: int) -> Dict:
+    """获取自选股分组，不存在时返回404"""
+    watchlist = db.get_watchlist(watchlist_id)
+    if not watchlist:
+        raise HTTPException(status_code=404, detail=f"自选股分组 {watchlist_id} 不存在")
+    return watchlist
+
+
+@app.delete("/api/watchlists/{watchlist_id}")
+def delete_watchlist(watchlist_id: int):
+    """
+    删除自选股分组
+    """
+    try:
+        get_watchlist_or_404(watchlist_id)
+        db.delete_watchlist(watchlist_id)
+        return {"success": True, "id": watchlist_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.post("/api/watchlists/{watchlist_id}/stocks/{code}")
+def add_watchlist_stock(watchlist_id: int, code: str):
+    """
+    添加股票到自选股分组（快照不存在时立即计算一次）
+    """
+    try:
+        get_watchlist_or_404(watchlist_id)
+        db_code, _, _ = normalize_stock_code(code)
+        added = db.add_watchlist_item(watchlist_id, db_code)
+        if added:
+            refresh_snapshot_safely(db_code)
+        return {"success": True, "code": db_code, "added": added}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.delete("/api/watchlists/{watchlist_id}/stocks/{code}")
+def remove_watchlist_stock(watchlist_id: int, code: str):
+    """
+    从自选股分组移除股票
+    """
+    try:
+        get_watchlist_or_404(watchlist_id)
+        db_code, _, _ = normalize_stock_code(code)
+        removed = db.remove_watchlist_item(watchlist_id, db_code)
+        return {"success": True, "code": db_code, "removed": removed}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+
+@app.get("/api/watchlists/{watchlist_id}/snapshot")
+def get_watchlist_snapshot(watchlist_id: int):
+    """
+    获取自选股分组内所有股票的最新价、涨跌幅、MACD状态和最新笔方向
+    （读取写入K线时预先计算的快照，单次查询返回全部成员）
+    """
+    try:
+        watchlist = get_watchlist_or_404(watchlist_id)
+        stocks = db.get_watchlist_snapshot(watchlist_id)
+        return {
+            "id": watchlist_id,
+            "name": watchlist['name'],
+            "total": len(stocks),
+            "stocks": stocks
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
+
+# 启动耗时：模块加载（导入依赖、创建应用），服务启动时再加上建表检查等启动步骤
+STARTUP_SECONDS = time.perf_counter() - _import_started
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
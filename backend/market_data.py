@@ -0,0 +1,116 @@
+"""
+行情数据获取模块
+
+封装 akshare 的股票列表、股票日线和指数日线接口，统一返回列名，
+供同步接口和收盘后数据流水线共用。akshare 和 pandas 在调用时才导入。
+"""
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 支持的指数代码（纯数字和带市场前缀两种格式）
+INDEX_CODES = ['000001', 'sh000001', '399001', 'sz399001', '399006', 'sz399006']
+
+# 同步股票列表时一并添加的常用指数：(代码, 名称, 市场, 类型)
+DEFAULT_INDICES: List[Tuple[str, str, str, str]] = [
+    ('sh000001', '上证指数', '上交所', 'index'),
+    ('sz399001', '深证成指', '深交所', 'index'),
+    ('sz399006', '创业板指', '深交所', 'index'),
+]
+
+BAR_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+
+
+def normalize_stock_code(code: str) -> tuple:
+    """
+    规范化股票代码
+    :param code: 输入的股票代码（可能是 600000 或 sh600000 格式）
+    :return: (数据库中的代码, akshare使用的代码, 是否是指数)
+    """
+    code = code.lower().strip()
+
+    # 判断是否已经带有市场前缀
+    if code.startswith('sh') or code.startswith('sz'):
+        db_code = code  # 数据库中存储的格式：sh600000
+        pure_code = code[2:]  # akshare使用的格式：600000
+    else:
+        pure_code = code  # 输入就是纯数字：600000
+        # 根据代码判断市场
+        if code.startswith('6'):
+            db_code = 'sh' + code  # 6开头是上交所
+        elif code.startswith('0') or code.startswith('3'):
+            db_code = 'sz' + code  # 0或3开头是深交所
+        else:
+            db_code = code  # 其他情况保持原样
+
+    # 判断是否是指数（000001是上证指数，399001是深证成指等）
+    is_index = code in INDEX_CODES
+
+    return db_code, pure_code, is_index
+
+
+def market_of(code: str) -> str:
+    """根据股票代码判断市场"""
+    if code.startswith('6'):
+        return '上交所'
+    if code.startswith('0') or code.startswith('3'):
+        return '深交所'
+    return '其他'
+
+
+def fetch_stock_list() -> 'pd.DataFrame':
+    """从 akshare 获取A股股票列表（代码、名称等列）"""
+    import akshare as ak
+    return ak.stock_zh_a_spot()
+
+
+def fetch_daily_bars(db_code: str, pure_code: str, is_index: bool,
+                     start_date: Optional[str] = None) -> 'pd.DataFrame':
+    """
+    从 akshare 获取日线数据并统一列名
+    :param db_code: 数据库格式的代码（指数接口使用）
+    :param pure_code: 纯数字代码（股票接口使用）
+    :param is_index: 是否是指数
+    :param start_date: 只返回该日期（含）之后的数据，格式 YYYY-MM-DD
+    :return: date/open/high/low/close/volume 列的 DataFrame，没有数据时为空
+    """
+    import akshare as ak
+    import pandas as pd
+
+    # 根据类型选择不同的akshare接口
+    if is_index:
+        # 指数使用专门的接口（不支持日期参数，取回后再过滤）
+        print(f"使用指数接口获取数据: {db_code}")
+        df = ak.stock_zh_index_daily(symbol=db_code)
+    else:
+        # 股票使用前复权接口（使用纯数字代码）
+        print(f"使用股票接口获取数据: {pure_code}")
+        params = {'symbol': pure_code, 'period': 'daily', 'adjust': 'qfq'}
+        if start_date:
+            params['start_date'] = start_date.replace('-', '')
+        df = ak.stock_zh_a_hist(**params)
+
+    if df is None or df.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+
+    # 转换数据格式为统一的列名
+    # 指数接口返回的列名是英文，股票接口返回的是中文
+    if is_index:
+        # 指数接口返回：date, open, close, high, low, volume
+        df['date'] = pd.to_datetime(df['date'])
+    else:
+        # 股票接口返回：日期, 开盘, 收盘, 最高, 最低, 成交量
+        df['date'] = pd.to_datetime(df['日期'])
+        df = df.rename(columns={
+            '开盘': 'open',
+            '最高': 'high',
+            '最低': 'low',
+            '收盘': 'close',
+            '成交量': 'volume'
+        })
+
+    df = df[BAR_COLUMNS]
+    if start_date:
+        df = df[df['date'] >= pd.Timestamp(start_date)]
+    return df.reset_index(drop=True)
@@ -0,0 +1,20 @@
+"""
+数据库迁移命令：创建或检查数据表结构
+
+API 进程启动时默认不执行建表语句（DB_AUTO_MIGRATE=0），
+首次部署和每次升级后执行一次：
+    python migrate.py
+"""
+import time
+from database import db
+
+
+def migrate():
+    """执行建表检查"""
+    start = time.perf_counter()
+    db.init_database()
+    print(f"数据表结构检查完成，耗时 {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,586 @@
+"""
+收盘后数据流水线
+
+按依赖顺序执行：股票列表同步 → 增量日线同步 → 周线/月线汇总 → 指标快照 → 缠论线段和中枢 → 选股信号。
+日线同步阶段记录每只股票新增K线的最早日期，之后的阶段只处理这些股票，按股票并行；
+某只股票处理失败时记入待重试列表，下次运行时与新的变化一起处理。
+运行状态写入 JSON 文件，进程重启后同一交易日中断的运行从未完成的阶段继续。
+运行期间持有状态文件旁的锁文件（操作系统级排他锁，进程退出时自动释放），
+多个 worker 或 cron 同时触发时只有一个进程运行，其他进程不会把正在进行的运行误判为中断。
+
+单独执行一次：
+    python pipeline.py [--full]
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+import chart_cache
+from config import PIPELINE_RUN_AT, PIPELINE_STATE_PATH, PIPELINE_WORKERS
+from database import db
+from market_data import DEFAULT_INDICES, fetch_daily_bars, fetch_stock_list, market_of, normalize_stock_code
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+STAGES = ('stock_list', 'bars', 'rollups', 'indicators', 'chan', 'screener')
+
+# 状态文件中保留的运行记录数
+HISTORY_SIZE = 30
+# 状态接口中每个阶段最多展示的失败股票数
+FAILED_PREVIEW_SIZE = 20
+# 选股信号只保留最近N根K线内完成的背驰
+SCREENER_RECENT_BARS = 5
+
+
+def _now() -> str:
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ProcessLock:
+    """
+    跨进程排他锁（锁文件 + flock，Windows 上为 msvcrt.locking）
+    锁属于打开的文件，持有锁的进程退出或崩溃时由操作系统释放，不会留下失效的锁
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def _try_lock(self):
+        """尝试对锁文件加排他锁，成功时返回打开的文件，已被占用时返回 None"""
+        f = open(self.path, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return f
+        except OSError:
+            f.close()
+            return None
+
+    def acquire(self) -> bool:
+        """非阻塞获取锁，已被占用（包括本进程的其他持有者）时返回 False"""
+        if self._file is not None:
+            return False
+        self._file = self._try_lock()
+        return self._file is not None
+
+    def release(self):
+        if self._file is not None:
+            f, self._file = self._file, None
+            if os.name == 'nt':
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            f.close()
+
+    def held(self) -> bool:
+        """锁是否被持有（任意进程）"""
+        if self._file is not None:
+            return True
+        f = self._try_lock()
+        if f is None:
+            return True
+        f.close()
+        return False
+
+
+def run_per_code(codes: List[str], func: Callable, workers: int) -> Tuple[Dict, Dict]:
+    """
+    按股票并行执行
+    :return: (成功结果 {code: result}, 失败原因 {code: error})
+    """
+    def call(code):
+        try:
+            return code, func(code), None
+        except Exception as e:
+            return code, None, str(e)
+
+    results, failed = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for code, result, error in executor.map(call, codes):
+            if error is None:
+                results[code] = result
+            else:
+                print(f"处理 {code} 失败: {error}")
+                failed[code] = error
+    return results, failed
+
+
+def build_rollups(df: 'pd.DataFrame') -> Dict[str, List[Dict]]:
+    """
+    将按日期升序的日线汇总为周线和月线
+    :return: {'week': [...], 'month': [...]}，每项包含 period_start/date/open/high/low/close/volume
+    """
+    import pandas as pd
+
+    if df.empty:
+        return {'week': [], 'month': []}
+
+    dates = pd.to_datetime(df['date'])
+    period_starts = {
+        'week': dates - pd.to_timedelta(dates.dt.weekday, unit='D'),
+        'month': dates.dt.to_period('M').dt.start_time,
+    }
+
+    result = {}
+    for period, starts in period_starts.items():
+        frame = df.assign(date=dates.dt.strftime('%Y-%m-%d'), period_start=starts.dt.strftime('%Y-%m-%d'))
+        rollup = frame.groupby('period_start', sort=True).agg(
+            date=('date', 'last'),
+            open=('open', 'first'),
+            high=('high', 'max'),
+            low=('low', 'min'),
+            close=('close', 'last'),
+            volume=('volume', 'sum'),
+        ).reset_index()
+        result[period] = rollup.to_dict('records')
+    return result
+
+
+def update_rollups(code: str, since: Optional[str] = None) -> int:
+    """
+    重新汇总某只股票自 since 起受影响的周线和月线
+    周线从 since 所在周的周一开始、月线从所在月的1日开始，只写入这些完整覆盖的周期，
+    不会用部分K线覆盖更早的周期
+    :param since: 新增K线的最早日期，None 表示全部重新汇总
+    :return: 写入的汇总行数
+    """
+    boundaries = {'week': None, 'month': None}
+    if since:
+        day = date.fromisoformat(since)
+        boundaries = {
+            'week': (day - timedelta(days=day.weekday())).isoformat(),
+            'month': day.replace(day=1).isoformat(),
+        }
+
+    start_date = min(boundaries.values()) if since else None
+    written = 0
+    for period, rows in build_rollups(db.query_frame(code, start_date)).items():
+        boundary = boundaries[period]
+        if boundary:
+            rows = [row for row in rows if row['period_start'] >= boundary]
+        written += db.upsert_rollups(code, period, rows)
+    return written
+
+
+class Pipeline:
+    """收盘后数据流水线（通过锁文件保证所有进程中同时只运行一次）"""
+
+    def __init__(self, state_path: str = PIPELINE_STATE_PATH, workers: int = PIPELINE_WORKERS):
+        self.state_path = state_path
+        self.workers = workers
+        self._run_lock = threading.Lock()
+        self._process_lock = ProcessLock(state_path + '.lock')
+        self._state_lock = threading.Lock()
+        self.state = self._load_state()
+        self.stages = {
+            'stock_list': self.stage_stock_list,
+            'bars': self.stage_bars,
+            'rollups': self.stage_rollups,
+            'indicators': self.stage_indicators,
+            'chan': self.stage_chan,
+            'screener': self.stage_screener,
+        }
+
+    # ---------- 运行状态 ----------
+
+    def _load_state(self) -> Dict:
+        state = {'runs': [], 'pending': {}, 'signals': {}}
+        self._state_mtime = self._file_mtime()
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                state.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"读取流水线状态失败，将重新开始记录: {e}")
+        return state
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.state_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _reload_if_changed(self):
+        if self._file_mtime() != self._state_mtime:
+            self.state = self._load_state()
+
+    def refresh(self):
+        """
+        状态文件被其他进程更新后重新读取（cron 执行的 pipeline.py、开启调度的另一个 worker），
+        本进程正在运行时以内存中的状态为准
+        """
+        if not self._run_lock.locked():
+            with self._state_lock:
+                self._reload_if_changed()
+
+    def _save_state(self):
+        with self._state_lock:
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+            self._state_mtime = self._file_mtime()
+
+    @property
+    def running(self) -> bool:
+        """本进程或其他进程是否正在运行"""
+        return self._run_lock.locked() or self._process_lock.held()
+
+    def runs_on(self, trade_date: str) -> List[Dict]:
+        """某个交易日的运行记录"""
+        self.refresh()
+        return [run for run in self.state['runs'] if run['trade_date'] == trade_date]
+
+    # ---------- 执行 ----------
+
+    def start(self, trigger: str = 'manual', full: bool = False) -> bool:
+        """在后台线程中运行，已在运行时返回 False"""
+        if self.running:
+            return False
+        threading.Thread(target=self.run_safely, args=(trigger, full), daemon=True).start()
+        return True
+
+    def run_safely(self, trigger: str = 'manual', full: bool = False) -> Optional[Dict]:
+        """运行流水线，异常只打印日志（供后台线程使用）"""
+        try:
+            return self.run(trigger, full)
+        except Exception as e:
+            print(f"流水线运行失败: {e}")
+            return None
+
+    def run(self, trigger: str = 'manual', full: bool = False) -> Dict:
+        """
+        运行一次流水线
+        :param trigger: 触发方式（schedule-定时，manual-手动）
+        :param full: 是否全量处理所有已有日线数据的股票（默认只处理当天有新增K线的股票，首次运行总是全量）
+        :return: 本次运行记录
+        """
+        if not self._run_lock.acquire(blocking=False):
+            raise RuntimeError("流水线正在运行")
+        try:
+            if not self._process_lock.acquire():
+                raise RuntimeError("流水线正在其他进程中运行")
+            try:
+                return self._run(trigger, full)
+            finally:
+                self._process_lock.release()
+        finally:
+            self._run_lock.release()
+
+    def _run(self, trigger: str, full: bool) -> Dict:
+        trade_date = date.today().isoformat()
+
+        # 读取其他进程写入的最新状态；已持有锁文件，仍为运行中的记录只能来自已退出的进程，标记为中断
+        with self._state_lock:
+            self._reload_if_changed()
+        for previous_run in self.state['runs']:
+            if previous_run['status'] == 'running':
+                previous_run['status'] = 'interrupted'
+                for stage in previous_run['stages']:
+                    if stage['status'] == 'running':
+                        stage['status'] = 'interrupted'
+
+        # 还没有成功运行过时，派生数据不完整，全量处理一次
+        full = full or not any(run['status'] == 'success' for run in self.state['runs'])
+        previous = next(
+            (run for run in reversed(self.runs_on(trade_date))
+             if run['status'] in ('failed', 'interrupted') and run['full'] == full),
+            None
+        )
+
+        run = {
+            'id': (self.state['runs'][-1]['id'] + 1) if self.state['runs'] else 1,
+            'trade_date': trade_date,
+            'trigger': trigger,
+            'full': full,
+            'status': 'running',
+            'started_at': _now(),
+            'finished_at': None,
+            'resumed_from': None,
+            'stages': [{'name': name, 'status': 'pending'} for name in STAGES],
+        }
+
+        # 同一交易日失败或中断的运行：沿用已完成阶段的结果，从未完成的阶段继续
+        if previous:
+            run['resumed_from'] = previous['id']
+            for stage, done in zip(run['stages'], previous['stages']):
+                if done['status'] != 'success':
+                    break
+                stage.update(done, status='success', resumed=True)
+
+        self.state['runs'] = (self.state['runs'] + [run])[-HISTORY_SIZE:]
+        self._save_state()
+
+        print(f"流水线开始运行（{trigger}，交易日 {trade_date}）")
+        changed: Dict[str, Optional[str]] = {}
+
+        for stage in run['stages']:
+            if stage['status'] == 'success':
+                changed = stage['codes']
+                continue
+
+            name = stage['name']
+            # 上次处理失败的股票与本次变化一起处理
+            pending = self.state['pending'].get(name, {})
+            stage_input = {**pending, **changed}
+
+            stage.update(status='running', started_at=_now(), input=len(stage_input))
+            self._save_state()
+            started = time.perf_counter()
+
+            try:
+                codes, failed, stats = self.stages[name](stage_input, full)
+            except Exception as e:
+                print(f"流水线阶段 {name} 失败: {e}")
+                stage.update(status='failed', error=str(e), finished_at=_now(),
+                             seconds=round(time.perf_counter() - started, 3))
+                run.update(status='failed', finished_at=_now())
+                self._save_state()
+                return run
+
+            self.state['pending'][name] = {code: stage_input.get(code) for code in failed}
+            stage.update(
+                status='success',
+                finished_at=_now(),
+                seconds=round(time.perf_counter() - started, 3),
+                changed=len(codes),
+                failed=dict(list(failed.items())[:FAILED_PREVIEW_SIZE]),
+                failed_count=len(failed),
+                stats=stats,
+                codes=codes,
+            )
+            self._save_state()
+            print(f"流水线阶段 {name} 完成：输入 {len(stage_input)}，变化 {len(codes)}，失败 {len(failed)}，"
+                  f"耗时 {stage['seconds']}s")
+            changed = codes
+
+        run.update(status='success', finished_at=_now())
+        self._save_state()
+        print(f"流水线运行完成（交易日 {trade_date}）")
+        return run
+
+    # ---------- 各阶段 ----------
+    # 输入：{股票代码: 需要重新计算的起始日期（None 表示全部）}
+    # 输出：(交给下一阶段的股票 {code: 起始日期}, 失败的股票 {code: 原因}, 统计信息)
+
+    def stage_stock_list(self, changed: Dict, full: bool) -> Tuple[Dict, Dict, Dict]:
+        """
+        同步股票列表：只写入新上市或改名的股票
+        新上市的股票交给日线同步阶段回填历史K线；首次同步（stock_info 为空）时不回填全市场，
+        与之前一样只跟踪已有日线数据的股票
+        """
+        df = fetch_stock_list()
+        if df is None or df.empty:
+            raise RuntimeError("akshare 未返回股票列表")
+
+        existing = {item['code']: item['name'] for item in db.get_all_stocks()}
+        added, listed, failed = [], {}, {}
+
+        for _, row in df.iterrows():
+            code, name = row['代码'], row['名称']
+            if existing.get(code) == name:
+                continue
+            try:
+                db.add_stock_info(code, name, market_of(code), 'stock')
+                added.append(code)
+                if existing and code not in existing:
+                    listed[normalize_stock_code(code)[0]] = None
+            except Exception as e:
+                failed[code] = str(e)
+
+        for code, name, market, type_ in DEFAULT_INDICES:
+            if code not in existing:
+                db.add_stock_info(code, name, market, type_)
+                added.append(code)
+
+        return listed, failed, {'total': len(df), 'added': len(added), 'listed': len(listed)}
+
+    def stage_bars(self, changed: Dict, full: bool) -> Tuple[Dict, Dict, Dict]:
+        """增量同步日线：每只已跟踪的股票只获取数据库最新日期之后的K线，新上市的股票（输入）获取全部历史"""
+        from comparison import invalidate_panels
+
+        codes = sorted(set(db.get_daily_codes()) | {code for code, *_ in DEFAULT_INDICES} | set(changed))
+
+        def sync(code: str) -> Optional[str]:
+            db_code, pure_code, is_index = normalize_stock_code(code)
+            data_range = db.get_data_range(db_code)
+            start_date = None
+            if data_range:
+                start_date = (date.fromisoformat(data_range['latest']) + timedelta(days=1)).isoformat()
+
+            df = fetch_daily_bars(db_code, pure_code, is_index, start_date)
+            if df.empty:
+                return None
+
+            inserted = db.insert_batch(db_code, df)
+            db.update_sync_record(db_code, (data_range['total'] if data_range else 0) + inserted)
+            if not inserted:
+                return None
+
+            invalidate_panels(db_code)
+            chart_cache.invalidate(db_code)
+            return df['date'].min().strftime('%Y-%m-%d')
+
+        results, failed = run_per_code(codes, sync, self.workers)
+        new_bars = {code: since for code, since in results.items() if since}
+
+        if full:
+            # 全量模式：所有股票从头重新计算
+            downstream = {code: None for code in results}
+        else:
+            downstream = {**{code: since for code, since in changed.items() if code in results}, **new_bars}
+
+        return downstream, failed, {'tracked': len(codes), 'updated': len(new_bars)}
+
+    def stage_rollups(self, changed: Dict, full: bool) -> Tuple[Dict, Dict, Dict]:
+        """汇总周线/月线：从新增K线所在的周、月开始重新汇总"""
+        results, failed = run_per_code(list(changed), lambda code: update_rollups(code, changed[code]), self.workers)
+        return {code: changed[code] for code in results}, failed, {'rows': sum(results.values())}
+
+    def stage_indicators(self, changed: Dict, full: bool) -> Tuple[Dict, Dict, Dict]:
+        """刷新指标快照（最新价、涨跌幅、MACD 状态、最新笔方向）"""
+        from snapshot import refresh_snapshot
+
+        results, failed = run_per_code(list(changed), refresh_snapshot, self.workers)
+        return {code: changed[code] for code in results}, failed, {}
+
+    def stage_chan(self, changed: Dict, full: bool) -> Tuple[Dict, Dict, Dict]:
+        """更新缠论线段和中枢结构，保存各级别当前中枢（供中枢接口和自选股快照读取）"""
+        from pivot import refresh_active_pivots
+
+        def update(code: str) -> bool:
+            pivots = refresh_active_pivots(code)
+            return bool(pivots and pivots['levels']['daily'])
+
+        results, failed = run_per_code(list(changed), update, self.workers)
+        return {code: changed[code] for code in results}, failed, {'in_pivot': sum(results.values())}
+
+    def stage_screener(self, changed: Dict, full: bool) -> Tuple[Dict, Dict, Dict]:
+        """重新计算发生变化的股票的背驰信号，其他股票的信号保持不变"""
+        from divergence import scan_divergences
+
+        codes = list(changed)
+        signals = {} if full else dict(self.state['signals'])
+        for code in codes:
+            signals.pop(code, None)
+
+        if codes:
+            result = scan_divergences(codes, recent_bars=SCREENER_RECENT_BARS)
+            for item in result['results']:
+                signals[item['code']] = item
+
+        self.state['signals'] = signals
+        return dict(changed), {}, {'signals': len(signals)}
+
+    # ---------- 查询 ----------
+
+    def status(self) -> Dict:
+        """流水线状态：是否有进程正在运行、最近一次运行的各阶段详情和历史记录（可能由其他进程运行）"""
+        self.refresh()
+        runs = self.state['runs']
+        last_success = next((run for run in reversed(runs) if run['status'] == 'success'), None)
+        return {
+            'running': self.running,
+            'last_run': _summarize(runs[-1]) if runs else None,
+            'last_success_at': last_success['finished_at'] if last_success else None,
+            'pending': {name: len(codes) for name, codes in self.state['pending'].items() if codes},
+            'signal_count': len(self.state['signals']),
+            'history': [
+                {key: run[key] for key in ('id', 'trade_date', 'trigger', 'full', 'status', 'started_at', 'finished_at')}
+                for run in reversed(runs)
+            ],
+        }
+
+    def signals(self) -> List[Dict]:
+        """最近一次选股阶段产生的背驰信号"""
+        self.refresh()
+        return list(self.state['signals'].values())
+
+
+def _summarize(run: Dict) -> Dict:
+    """运行记录去掉各阶段的股票列表"""
+    return {
+        **run,
+        'stages': [{key: value for key, value in stage.items() if key != 'codes'} for stage in run['stages']],
+    }
+
+
+class PipelineScheduler:
+    """
+    进程内定时调度：每个交易日（周一至周五）在 run_at 时间运行一次流水线
+    启动时若当天已过执行时间且还没有运行（或上次运行被中断），立即补跑
+    """
+
+    def __init__(self, pipeline: Pipeline, run_at: str = PIPELINE_RUN_AT):
+        self.pipeline = pipeline
+        self.hour, self.minute = (int(part) for part in run_at.split(':'))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def next_run(self, now: Optional[datetime] = None) -> datetime:
+        now = now or datetime.now()
+        candidate = now.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+
+        if candidate <= now:
+            runs = self.pipeline.runs_on(now.date().isoformat())
+            # 当天还没有运行，或上次运行在进程退出时中断（状态仍为 running 或已标记为 interrupted）
+            interrupted = runs and runs[-1]['status'] in ('running', 'interrupted') and not self.pipeline.running
+            if now.weekday() < 5 and (not runs or interrupted):
+                return now
+            candidate += timedelta(days=1)
+
+        while candidate.weekday() >= 5:
+            candidate += timedelta(days=1)
+        return candidate
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='pipeline-scheduler', daemon=True)
+        self._thread.start()
+        print(f"收盘后数据流水线已启用，下次运行时间 {self.next_run():%Y-%m-%d %H:%M}")
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> Dict:
+        enabled = bool(self._thread and self._thread.is_alive())
+        return {
+            'enabled': enabled,
+            'run_at': f"{self.hour:02d}:{self.minute:02d}",
+            'next_run': self.next_run().strftime('%Y-%m-%d %H:%M:%S') if enabled else None,
+        }
+
+    def _loop(self):
+        while not self._stop.is_set():
+            wait_seconds = (self.next_run() - datetime.now()).total_seconds()
+            if self._stop.wait(max(0.0, wait_seconds)):
+                break
+            if not self.pipeline.running:
+                self.pipeline.run_safely('schedule')
+
+
+pipeline = Pipeline()
+scheduler = PipelineScheduler(pipeline)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='运行一次收盘后数据流水线')
+    parser.add_argument('--full', action='store_true', help='全量处理所有已有日线数据的股票')
+    args = parser.parse_args()
+
+    result = pipeline.run('manual', args.full)
+    print(json.dumps(_summarize(result), ensure_ascii=False, indent=2))
@@ -0,0 +1,470 @@
+"""
+缠论线段与中枢模块
+
+在笔序列上增量识别线段和中枢：每确认一笔只处理这一笔，不重新扫描历史。
+本级别的线段又作为上一级别的走势段：日线笔构成日线线段和日线中枢，
+日线线段再组成周线级别的线段和中枢。
+每只股票的分析状态按代码缓存：K线更新后只读取上次之后的新K线，增量识别分型和笔，
+线段和中枢只处理新确认的笔。
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+from database import db
+from chanlun import ChanlunState
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# 分析级别：第 n 级的线段作为第 n+1 级的走势段
+LEVELS = ('daily', 'weekly')
+
+# 结构状态缓存的股票数量上限
+STRUCTURE_CACHE_SIZE = 256
+
+# 中枢扩张判定：内部走势段超过5段为结构扩张，持续时间超过同级别中枢平均值的2倍为时间扩张
+EXPANSION_MEMBER_COUNT = 5
+EXPANSION_TIME_RATIO = 2.0
+
+# 保存到数据库的当前中枢字段
+PIVOT_FIELDS = ('type', 'zg', 'zd', 'zz', 'gg', 'dd', 'start_date', 'end_date', 'member_count', 'expansions')
+
+
+def leg_high(leg: Dict) -> float:
+    return max(leg['start_price'], leg['end_price'])
+
+
+def leg_low(leg: Dict) -> float:
+    return min(leg['start_price'], leg['end_price'])
+
+
+def _beyond(price: float, reference: float, direction: str) -> bool:
+    """price 是否在 direction 方向上超过 reference（向上为更高，向下为更低）"""
+    return price > reference if direction == 'up' else price < reference
+
+
+class SegmentBuilder:
+    """
+    线段增量识别（特征序列分型）
+
+    - 向上线段的特征序列为其中的向下笔。最高点之后的某根向下笔跌破
+      "最高点前后两根向下笔低点中的较高者"，即特征序列形成顶分型，线段在最高点结束；
+      向下线段对称处理。新线段从原线段极值之后的第一笔开始
+    - 线段至少包含3笔。只有1笔就被反向突破、且突破了前一线段的终点时，前一线段延续
+    - 最后一条线段在其后的线段创出新极值之前可能被延续，此前不计入 confirmed_count
+    """
+
+    def __init__(self):
+        self.legs: List[Dict] = []
+        self.segments: List[Dict] = []
+        self._current: Optional[Dict] = None
+
+    def add_leg(self, leg: Dict):
+        """加入一根已确认的走势段（笔或低级别线段）"""
+        self.legs.append(leg)
+        self._process(len(self.legs) - 1)
+
+    @property
+    def confirmed_count(self) -> int:
+        """不会再被修改的线段数量"""
+        current = self._current
+        if self.segments and current and current['extreme'] == current['start']:
+            return len(self.segments) - 1
+        return len(self.segments)
+
+    def pending_segment(self) -> Optional[Dict]:
+        """正在延伸、尚未被破坏的线段（至少3笔时返回）"""
+        current = self._current
+        if current is None or current['extreme'] - current['start'] < 2:
+            return None
+        return self._make_segment(current['start'], current['extreme'])
+
+    def _new_state(self, start: int) -> Dict:
+        leg = self.legs[start]
+        return {
+            'type': leg['type'],
+            'start': start,
+            'extreme': start,
+            'extreme_price': leg['end_price'],
+            # 极值前一根反向笔的终点（即极值笔的起点），与极值后第一根反向笔一起确定破坏位
+            'pre_level': leg['start_price'],
+            'break_level': None,
+        }
+
+    def _process(self, i: int):
+        leg = self.legs[i]
+        current = self._current
+
+        if current is None:
+            self._current = self._new_state(i)
+            return
+
+        direction = current['type']
+
+        if leg['type'] == direction:
+            if _beyond(leg['end_price'], current['extreme_price'], direction):
+                current['extreme'] = i
+                current['extreme_price'] = leg['end_price']
+                current['pre_level'] = leg['start_price']
+                current['break_level'] = None
+            return
+
+        # 极值后的第一根反向笔：特征序列分型的中间元素（与前一元素按包含关系合并）
+        if i == current['extreme'] + 1:
+            if direction == 'up':
+                current['break_level'] = max(current['pre_level'], leg['end_price'])
+            else:
+                current['break_level'] = min(current['pre_level'], leg['end_price'])
+            return
+
+        opposite = 'down' if direction == 'up' else 'up'
+        if current['break_level'] is not None and _beyond(leg['end_price'], current['break_level'], opposite):
+            self._break(i)
+
+    def _break(self, i: int):
+        current = self._current
+        leg = self.legs[i]
+
+        if current['extreme'] - current['start'] >= 2:
+            self.segments.append(self._make_segment(current['start'], current['extreme']))
+            start = current['extreme'] + 1
+            self._current = self._new_state(start)
+            # 新线段极值之后的笔已经到达，按新线段的状态重新处理
+            for j in range(start + 1, i + 1):
+                self._process(j)
+            return
+
+        if self.segments:
+            previous = self.segments[-1]
+            if _beyond(leg['end_price'], previous['end_price'], previous['type']):
+                # 不足3笔即被反向突破并创出前一线段的新极值：前一线段延续
+                self.segments.pop()
+                self._current = {
+                    'type': previous['type'],
+                    'start': previous['leg_start'],
+                    'extreme': i,
+                    'extreme_price': leg['end_price'],
+                    'pre_level': leg['start_price'],
+                    'break_level': None,
+                }
+            return
+
+        # 第一条线段起点选错，从下一笔重新开始
+        start = current['start'] + 1
+        self._current = self._new_state(start)
+        for j in range(start + 1, i + 1):
+            self._process(j)
+
+    def _make_segment(self, start: int, end: int) -> Dict:
+        first, last = self.legs[start], self.legs[end]
+        return {
+            'type': first['type'],
+            'start_index': first['start_index'],
+            'end_index': last['end_index'],
+            'start_price': first['start_price'],
+            'end_price': last['end_price'],
+            'length': abs(last['end_price'] - first['start_price']),
+            'leg_start': start,
+            'leg_end': end,
+            'leg_count': end - start + 1,
+        }
+
+
+class PivotTracker:
+    """
+    中枢增量识别
+
+    - 连续三段走势的重叠区间构成中枢：ZG = 三段高点的最小值，ZD = 三段低点的最大值
+    - 之后与 [ZD, ZG] 重叠的走势段延伸中枢，GG/DD 为成员的最高点/最低点
+    - 出现不与中枢重叠的走势段时中枢结束，前一段为离开段（不计入成员），
+      下一个中枢从这一段开始寻找
+    - 扩张：structure-内部走势段超过5段，time-持续时间超过同级别中枢平均值的2倍，
+      space-与前一个同向中枢的 [DD, GG] 区间重叠
+    """
+
+    def __init__(self, level: str = 'daily'):
+        self.level = level
+        self.pivots: List[Dict] = []
+        self._window: List[Tuple[int, Dict]] = []
+        self._members: List[Dict] = []
+        self._total_bars = 0
+
+    @property
+    def active(self) -> Optional[Dict]:
+        """当前尚未结束的中枢"""
+        return self.pivots[-1] if self._members else None
+
+    def add_leg(self, index: int, leg: Dict):
+        """
+        加入一段已确认的走势
+        :param index: 走势段在本级别序列中的位置
+        """
+        pivot = self.active
+        if pivot is not None:
+            if leg_low(leg) < pivot['zg'] and leg_high(leg) > pivot['zd']:
+                self._members.append(leg)
+                pivot['end_leg'] = index
+                self._refresh(pivot)
+                return
+            self._close(pivot)
+
+        self._window.append((index, leg))
+        if len(self._window) > 3:
+            self._window.pop(0)
+        if len(self._window) < 3:
+            return
+
+        legs = [item[1] for item in self._window]
+        zg = min(leg_high(item) for item in legs)
+        zd = max(leg_low(item) for item in legs)
+        if zg > zd:
+            self._open(self._window[0][0], index, legs, zg, zd)
+
+    def _open(self, start_leg: int, end_leg: int, legs: List[Dict], zg: float, zd: float):
+        pivot = {
+            'level': self.level,
+            # 上涨中枢由 下-上-下 构成，下跌中枢由 上-下-上 构成
+            'type': 'up' if legs[0]['type'] == 'down' else 'down',
+            'zg': zg,
+            'zd': zd,
+            'zz': (zg + zd) / 2,
+            'start_leg': start_leg,
+            'end_leg': end_leg,
+            'expansions': [],
+            'active': True,
+        }
+        self._window = []
+        self._members = list(legs)
+        self._refresh(pivot)
+
+        previous = self.pivots[-1] if self.pivots else None
+        if (previous and previous['type'] == pivot['type']
+                and pivot['dd'] < previous['gg'] and pivot['gg'] > previous['dd']):
+            pivot['expansions'].append('space')
+
+        self.pivots.append(pivot)
+
+    def _close(self, pivot: Dict):
+        # 最后一段离开中枢区间，不计入成员
+        if len(self._members) > 3:
+            self._members.pop()
+            pivot['end_leg'] -= 1
+            self._refresh(pivot)
+
+        pivot['active'] = False
+        self._total_bars += pivot['end_index'] - pivot['start_index']
+        self._members = []
+
+    def _refresh(self, pivot: Dict):
+        members = self._members
+        pivot['gg'] = max(leg_high(leg) for leg in members)
+        pivot['dd'] = min(leg_low(leg) for leg in members)
+        pivot['start_index'] = members[0]['start_index']
+        pivot['end_index'] = members[-1]['end_index']
+        pivot['member_count'] = len(members)
+
+        expansions = [item for item in pivot['expansions'] if item == 'space']
+        if len(members) > EXPANSION_MEMBER_COUNT:
+            expansions.append('structure')
+        closed = len(self.pivots) - (1 if self.pivots and self.pivots[-1] is pivot else 0)
+        if closed and (pivot['end_index'] - pivot['start_index']) > EXPANSION_TIME_RATIO * self._total_bars / closed:
+            expansions.append('time')
+        pivot['expansions'] = expansions
+
+
+class ChanStructure:
+    """
+    单只股票的多级别线段和中枢结构
+
+    按顺序加入已确认的笔，第 n 级确认的线段同时交给第 n 级中枢和第 n+1 级线段识别
+    """
+
+    def __init__(self, levels: Sequence[str] = LEVELS):
+        self.levels = tuple(levels)
+        self.pens: List[Dict] = []
+        self.builders = [SegmentBuilder() for _ in self.levels]
+        self.trackers = [PivotTracker(level) for level in self.levels]
+        self._forwarded = [0] * len(self.levels)
+
+    def add_pen(self, pen: Dict):
+        self.pens.append(pen)
+        self._feed(0, pen)
+
+    def _feed(self, level: int, leg: Dict):
+        builder = self.builders[level]
+        builder.add_leg(leg)
+
+        while self._forwarded[level] < builder.confirmed_count:
+            index = self._forwarded[level]
+            segment = builder.segments[index]
+            self._forwarded[level] += 1
+            self.trackers[level].add_leg(index, segment)
+            if level + 1 < len(self.levels):
+                self._feed(level + 1, segment)
+
+    def update(self, pens: List[Dict]) -> bool:
+        """
+        用重新识别的完整笔列表更新结构，只处理新确认的笔（最后一笔可能还会延伸，不参与计算）
+        :return: 已处理的笔与新笔列表不一致（如复权后价格变化）时返回 False，需要重建
+        """
+        confirmed = pens[:-1]
+        count = len(self.pens)
+        if count > len(confirmed):
+            return False
+        if count and not _same_leg(self.pens[-1], confirmed[count - 1]):
+            return False
+
+        for pen in confirmed[count:]:
+            self.add_pen(pen)
+        return True
+
+    def to_dict(self, dates: Optional[List[str]] = None) -> Dict:
+        """
+        各级别的线段、中枢和当前中枢
+        :param dates: K线日期列表，传入时为线段和中枢附加起止日期
+        """
+        levels = []
+        for builder, tracker in zip(self.builders, self.trackers):
+            pending = builder.pending_segment()
+            active = tracker.active
+            levels.append({
+                'level': tracker.level,
+                'segments': [_with_dates(segment, dates) for segment in builder.segments],
+                'pending_segment': _with_dates(pending, dates) if pending else None,
+                'pivots': [_with_dates(pivot, dates) for pivot in tracker.pivots],
+                'active_pivot': _with_dates(active, dates) if active else None,
+            })
+        return {'pen_count': len(self.pens), 'levels': levels}
+
+
+def _same_leg(a: Dict, b: Dict) -> bool:
+    return (a['start_index'] == b['start_index'] and a['end_index'] == b['end_index']
+            and a['start_price'] == b['start_price'] and a['end_price'] == b['end_price'])
+
+
+def _with_dates(item: Dict, dates: Optional[List[str]]) -> Dict:
+    result = dict(item)
+    if dates:
+        result['start_date'] = dates[item['start_index']]
+        result['end_date'] = dates[item['end_index']]
+    return result
+
+
+def build_segments(pens: List[Dict]) -> List[Dict]:
+    """由笔列表识别线段（包括正在延伸的最后一条线段）"""
+    builder = SegmentBuilder()
+    for pen in pens:
+        builder.add_leg(pen)
+    pending = builder.pending_segment()
+    return builder.segments + ([pending] if pending else [])
+
+
+class StockState:
+    """一只股票的增量分析状态：已读取K线的日期、分型和笔的识别状态、线段和中枢结构"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清空状态，下次从第一根K线开始识别"""
+        self.dates: List[str] = []
+        self.chanlun = ChanlunState()
+        self.structure = ChanStructure()
+
+    def append(self, df: 'pd.DataFrame'):
+        """追加上次读取之后的新K线（按日期升序）"""
+        self.chanlun.append(
+            df['open'].to_numpy(dtype='float64'),
+            df['high'].to_numpy(dtype='float64'),
+            df['low'].to_numpy(dtype='float64'),
+            df['close'].to_numpy(dtype='float64')
+        )
+        self.dates.extend(str(d)[:10] for d in df['date'].tolist())
+
+        pens = self.chanlun.result()['pens']
+        if not self.structure.update(pens):
+            self.structure = ChanStructure()
+            self.structure.update(pens)
+
+
+_states: "OrderedDict[str, StockState]" = OrderedDict()
+_states_lock = threading.Lock()
+
+
+def _next_day(date_str: str) -> str:
+    return (datetime.strptime(date_str, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def get_structure(code: str) -> Optional[Dict]:
+    """
+    获取某只股票的多级别线段和中枢（基于全部历史K线）
+    已缓存状态的股票只读取最新日期之后的K线；历史数据发生变化（如补全了更早的K线）时重新读取全部K线
+    :param code: 股票代码（数据库格式）
+    :return: 没有数据时返回 None
+    """
+    data_range = db.get_data_range(code)
+    if not data_range:
+        with _states_lock:
+            _states.pop(code, None)
+        return None
+
+    with _states_lock:
+        state = _states.get(code)
+        if state is None:
+            state = _states[code] = StockState()
+        _states.move_to_end(code)
+        while len(_states) > STRUCTURE_CACHE_SIZE:
+            _states.popitem(last=False)
+
+    with state.lock:
+        if state.dates and (state.dates[0] != data_range['earliest'] or state.dates[-1] > data_range['latest']
+                            or len(state.dates) > data_range['total']):
+            state.reset()
+
+        if len(state.dates) < data_range['total']:
+            start_date = _next_day(state.dates[-1]) if state.dates else None
+            df = db.query_frame(code, start_date)
+            if len(state.dates) + len(df) != data_range['total']:
+                # 新读取的K线数量对不上（最新日期之前插入了K线），重新读取全部K线
+                state.reset()
+                df = db.query_frame(code)
+            state.append(df)
+
+        result = state.structure.to_dict(state.dates)
+        result['code'] = code
+        result['total_bars'] = len(state.dates)
+        result['last_date'] = state.dates[-1]
+
+    return result
+
+
+def _pivot_summary(pivot: Optional[Dict]) -> Optional[Dict]:
+    """当前中枢保存到数据库的字段"""
+    if pivot is None:
+        return None
+    return {key: pivot[key] for key in PIVOT_FIELDS}
+
+
+def refresh_active_pivots(code: str) -> Optional[Dict]:
+    """
+    重新计算并保存各级别当前中枢（收盘后数据流水线和K线写入后调用）
+    :return: {'code', 'last_date', 'levels': {级别: 当前中枢或 None}}，没有数据时返回 None
+    """
+    structure = get_structure(code)
+    if structure is None:
+        return None
+
+    levels = {level['level']: _pivot_summary(level['active_pivot']) for level in structure['levels']}
+    db.upsert_active_pivots(code, structure['last_date'], levels)
+    return {'code': code, 'last_date': structure['last_date'], 'levels': levels}
+
+
+def active_pivots(codes: List[str]) -> Dict[str, Optional[Dict]]:
+    """
+    批量获取各级别当前中枢：读取已保存的结果，从未保存过的股票现场计算并保存
+    :return: {code: {'code', 'last_date', 'levels'}}，没有数据的股票为 None
+    """
+    stored = db.get_active_pivots(codes)
+    return {code: stored.get(code) or refresh_active_pivots(code) for code in codes}
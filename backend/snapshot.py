@@ -0,0 +1,62 @@
+"""
+个股最新状态快照模块
+
+在写入K线后刷新每只股票的最新价、涨跌幅、MACD状态和最新笔方向，
+自选股快照接口直接读取 stock_snapshot 表，无需逐只查询 stock_daily。
+"""
+from typing import Dict, Optional
+import pandas as pd
+from database import db
+from indicators import calculate_macd, macd_state
+from chanlun import analyze_chanlun, latest_pen_direction
+
+
+def build_snapshot(code: str, df: pd.DataFrame) -> Optional[Dict]:
+    """
+    根据按日期升序的K线数据计算快照
+    :param code: 股票代码（数据库格式）
+    :param df: K线数据（date/open/high/low/close/volume 列）
+    :return: 快照字典，没有数据时返回 None
+    """
+    if df.empty:
+        return None
+
+    opens = df['open'].to_numpy(dtype='float64')
+    highs = df['high'].to_numpy(dtype='float64')
+    lows = df['low'].to_numpy(dtype='float64')
+    closes = df['close'].to_numpy(dtype='float64')
+    dates = df['date'].tolist()
+
+    last_close = float(closes[-1])
+    prev_close = float(closes[-2]) if len(closes) >= 2 else None
+    change_pct = (last_close - prev_close) / prev_close * 100 if prev_close else None
+
+    macd = calculate_macd(closes)
+    pens = analyze_chanlun(opens, highs, lows, closes)['pens']
+    pen_direction = latest_pen_direction(pens)
+
+    return {
+        'code': code,
+        'last_date': dates[-1],
+        'last_close': last_close,
+        'prev_close': prev_close,
+        'change_pct': change_pct,
+        'dif': float(macd['dif'][-1]),
+        'dea': float(macd['dea'][-1]),
+        'macd': float(macd['macd'][-1]),
+        'macd_state': macd_state(macd['dif'], macd['dea']),
+        'pen_direction': pen_direction,
+        'pen_start_date': dates[pens[-1]['start_index']] if pens else None,
+        'total_bars': len(dates),
+    }
+
+
+def refresh_snapshot(code: str) -> Optional[Dict]:
+    """
+    重新计算并保存某只股票的快照（在K线写入后调用）
+    :param code: 股票代码（数据库格式）
+    """
+    snapshot = build_snapshot(code, db.query_frame(code))
+    if snapshot:
+        db.upsert_snapshot(snapshot)
+    return snapshot
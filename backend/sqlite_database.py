@@ -0,0 +1,612 @@
+"""
+SQLite 存储后端
+
+嵌入式存储，单机部署无需 MySQL 服务：
+- WAL 模式，读写并发互不阻塞；每个线程使用独立连接
+- stock_daily 以 (code, date) 为聚簇主键（WITHOUT ROWID），按代码的日期范围查询为连续扫描
+- 日期以 YYYY-MM-DD 文本存储，查询结果无需再做日期格式转换
+- 批量查询直接读取为 DataFrame，供对比分析、快照计算等分析路径使用
+"""
+import sqlite3
+import threading
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING
+from config import SQLITE_PATH
+from database import BaseStockDatabase, format_active_pivots, format_chart_version, get_pinyin, pivot_values
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class SQLiteStockDatabase(BaseStockDatabase):
+    """SQLite 存储后端"""
+
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        print(f"SQLite 数据库: {self.path}")
+
+    def get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（首次使用时创建）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = lambda cursor, row: {
+                column[0]: row[i] for i, column in enumerate(cursor.description)
+            }
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+        return conn
+
+    def init_database(self):
+        """初始化数据库表"""
+        conn = self.get_connection()
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS stock_daily (
+                code TEXT NOT NULL,
+                date TEXT NOT NULL,
+                open REAL NOT NULL,
+                high REAL NOT NULL,
+                low REAL NOT NULL,
+                close REAL NOT NULL,
+                volume INTEGER NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (code, date)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_daily_date ON stock_daily (date);
+
+            CREATE TABLE IF NOT EXISTS sync_records (
+                code TEXT NOT NULL PRIMARY KEY,
+                last_sync_date TEXT,
+                total_records INTEGER,
+                sync_time TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS stock_info (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                pinyin_full TEXT,
+                pinyin_abbr TEXT,
+                market TEXT,
+                type TEXT DEFAULT 'stock',
+                is_active INTEGER DEFAULT 1,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE INDEX IF NOT EXISTS idx_info_name ON stock_info (name);
+            CREATE INDEX IF NOT EXISTS idx_info_type ON stock_info (type);
+
+            CREATE TABLE IF NOT EXISTS watchlist (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (user_id, name)
+            );
+
+            CREATE TABLE IF NOT EXISTS watchlist_item (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                watchlist_id INTEGER NOT NULL,
+                code TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (watchlist_id, code)
+            );
+            CREATE INDEX IF NOT EXISTS idx_watchlist_item_code ON watchlist_item (code);
+
+            CREATE TABLE IF NOT EXISTS stock_rollup (
+                code TEXT NOT NULL,
+                period TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                date TEXT NOT NULL,
+                open REAL NOT NULL,
+                high REAL NOT NULL,
+                low REAL NOT NULL,
+                close REAL NOT NULL,
+                volume INTEGER NOT NULL,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (code, period, period_start)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS stock_pivot (
+                code TEXT NOT NULL,
+                level TEXT NOT NULL,
+                last_date TEXT NOT NULL,
+                pivot_type TEXT,
+                zg REAL,
+                zd REAL,
+                zz REAL,
+                gg REAL,
+                dd REAL,
+                start_date TEXT,
+                end_date TEXT,
+                member_count INTEGER,
+                expansions TEXT,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (code, level)
+            ) WITHOUT ROWID;
+
+            CREATE TABLE IF NOT EXISTS stock_snapshot (
+                code TEXT NOT NULL PRIMARY KEY,
+                last_date TEXT,
+                last_close REAL,
+                prev_close REAL,
+                change_pct REAL,
+                dif REAL,
+                dea REAL,
+                macd REAL,
+                macd_state TEXT,
+                pen_direction TEXT,
+                pen_start_date TEXT,
+                total_bars INTEGER,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+        ''')
+        conn.commit()
+
+        print("数据库表初始化完成")
+
+    def insert_batch(self, code: str, df: 'pd.DataFrame') -> int:
+        """批量插入数据（使用INSERT OR IGNORE避免重复）"""
+        import pandas as pd
+
+        if df.empty:
+            return 0
+
+        # 按列整体转换，避免逐行处理
+        dates = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+        values = zip(
+            [code] * len(df),
+            dates.tolist(),
+            df['open'].astype('float64').tolist(),
+            df['high'].astype('float64').tolist(),
+            df['low'].astype('float64').tolist(),
+            df['close'].astype('float64').tolist(),
+            df['volume'].astype('int64').tolist(),
+        )
+
+        conn = self.get_connection()
+        before = conn.total_changes
+        conn.executemany('''
+            INSERT OR IGNORE INTO stock_daily
+            (code, date, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', values)
+        conn.commit()
+
+        return conn.total_changes - before
+
+    def query_by_date_range(
+        self,
+        code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict]:
+        """按日期范围查询数据"""
+        sql, params = self._range_sql(
+            "SELECT date, open, high, low, close, volume FROM stock_daily WHERE code = ?",
+            [code], start_date, end_date
+        )
+        rows = self.get_connection().execute(sql + " ORDER BY date ASC", params).fetchall()
+
+        for row in rows:
+            row['volume'] = float(row['volume'])
+
+        return rows
+
+    def query_latest(self, code: str, days: int = 100) -> List[Dict]:
+        """查询最近N天的数据"""
+        rows = self.get_connection().execute('''
+            SELECT date, open, high, low, close, volume
+            FROM stock_daily
+            WHERE code = ?
+            ORDER BY date DESC
+            LIMIT ?
+        ''', (code, days)).fetchall()
+
+        rows.reverse()
+        for row in rows:
+            row['volume'] = float(row['volume'])
+
+        return rows
+
+    def query_close_panel(
+        self,
+        codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict]:
+        """一次查询多只股票的收盘价（用于多股票对齐）"""
+        return self.query_close_frame(codes, start_date, end_date).to_dict('records')
+
+    def query_frame(
+        self,
+        code: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> 'pd.DataFrame':
+        """按日期范围查询数据，直接读取为 DataFrame"""
+        import pandas as pd
+
+        sql, params = self._range_sql(
+            "SELECT date, open, high, low, close, volume FROM stock_daily WHERE code = ?",
+            [code], start_date, end_date
+        )
+        df = pd.read_sql_query(sql + " ORDER BY date ASC", self._raw_connection(), params=params)
+        df['volume'] = df['volume'].astype('float64')
+        return df
+
+    def query_close_frame(
+        self,
+        codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> 'pd.DataFrame':
+        """一次查询多只股票的收盘价，直接读取为 DataFrame"""
+        import pandas as pd
+
+        if not codes:
+            return pd.DataFrame(columns=['code', 'date', 'close'])
+
+        placeholders = ', '.join(['?'] * len(codes))
+        sql, params = self._range_sql(
+            f"SELECT code, date, close FROM stock_daily WHERE code IN ({placeholders})",
+            list(codes), start_date, end_date
+        )
+        return pd.read_sql_query(sql, self._raw_connection(), params=params)
+
+    def query_bars_frame(
+        self,
+        codes: List[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> 'pd.DataFrame':
+        """一次查询多只股票的日线数据，直接读取为 DataFrame"""
+        import pandas as pd
+
+        columns = ['code', 'date', 'open', 'high', 'low', 'close', 'volume']
+        if not codes:
+            return pd.DataFrame(columns=columns)
+
+        placeholders = ', '.join(['?'] * len(codes))
+        sql, params = self._range_sql(
+            f"SELECT {', '.join(columns)} FROM stock_daily WHERE code IN ({placeholders})",
+            list(codes), start_date, end_date
+        )
+        df = pd.read_sql_query(sql + " ORDER BY code ASC, date ASC", self._raw_connection(), params=params)
+        df['volume'] = df['volume'].astype('float64')
+        return df
+
+    def get_data_range(self, code: str) -> Optional[Dict]:
+        """获取某个股票的数据范围"""
+        row = self.get_connection().execute('''
+            SELECT
+                MIN(date) as earliest,
+                MAX(date) as latest,
+                COUNT(*) as total
+            FROM stock_daily
+            WHERE code = ?
+        ''', (code,)).fetchone()
+
+        if row and row['total'] > 0:
+            return row
+        return None
+
+    def get_chart_version(self, code: str) -> Optional[Dict]:
+        """一次查询返回K线内容版本：数据范围、首末收盘价和股票名称"""
+        row = self.get_connection().execute('''
+            SELECT
+                MIN(date) as earliest,
+                MAX(date) as latest,
+                COUNT(*) as total,
+                (SELECT close FROM stock_daily WHERE code = ? ORDER BY date ASC LIMIT 1) as first_close,
+                (SELECT close FROM stock_daily WHERE code = ? ORDER BY date DESC LIMIT 1) as last_close,
+                (SELECT name FROM stock_info WHERE code = ? LIMIT 1) as name
+            FROM stock_daily
+            WHERE code = ?
+        ''', (code,) * 4).fetchone()
+        return format_chart_version(row)
+
+    def get_data_versions(self, codes: List[str]) -> Dict[str, Tuple[str, int]]:
+        """一次查询多只股票的 (最新日期, K线数量)"""
+        if not codes:
+            return {}
+
+        placeholders = ', '.join(['?'] * len(codes))
+        rows = self.get_connection().execute(f'''
+            SELECT code, MAX(date) as latest, COUNT(*) as total
+            FROM stock_daily
+            WHERE code IN ({placeholders})
+            GROUP BY code
+        ''', list(codes)).fetchall()
+        return {row['code']: (row['latest'], row['total']) for row in rows}
+
+    def update_sync_record(self, code: str, total_records: int):
+        """更新同步记录"""
+        conn = self.get_connection()
+        conn.execute('''
+            INSERT INTO sync_records (code, last_sync_date, total_records)
+            VALUES (?, date('now', 'localtime'), ?)
+            ON CONFLICT (code) DO UPDATE SET
+                last_sync_date = excluded.last_sync_date,
+                total_records = excluded.total_records,
+                sync_time = CURRENT_TIMESTAMP
+        ''', (code, total_records))
+        conn.commit()
+
+    def add_stock_info(self, code: str, name: str, market: str = None, stock_type: str = 'stock'):
+        """添加股票信息（自动生成拼音）"""
+        pinyin_full, pinyin_abbr = get_pinyin(name)
+
+        conn = self.get_connection()
+        conn.execute('''
+            INSERT INTO stock_info (code, name, pinyin_full, pinyin_abbr, market, type)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (code) DO UPDATE SET
+                name = excluded.name,
+                pinyin_full = excluded.pinyin_full,
+                pinyin_abbr = excluded.pinyin_abbr,
+                market = excluded.market,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (code, name, pinyin_full, pinyin_abbr, market, stock_type))
+        conn.commit()
+
+    def get_all_stocks(self, stock_type: Optional[str] = None) -> List[Dict]:
+        """获取所有股票列表"""
+        conn = self.get_connection()
+        if stock_type:
+            return conn.execute(
+                "SELECT code, name, market, type FROM stock_info WHERE type = ? AND is_active = 1",
+                (stock_type,)
+            ).fetchall()
+        return conn.execute(
+            "SELECT code, name, market, type FROM stock_info WHERE is_active = 1"
+        ).fetchall()
+
+    def search_stocks(self, keyword: str) -> List[Dict]:
+        """搜索股票（按代码、名称或拼音）"""
+        keyword_lower = keyword.lower()
+        keyword_pattern = f'%{keyword}%'
+        keyword_pattern_lower = f'%{keyword_lower}%'
+
+        return self.get_connection().execute('''
+            SELECT code, name, market, type
+            FROM stock_info
+            WHERE (
+                code LIKE ?
+                OR name LIKE ?
+                OR pinyin_full LIKE ?
+                OR pinyin_abbr LIKE ?
+            )
+            AND is_active = 1
+            ORDER BY
+                CASE
+                    WHEN code = ? THEN 0
+                    WHEN code LIKE ? THEN 1
+                    WHEN name LIKE ? THEN 2
+                    WHEN pinyin_abbr LIKE ? THEN 3
+                    ELSE 4
+                END
+            LIMIT 50
+        ''', (
+            keyword_pattern,
+            keyword_pattern,
+            keyword_pattern_lower,
+            keyword_pattern_lower,
+            keyword,
+            f'{keyword}%',
+            keyword_pattern,
+            f'{keyword_lower}%',
+        )).fetchall()
+
+    def get_stock_name(self, code: str) -> Optional[str]:
+        """按代码精确查询股票名称"""
+        row = self.get_connection().execute(
+            "SELECT name FROM stock_info WHERE code = ? LIMIT 1", (code,)
+        ).fetchone()
+        return row['name'] if row else None
+
+    def get_daily_codes(self) -> List[str]:
+        """获取所有已有日线数据的股票代码"""
+        rows = self.get_connection().execute("SELECT DISTINCT code FROM stock_daily").fetchall()
+        return [row['code'] for row in rows]
+
+    def upsert_snapshot(self, snapshot: Dict):
+        """写入或更新个股最新状态快照"""
+        conn = self.get_connection()
+        conn.execute('''
+            INSERT INTO stock_snapshot
+            (code, last_date, last_close, prev_close, change_pct,
+             dif, dea, macd, macd_state, pen_direction, pen_start_date, total_bars)
+            VALUES (:code, :last_date, :last_close, :prev_close, :change_pct,
+                    :dif, :dea, :macd, :macd_state, :pen_direction,
+                    :pen_start_date, :total_bars)
+            ON CONFLICT (code) DO UPDATE SET
+                last_date = excluded.last_date,
+                last_close = excluded.last_close,
+                prev_close = excluded.prev_close,
+                change_pct = excluded.change_pct,
+                dif = excluded.dif,
+                dea = excluded.dea,
+                macd = excluded.macd,
+                macd_state = excluded.macd_state,
+                pen_direction = excluded.pen_direction,
+                pen_start_date = excluded.pen_start_date,
+                total_bars = excluded.total_bars,
+                updated_at = CURRENT_TIMESTAMP
+        ''', snapshot)
+        conn.commit()
+
+    def upsert_rollups(self, code: str, period: str, rows: List[Dict]) -> int:
+        """写入或更新周线/月线汇总"""
+        if not rows:
+            return 0
+
+        values = [
+            (code, period, row['period_start'], row['date'], row['open'],
+             row['high'], row['low'], row['close'], int(row['volume']))
+            for row in rows
+        ]
+        conn = self.get_connection()
+        conn.executemany('''
+            INSERT INTO stock_rollup
+            (code, period, period_start, date, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (code, period, period_start) DO UPDATE SET
+                date = excluded.date,
+                open = excluded.open,
+                high = excluded.high,
+                low = excluded.low,
+                close = excluded.close,
+                volume = excluded.volume,
+                updated_at = CURRENT_TIMESTAMP
+        ''', values)
+        conn.commit()
+        return len(values)
+
+    def query_rollups(
+        self,
+        code: str,
+        period: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> List[Dict]:
+        """按日期范围查询周线/月线汇总"""
+        sql, params = self._range_sql(
+            "SELECT date, open, high, low, close, volume FROM stock_rollup WHERE code = ? AND period = ?",
+            [code, period], start_date, end_date
+        )
+        rows = self.get_connection().execute(sql + " ORDER BY period_start ASC", params).fetchall()
+
+        for row in rows:
+            row['volume'] = float(row['volume'])
+
+        return rows
+
+    def upsert_active_pivots(self, code: str, last_date: str, levels: Dict[str, Optional[Dict]]):
+        """写入各级别当前中枢"""
+        conn = self.get_connection()
+        conn.executemany('''
+            INSERT INTO stock_pivot
+            (code, level, last_date, pivot_type, zg, zd, zz, gg, dd,
+             start_date, end_date, member_count, expansions)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (code, level) DO UPDATE SET
+                last_date = excluded.last_date,
+                pivot_type = excluded.pivot_type,
+                zg = excluded.zg,
+                zd = excluded.zd,
+                zz = excluded.zz,
+                gg = excluded.gg,
+                dd = excluded.dd,
+                start_date = excluded.start_date,
+                end_date = excluded.end_date,
+                member_count = excluded.member_count,
+                expansions = excluded.expansions,
+                updated_at = CURRENT_TIMESTAMP
+        ''', pivot_values(code, last_date, levels))
+        conn.commit()
+
+    def get_active_pivots(self, codes: List[str]) -> Dict[str, Dict]:
+        """一次查询多只股票已保存的各级别当前中枢"""
+        if not codes:
+            return {}
+
+        placeholders = ', '.join(['?'] * len(codes))
+        rows = self.get_connection().execute(
+            f"SELECT * FROM stock_pivot WHERE code IN ({placeholders}) ORDER BY code, level",
+            codes
+        ).fetchall()
+        return format_active_pivots(rows)
+
+    def create_watchlist(self, user_id: str, name: str) -> int:
+        """创建自选股分组，返回分组ID"""
+        conn = self.get_connection()
+        cursor = conn.execute(
+            "INSERT INTO watchlist (user_id, name) VALUES (?, ?)", (user_id, name)
+        )
+        conn.commit()
+        return cursor.lastrowid
+
+    def get_watchlists(self, user_id: str) -> List[Dict]:
+        """获取用户的所有自选股分组（含成员数量）"""
+        return self.get_connection().execute('''
+            SELECT w.id, w.name, COUNT(i.id) AS total
+            FROM watchlist w
+            LEFT JOIN watchlist_item i ON i.watchlist_id = w.id
+            WHERE w.user_id = ?
+            GROUP BY w.id, w.name
+            ORDER BY w.id ASC
+        ''', (user_id,)).fetchall()
+
+    def get_watchlist(self, watchlist_id: int) -> Optional[Dict]:
+        """获取单个自选股分组"""
+        return self.get_connection().execute(
+            "SELECT id, user_id, name FROM watchlist WHERE id = ?", (watchlist_id,)
+        ).fetchone()
+
+    def delete_watchlist(self, watchlist_id: int):
+        """删除自选股分组及其成员"""
+        conn = self.get_connection()
+        conn.execute("DELETE FROM watchlist_item WHERE watchlist_id = ?", (watchlist_id,))
+        conn.execute("DELETE FROM watchlist WHERE id = ?", (watchlist_id,))
+        conn.commit()
+
+    def add_watchlist_item(self, watchlist_id: int, code: str) -> bool:
+        """添加自选股成员，已存在时返回 False"""
+        conn = self.get_connection()
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO watchlist_item (watchlist_id, code) VALUES (?, ?)",
+            (watchlist_id, code)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+    def remove_watchlist_item(self, watchlist_id: int, code: str) -> bool:
+        """移除自选股成员"""
+        conn = self.get_connection()
+        cursor = conn.execute(
+            "DELETE FROM watchlist_item WHERE watchlist_id = ? AND code = ?",
+            (watchlist_id, code)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+    def get_watchlist_snapshot(self, watchlist_id: int) -> List[Dict]:
+        """一次查询返回自选股分组内所有成员的最新状态快照"""
+        return self.get_connection().execute('''
+            SELECT
+                i.code, info.name,
+                s.last_date, s.last_close, s.change_pct,
+                s.dif, s.dea, s.macd, s.macd_state,
+                s.pen_direction, s.pen_start_date,
+                p.pivot_type, p.zg AS pivot_zg, p.zd AS pivot_zd
+            FROM watchlist_item i
+            LEFT JOIN stock_snapshot s ON s.code = i.code
+            LEFT JOIN stock_pivot p ON p.code = i.code AND p.level = 'daily'
+            LEFT JOIN stock_info info ON info.code = i.code
+            WHERE i.watchlist_id = ?
+            ORDER BY i.id ASC
+        ''', (watchlist_id,)).fetchall()
+
+    def _raw_connection(self) -> sqlite3.Connection:
+        """获取不带 dict row_factory 的连接，供 pandas 读取使用"""
+        conn = getattr(self._local, 'raw_conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.raw_conn = conn
+        return conn
+
+    @staticmethod
+    def _range_sql(sql: str, params: list, start_date: Optional[str],
+                   end_date: Optional[str]) -> tuple:
+        """追加日期范围条件"""
+        if start_date:
+            sql += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            sql += " AND date <= ?"
+            params.append(end_date)
+        return sql, params
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+# 后端模块按扁平结构导入（与 main.py 相同），测试时把 backend 目录加入搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 需要数据库的测试使用临时 SQLite 文件（必须在导入 database 之前设置）
+os.environ['DB_BACKEND'] = 'sqlite'
+os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(prefix='stock-tests-'), 'stock_data.db')
+os.environ['PIPELINE_STATE_PATH'] = os.path.join(os.path.dirname(os.environ['SQLITE_PATH']), 'pipeline_state.json')
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def database():
+    """初始化临时 SQLite 数据库（各测试使用不同的股票代码，互不影响）"""
+    from database import db
+    db.init_database()
+    return db
@@ -0,0 +1,55 @@
+"""
+重新生成 chanlun_frontend.json：后端缠论算法与前端 utils/chanlun.ts 一致性测试的夹具
+
+用合成数据生成三组K线（包含大量包含关系合并），交给前端实现计算分型和笔
+（frontend/scripts/chanlun-fixture.mjs，需要 Node.js 22.18 及以上）。
+前端算法修改后在 backend 目录下执行：
+    python tests/fixtures/make_chanlun_frontend.py
+"""
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, BACKEND_DIR)
+
+from bench.datagen import generate_bars, trading_days
+
+SCRIPT_PATH = os.path.join(os.path.dirname(BACKEND_DIR), 'frontend', 'scripts', 'chanlun-fixture.mjs')
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chanlun_frontend.json')
+
+CODES = ['sh600000', 'sz000001', 'sz300750']
+BAR_COUNT = 160
+SEED = 7
+
+
+def main():
+    dates = trading_days(1)[:BAR_COUNT]
+    series = []
+    for code in CODES:
+        df = generate_bars(code, dates, SEED)
+        bars = [
+            {'date': d.strftime('%Y-%m-%d'), 'open': o, 'high': h, 'low': l, 'close': c, 'volume': float(v)}
+            for d, o, h, l, c, v in zip(df['date'], df['open'], df['high'], df['low'], df['close'], df['volume'])
+        ]
+        series.append({'code': code, 'bars': bars})
+
+    output = subprocess.run(['node', SCRIPT_PATH], input=json.dumps(series), capture_output=True,
+                            text=True, check=True).stdout
+
+    cases = []
+    for item, result in zip(series, json.loads(output)):
+        cases.append({
+            'code': item['code'],
+            'bars': [[bar['date'], bar['open'], bar['high'], bar['low'], bar['close']] for bar in item['bars']],
+            **{key: result[key] for key in ('merged_count', 'fractals', 'pens')},
+        })
+
+    with open(FIXTURE_PATH, 'w', encoding='utf-8') as f:
+        f.write('[\n' + ',\n'.join(json.dumps(case) for case in cases) + '\n]\n')
+    print(f"已写入 {FIXTURE_PATH}")
+
+
+if __name__ == '__main__':
+    main()
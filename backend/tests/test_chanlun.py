@@ -0,0 +1,55 @@
+"""
+后端缠论算法与前端 utils/chanlun.ts 的一致性
+
+fixtures/chanlun_frontend.json 由前端实现对合成K线计算得到（包含大量包含关系合并），
+生成方式见 fixtures/make_chanlun_frontend.py（运行 frontend/scripts/chanlun-fixture.mjs）；
+后端的分型、笔必须与之完全相同；增量识别（ChanlunState）必须与一次性计算相同。
+"""
+import json
+import os
+import random
+import pytest
+from chanlun import ChanlunState, analyze_chanlun, process_containment
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'chanlun_frontend.json')
+
+with open(FIXTURE_PATH, encoding='utf-8') as f:
+    CASES = json.load(f)
+
+
+def columns(bars):
+    _, open_, high, low, close = zip(*bars)
+    return open_, high, low, close
+
+
+@pytest.mark.parametrize('case', CASES, ids=[case['code'] for case in CASES])
+def test_matches_frontend(case):
+    open_, high, low, close = columns(case['bars'])
+
+    # 夹具必须包含包含关系合并，否则处理后索引与原始索引相同，测不出差异
+    processed = process_containment(open_, high, low, close)
+    assert len(processed) == case['merged_count'] < len(case['bars'])
+
+    result = analyze_chanlun(open_, high, low, close)
+    assert result['fractals'] == case['fractals']
+    assert [
+        {key: pen[key] for key in ('type', 'start_index', 'end_index', 'start_price', 'end_price')}
+        for pen in result['pens']
+    ] == case['pens']
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_state_matches_batch(seed):
+    from bench.datagen import generate_bars, trading_days
+
+    df = generate_bars(f'sh{600100 + seed}', trading_days(2), seed)
+    bars = [df[column].to_numpy() for column in ('open', 'high', 'low', 'close')]
+    rng = random.Random(seed)
+
+    state = ChanlunState()
+    position = 0
+    while position < len(df):
+        step = rng.choice([1, 1, 2, 5, 40])
+        state.append(*[column[position:position + step] for column in bars])
+        position = min(position + step, len(df))
+        assert state.result() == analyze_chanlun(*[column[:position] for column in bars])
@@ -0,0 +1,47 @@
+"""K线接口 ETag：新增K线、复权改写历史价格、股票更名都必须使缓存失效"""
+from fastapi.testclient import TestClient
+
+from bench.datagen import generate_bars, trading_days
+from main import app
+
+client = TestClient(app)
+
+
+def fetch(code, etag=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    return client.get(f'/api/stock/{code}', params={'days': 50}, headers=headers)
+
+
+def test_etag_changes_with_content(database):
+    code = 'sh600950'
+    df = generate_bars(code, trading_days(1), 5)
+    database.add_stock_info(code, '测试股份')
+    database.insert_batch(code, df.iloc[:-1])
+
+    first = fetch(code)
+    etag = first.headers['etag']
+    assert first.json()['name'] == '测试股份'
+    assert fetch(code, etag).status_code == 304
+
+    # 其他进程改写历史价格（前复权调整）：数据范围不变，最早的收盘价变化
+    conn = database.get_connection()
+    conn.execute("UPDATE stock_daily SET close = close * 0.9 WHERE code = ?", (code,))
+    conn.commit()
+    adjusted = fetch(code, etag)
+    assert adjusted.status_code == 200
+    assert adjusted.headers['etag'] != etag
+    etag = adjusted.headers['etag']
+
+    # 更名：缓存的响应体中的名称已过期
+    database.add_stock_info(code, '测试控股')
+    renamed = fetch(code, etag)
+    assert renamed.status_code == 200
+    assert renamed.json()['name'] == '测试控股'
+    etag = renamed.headers['etag']
+
+    # 新增K线
+    database.insert_batch(code, df.iloc[-1:])
+    appended = fetch(code, etag)
+    assert appended.status_code == 200
+    assert appended.json()['data'][-1]['date'] == df['date'].iloc[-1].strftime('%Y-%m-%d')
+    assert fetch(code, appended.headers['etag']).status_code == 304
@@ -0,0 +1,98 @@
+"""多股票对比：相关系数、Beta 与 pandas 的结果一致，交易日历对齐，面板缓存能发现其他进程的写入"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import comparison
+from bench.datagen import generate_bars, trading_days
+
+
+@pytest.fixture
+def returns():
+    """带缺失值的收益率矩阵（模拟上市前、停牌）和基准收益率"""
+    rng = np.random.default_rng(7)
+    bench = rng.normal(0, 0.01, 300)
+    data = np.column_stack([
+        bench * k + rng.normal(0, 0.01, 300) for k in (0.5, 1.0, 1.5, -0.8)
+    ])
+    data[:40, 1] = np.nan
+    data[rng.choice(300, 30, replace=False), 2] = np.nan
+    bench[rng.choice(300, 10, replace=False)] = np.nan
+    return data, bench
+
+
+def test_correlation_matrix_matches_pandas(returns):
+    data, _ = returns
+    expected = pd.DataFrame(data).corr().to_numpy()
+    np.testing.assert_allclose(comparison.correlation_matrix(data), expected, rtol=1e-9)
+
+
+def test_beta_matches_pandas(returns):
+    data, bench = returns
+    expected = []
+    for i in range(data.shape[1]):
+        pair = pd.DataFrame({'x': data[:, i], 'y': bench}).dropna()
+        expected.append(pair['x'].cov(pair['y']) / pair['y'].var())
+    np.testing.assert_allclose(comparison.beta_vs_benchmark(data, bench), expected, rtol=1e-9)
+
+
+def test_rolling_matches_pandas(returns):
+    data, bench = returns
+    window = 60
+    corr, beta = comparison.rolling_vs_benchmark(data, bench, window)
+
+    for i in range(data.shape[1]):
+        x, y = pd.Series(data[:, i]), pd.Series(bench)
+        rolling = dict(window=window, min_periods=window // 2)
+        expected_corr = x.rolling(**rolling).corr(y).to_numpy().copy()
+        # Beta 的基准方差只用股票也有数据的交易日
+        expected_beta = (x.rolling(**rolling).cov(y) / y.where(x.notna()).rolling(**rolling).var()).to_numpy().copy()
+        # 前 window-1 行不足一个完整窗口，不输出
+        expected_corr[:window - 1] = np.nan
+        expected_beta[:window - 1] = np.nan
+
+        np.testing.assert_allclose(corr[:, i], expected_corr, rtol=1e-9)
+        np.testing.assert_allclose(beta[:, i], expected_beta, rtol=1e-9)
+
+
+def test_panel_follows_benchmark_calendar(database):
+    days = trading_days(1)
+    benchmark, stock = 'sh000901', 'sh600960'
+    database.insert_batch(benchmark, generate_bars(benchmark, days, 1))
+    # 股票晚20天上市，中间停牌5天，另有一天基准没有交易
+    bars = generate_bars(stock, days, 2).iloc[20:]
+    database.insert_batch(stock, bars.drop(bars.index[50:55]))
+    database.insert_batch(stock, generate_bars(stock, [pd.Timestamp('2030-01-05')], 3))
+
+    panel = comparison.get_panel([stock, benchmark], calendar_code=benchmark)
+    assert [d for d in panel.index] == [d.strftime('%Y-%m-%d') for d in days]
+    assert panel[stock].iloc[:20].isna().all()
+    # 停牌日沿用停牌前的收盘价
+    suspended = panel[stock].iloc[70:75]
+    assert (suspended == bars['close'].iloc[49]).all()
+
+
+def test_benchmark_in_codes(database):
+    days = trading_days(1)
+    benchmark, stock = 'sh000902', 'sh600961'
+    database.insert_batch(benchmark, generate_bars(benchmark, days, 4))
+    database.insert_batch(stock, generate_bars(stock, days, 5))
+
+    result = comparison.compare_stocks([benchmark, stock], benchmark)
+    assert result['beta'][benchmark] == pytest.approx(1.0)
+    assert result['correlation'][0][0] == pytest.approx(1.0)
+    assert result['rolling_correlation'][benchmark][-1] == pytest.approx(1.0)
+
+
+def test_panel_cache_sees_writes_from_other_processes(database):
+    days = trading_days(1)
+    code = 'sh600962'
+    df = generate_bars(code, days, 6)
+    database.insert_batch(code, df.iloc[:-1])
+    assert len(comparison.get_panel([code])) == len(df) - 1
+
+    # 直接写库，不经过 invalidate_panels（相当于其他 worker 或流水线进程写入）
+    database.insert_batch(code, df.iloc[-1:])
+    panel = comparison.get_panel([code])
+    assert len(panel) == len(df)
+    assert panel.index[-1] == df['date'].iloc[-1].strftime('%Y-%m-%d')
@@ -0,0 +1,40 @@
+"""请求级连接作用域：网络下载前归还连接，之后的查询重新取出"""
+from database import ConnectionScope, current_scope, release_request_connection
+
+
+class FakeConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def close(self):
+        self.pool.remove(self)
+
+
+def test_release_before_download_returns_connection_to_pool():
+    in_use = []
+
+    def checkout():
+        conn = FakeConnection(in_use)
+        in_use.append(conn)
+        return conn
+
+    scope = ConnectionScope(checkout)
+    token = current_scope.set(scope)
+    try:
+        scope.connection().close()
+        scope.connection().close()
+        assert len(in_use) == 1
+
+        # 下载期间不持有连接
+        release_request_connection()
+        assert in_use == []
+
+        scope.connection()
+        assert len(in_use) == 1
+    finally:
+        current_scope.reset(token)
+        scope.release()
+
+    assert in_use == []
+    # 没有作用域时（SQLite 或请求之外）为空操作
+    release_request_connection()
@@ -0,0 +1,164 @@
+"""背驰判断：MACD 面积前缀和、顶/底背驰、趋势与盘整的区分、置信度，以及全市场扫描与单股分析一致"""
+import numpy as np
+import pytest
+
+import divergence
+from bench.datagen import generate_bars, trading_days
+
+BARS_PER_LEG = 5
+
+
+def make_legs(points):
+    """由转折点价格构造首尾相接的走势段，每段 BARS_PER_LEG 根K线"""
+    legs = []
+    for i, (start, end) in enumerate(zip(points, points[1:])):
+        legs.append({
+            'type': 'up' if end > start else 'down',
+            'start_index': i * BARS_PER_LEG,
+            'end_index': (i + 1) * BARS_PER_LEG,
+            'start_price': start,
+            'end_price': end,
+        })
+    return legs
+
+
+def leg_series(legs, values):
+    """每段内部K线（不含起点）取该段对应的值，生成与K线一一对应的序列"""
+    series = np.zeros(legs[-1]['end_index'] + 1)
+    for leg, value in zip(legs, values):
+        series[leg['start_index'] + 1:leg['end_index'] + 1] = value
+    return series
+
+
+def test_macd_area_prefix_sums():
+    assert divergence.prefix_sum([1, 2, 3]).tolist() == [0, 1, 3, 6]
+
+    area = divergence.MACDArea([0.5, -1.0, 2.0, -0.25, 1.0])
+    assert area.red_area(0, 4) == 3.5
+    assert area.red_area(1, 3) == 2.0
+    assert area.green_area(0, 4) == 1.25
+    assert area.green_area(3, 3) == 0.25
+    assert area.leg_area({'type': 'up', 'start_index': 2, 'end_index': 4}) == 3.0
+    assert area.leg_area({'type': 'down', 'start_index': 0, 'end_index': 2}) == 1.0
+
+
+def test_consolidation_top_divergence():
+    legs = make_legs([10, 20, 15, 22])
+    histogram = leg_series(legs, [2.0, -1.0, 0.5])
+    dif = leg_series(legs, [3.0, 1.0, 2.0])
+    volume = leg_series(legs, [100, 80, 60])
+
+    events = divergence.detect_divergences(legs, histogram, dif, volume)
+    assert len(events) == 1
+
+    event = events[0]
+    assert (event['type'], event['kind']) == ('top', 'consolidation')
+    assert (event['start_index'], event['end_index'], event['price']) == (0, 15, 22)
+    assert event['previous_leg']['area'] == 10.0
+    assert event['leg']['area'] == 2.5
+    assert event['strength'] == 0.75
+    # 黄白线未创新高、量能萎缩都满足
+    assert event['confidence'] == 1.0
+
+
+def test_confidence_counts_confirmations():
+    legs = make_legs([20, 10, 15, 8])
+    histogram = leg_series(legs, [-2.0, 1.0, -1.0])
+
+    # 黄白线同步创新低，量能放大：面积背驰但辅助条件都不满足
+    dif = leg_series(legs, [-1.0, 0.0, -2.0])
+    volume = leg_series(legs, [100, 80, 120])
+    event, = divergence.detect_divergences(legs, histogram, dif, volume)
+    assert event['type'] == 'bottom'
+    assert event['strength'] == 0.5
+    assert event['confidence'] == 0.0
+
+    # 没有成交量时只检查黄白线
+    dif = leg_series(legs, [-2.0, 0.0, -1.0])
+    event, = divergence.detect_divergences(legs, histogram, dif)
+    assert event['confidence'] == 1.0
+
+
+def test_no_divergence_without_new_extreme_or_smaller_area():
+    legs = make_legs([10, 20, 15, 22])
+    dif = np.zeros(legs[-1]['end_index'] + 1)
+    # 面积放大
+    assert divergence.detect_divergences(legs, leg_series(legs, [1.0, -1.0, 2.0]), dif) == []
+    # 未创新高
+    legs = make_legs([10, 20, 15, 19])
+    assert divergence.detect_divergences(legs, leg_series(legs, [2.0, -1.0, 0.5]), dif) == []
+
+
+# 两个上涨中枢：[ZD, ZG] 为 [11, 12] 和 [14.5, 15.5]，最后一笔离开第二个中枢并越过其 GG=16
+TREND_POINTS = [12, 10, 12.5, 11, 16, 14, 15.5, 14.5, 19]
+
+
+def test_trend_divergence_requires_two_rising_pivots():
+    legs = make_legs(TREND_POINTS)
+    histogram = leg_series(legs, [-1, 1, -1, 1, -1, 3.0, -1, 1.0])
+    dif = np.zeros(legs[-1]['end_index'] + 1)
+
+    event, = divergence.detect_divergences(legs, histogram, dif)
+    assert (event['type'], event['kind']) == ('top', 'trend')
+    assert event['leg']['end_index'] == legs[-1]['end_index']
+
+
+def test_overlapping_pivots_are_consolidation():
+    # 回调跌回第一个中枢的区间（11.5 < ZG=12），中枢延伸而没有形成第二个中枢，不构成趋势
+    points = [12, 10, 12.5, 11, 16, 11.5, 15.5, 12, 19]
+    legs = make_legs(points)
+    histogram = leg_series(legs, [-1, 1, -1, 1, -1, 3.0, -1, 1.0])
+    dif = np.zeros(legs[-1]['end_index'] + 1)
+
+    event, = divergence.detect_divergences(legs, histogram, dif)
+    assert (event['type'], event['kind']) == ('top', 'consolidation')
+    assert event['leg']['end_index'] == legs[-1]['end_index']
+
+
+def test_filter_signals():
+    results = [
+        {'code': 'a', 'events': [{'type': 'top', 'kind': 'trend'}, {'type': 'bottom', 'kind': 'consolidation'}]},
+        {'code': 'b', 'events': [{'type': 'top', 'kind': 'consolidation'}]},
+    ]
+    assert divergence.filter_signals(results) is results
+    assert [item['code'] for item in divergence.filter_signals(results, type='bottom')] == ['a']
+    assert divergence.filter_signals(results, type='top', kind='trend') == [
+        {'code': 'a', 'events': [{'type': 'top', 'kind': 'trend'}]}
+    ]
+    assert divergence.filter_signals(results, kind='trend', type='bottom') == []
+
+
+def test_scan_matches_single_stock_analysis(database, monkeypatch):
+    codes = ['sh600970', 'sh600971', 'sh600972']
+    for seed, code in enumerate(codes):
+        database.insert_batch(code, generate_bars(code, trading_days(4), seed))
+
+    # 合成数据截止 2024 年底，把默认窗口固定在数据范围内
+    monkeypatch.setattr(divergence, 'default_start_date', lambda: '2023-01-01')
+
+    recent_bars = 120
+    scan = divergence.scan_divergences(codes, recent_bars=recent_bars, workers=1)
+    assert scan['start_date'] == '2023-01-01'
+    scanned = {item['code']: item['events'] for item in scan['results']}
+    assert scanned
+
+    for code in codes:
+        single = divergence.get_divergence(code)
+        assert single['start_date'] == scan['start_date']
+        cutoff = single['total_bars'] - recent_bars
+        recent = [event for event in single['events'] if event['end_index'] >= cutoff]
+        assert scanned.get(code, []) == recent
+
+
+@pytest.mark.parametrize('level', ['pen', 'segment'])
+def test_divergence_dates_follow_indices(database, level):
+    code = 'sh600973'
+    df = generate_bars(code, trading_days(3), 9)
+    database.insert_batch(code, df)
+
+    result = divergence.get_divergence(code, start_date='2022-01-01', level=level)
+    dates = [d.strftime('%Y-%m-%d') for d in df['date'] if d.strftime('%Y-%m-%d') >= '2022-01-01']
+    assert result['total_bars'] == len(dates)
+    for event in result['events']:
+        assert event['start_date'] == dates[event['start_index']]
+        assert event['end_date'] == dates[event['end_index']]
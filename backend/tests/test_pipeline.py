@@ -0,0 +1,105 @@
+"""收盘后数据流水线"""
+import pytest
+from pipeline import build_rollups, update_rollups
+from bench.datagen import generate_bars, trading_days
+
+
+@pytest.mark.parametrize('since', ['2024-03-05', '2024-04-01', '2024-05-02', '2024-07-31'])
+def test_incremental_rollups_match_full_rebuild(database, since):
+    code = 'sh601' + since[5:7] + since[8:10]
+    df = generate_bars(code, trading_days(1), 3)
+    df = df[df['date'] <= '2024-08-30']
+
+    # 先写入 since 之前的K线并全量汇总，再追加之后的K线并从 since 开始增量汇总
+    database.insert_batch(code, df[df['date'] < since])
+    update_rollups(code)
+    database.insert_batch(code, df[df['date'] >= since])
+    update_rollups(code, since)
+
+    expected = build_rollups(database.query_frame(code))
+    for period in ('week', 'month'):
+        assert database.query_rollups(code, period) == [
+            {key: row[key] for key in ('date', 'open', 'high', 'low', 'close')} | {'volume': float(row['volume'])}
+            for row in expected[period]
+        ]
+
+
+def test_status_reloads_state_written_by_another_process(database, tmp_path):
+    from bench import fake_akshare
+    from pipeline import Pipeline
+
+    fake_akshare.install(years=1, stock_count=3)
+    state_path = str(tmp_path / 'pipeline_state.json')
+
+    # reader 相当于 API worker，writer 相当于 cron 执行的 pipeline.py
+    reader = Pipeline(state_path, workers=2)
+    assert reader.status()['last_run'] is None
+
+    writer = Pipeline(state_path, workers=2)
+    run = writer.run('manual')
+    assert run['status'] == 'success'
+
+    status = reader.status()
+    assert status['last_run']['id'] == run['id']
+    assert status['last_run']['status'] == 'success'
+    assert reader.signals() == writer.signals()
+
+
+def test_run_is_exclusive_across_processes(database, tmp_path):
+    import threading
+    from bench import fake_akshare
+    from pipeline import Pipeline
+
+    fake_akshare.install(years=1, stock_count=3)
+    state_path = str(tmp_path / 'pipeline_state.json')
+
+    # 两个实例使用同一状态文件，相当于两个 worker 进程
+    owner, other = Pipeline(state_path, workers=2), Pipeline(state_path, workers=2)
+    entered, release = threading.Event(), threading.Event()
+    stage_bars = owner.stages['bars']
+
+    def slow_bars(changed, full):
+        entered.set()
+        release.wait(10)
+        return stage_bars(changed, full)
+
+    owner.stages['bars'] = slow_bars
+    thread = threading.Thread(target=owner.run)
+    thread.start()
+    try:
+        assert entered.wait(10)
+        assert other.running
+        assert other.status()['running']
+        with pytest.raises(RuntimeError):
+            other.run('manual')
+        # 正在进行的运行没有被标记为中断
+        assert other.status()['last_run']['status'] == 'running'
+    finally:
+        release.set()
+        thread.join()
+
+    assert not other.running
+    runs = other.status()['history']
+    assert [run['status'] for run in runs] == ['success']
+
+
+def test_new_listings_are_backfilled(database, tmp_path):
+    from bench import fake_akshare
+    from bench.datagen import make_codes
+    from pipeline import Pipeline
+
+    state_path = str(tmp_path / 'pipeline_state.json')
+    fake_akshare.install(years=1, stock_count=3)
+    Pipeline(state_path, workers=2).run('manual')
+
+    # 股票列表中出现新上市的股票：日线同步阶段获取其全部历史，后续阶段一并处理
+    fake_akshare.install(years=1, stock_count=6)
+    run = Pipeline(state_path, workers=2).run('manual')
+    stages = {stage['name']: stage for stage in run['stages']}
+    listed = make_codes(6)[3:]
+
+    assert sorted(stages['stock_list']['codes']) == sorted(listed)
+    for code in listed:
+        assert database.get_data_range(code)['latest'] == '2024-12-31'
+        assert code in stages['bars']['codes']
+        assert code in stages['chan']['codes']
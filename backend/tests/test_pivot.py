@@ -0,0 +1,56 @@
+"""线段和中枢结构：增量读取新K线的结果必须与从头计算相同"""
+import pivot
+from bench.datagen import generate_bars, trading_days
+
+
+def test_incremental_structure_matches_rebuild(database, monkeypatch):
+    code = 'sh600900'
+    df = generate_bars(code, trading_days(3), 11)
+
+    reads = []
+    query_frame = database.query_frame
+    monkeypatch.setattr(database, 'query_frame', lambda *args: reads.append(args) or query_frame(*args))
+
+    # 先写入一部分历史，之后分批追加新K线，每次增量更新后与清空缓存重新计算的结果比较
+    boundaries = [400, 401, 403, 450, 520, len(df)]
+    database.insert_batch(code, df.iloc[:boundaries[0]])
+    pivot.get_structure(code)
+
+    for start, end in zip(boundaries, boundaries[1:]):
+        database.insert_batch(code, df.iloc[start:end])
+        reads.clear()
+        incremental = pivot.get_structure(code)
+        # 只读取上次之后的新K线
+        assert len(reads) == 1 and reads[0][1] > df['date'].iloc[start - 1].strftime('%Y-%m-%d')
+
+        pivot._states.pop(code)
+        assert pivot.get_structure(code) == incremental
+        assert incremental['total_bars'] == end
+
+
+def test_earlier_history_triggers_rebuild(database):
+    code = 'sz000900'
+    df = generate_bars(code, trading_days(2), 5)
+
+    database.insert_batch(code, df.iloc[100:])
+    assert pivot.get_structure(code)['total_bars'] == len(df) - 100
+
+    # 补全更早的K线后重新读取全部历史
+    database.insert_batch(code, df.iloc[:100])
+    result = pivot.get_structure(code)
+    pivot._states.pop(code)
+    assert result == pivot.get_structure(code)
+    assert result['total_bars'] == len(df)
+
+
+def test_active_pivots_are_saved_and_read_back(database):
+    code = 'sh600901'
+    database.insert_batch(code, generate_bars(code, trading_days(3), 2))
+
+    saved = pivot.refresh_active_pivots(code)
+    assert set(saved['levels']) == set(pivot.LEVELS)
+    assert saved['levels']['daily'] is not None
+    assert database.get_active_pivots([code, 'sh699999']) == {code: saved}
+
+    # 批量接口读取保存的结果；没有数据的股票返回 None
+    assert pivot.active_pivots([code, 'sh699999']) == {code: saved, 'sh699999': None}
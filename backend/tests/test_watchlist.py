@@ -0,0 +1,62 @@
+"""自选股接口：分组和成员的增删、快照内容，以及快照字段与前端 WatchlistSnapshotItem 类型一致"""
+import os
+import re
+
+from fastapi.testclient import TestClient
+
+import pivot
+from bench.datagen import generate_bars, trading_days
+from main import app
+
+client = TestClient(app)
+
+TYPES_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'frontend', 'src', 'types', 'stock.ts')
+
+
+def frontend_fields(interface: str) -> set:
+    """读取前端类型定义中某个 interface 的字段名"""
+    with open(TYPES_PATH, encoding='utf-8') as f:
+        source = f.read()
+    body = re.search(r'export interface %s \{(.*?)\n\}' % interface, source, re.S).group(1)
+    return set(re.findall(r'^\s+(\w+)\??:', body, re.M))
+
+
+def test_watchlist_lifecycle(database):
+    codes = ['sh600980', 'sh600981']
+    for seed, code in enumerate(codes):
+        database.add_stock_info(code, f'自选{seed}')
+        database.insert_batch(code, generate_bars(code, trading_days(3), seed))
+    pivot.refresh_active_pivots(codes[0])
+
+    created = client.post('/api/watchlists', params={'name': '观察', 'user_id': 'tester'}).json()
+    watchlist_id = created['id']
+    assert client.get('/api/watchlists', params={'user_id': 'tester'}).json()['total'] == 1
+
+    for code in codes:
+        assert client.post(f'/api/watchlists/{watchlist_id}/stocks/{code[2:]}').json()['added'] is True
+    # 重复添加不报错
+    assert client.post(f'/api/watchlists/{watchlist_id}/stocks/{codes[0]}').json()['added'] is False
+
+    snapshot = client.get(f'/api/watchlists/{watchlist_id}/snapshot').json()
+    assert snapshot['total'] == 2
+    rows = {row['code']: row for row in snapshot['stocks']}
+    assert set(rows) == set(codes)
+
+    first = rows[codes[0]]
+    assert set(first) == frontend_fields('WatchlistSnapshotItem')
+    assert first['name'] == '自选0'
+    assert first['last_date'] == '2024-12-31'
+    assert first['macd_state'] in ('golden_cross', 'dead_cross', 'bullish', 'bearish')
+    assert first['pen_direction'] in ('up', 'down')
+
+    daily = database.get_active_pivots([codes[0]])[codes[0]]['levels']['daily']
+    assert (first['pivot_type'], first['pivot_zg'], first['pivot_zd']) == (daily['type'], daily['zg'], daily['zd'])
+    # 没有保存中枢的股票中枢字段为空
+    assert rows[codes[1]]['pivot_type'] is None
+
+    assert client.delete(f'/api/watchlists/{watchlist_id}/stocks/{codes[1]}').json()['removed'] is True
+    assert client.get(f'/api/watchlists/{watchlist_id}/snapshot').json()['total'] == 1
+
+    assert client.delete(f'/api/watchlists/{watchlist_id}').json()['success'] is True
+    assert client.get(f'/api/watchlists/{watchlist_id}/snapshot').status_code == 404
+    assert client.delete(f'/api/watchlists/{watchlist_id}').status_code == 404
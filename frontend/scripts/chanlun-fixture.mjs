@@ -0,0 +1,52 @@
+/**
+ * 用前端 src/utils/chanlun.ts 计算分型和笔，生成后端一致性测试的期望结果
+ *
+ * 由 backend/tests/fixtures/make_chanlun_frontend.py 调用：从标准输入读取
+ * [{code, bars: KLineData[]}]，向标准输出写出每组K线的合并后数量、分型和笔。
+ * 直接运行 TypeScript 源码，需要 Node.js 22.18 及以上（内置类型擦除），无需编译。
+ */
+import { register } from "node:module";
+import { readFileSync } from "node:fs";
+
+// 源码中的相对导入不带扩展名（由 Vite 解析），这里补上 .ts
+register(
+  "data:text/javascript," +
+    encodeURIComponent(`
+export async function resolve(specifier, context, next) {
+  if (specifier.startsWith(".") && !/\\.[cm]?[jt]s$/.test(specifier)) {
+    return next(specifier + ".ts", context);
+  }
+  return next(specifier, context);
+}
+`)
+);
+
+const { processKLineContainment, identifyFractals, identifyPens } = await import(
+  "../src/utils/chanlun.ts"
+);
+
+const series = JSON.parse(readFileSync(0, "utf-8"));
+
+const cases = series.map(({ code, bars }) => {
+  const fractals = identifyFractals(bars);
+  const pens = identifyPens(bars, fractals);
+  return {
+    code,
+    merged_count: processKLineContainment(bars).length,
+    fractals: fractals.map((f) => ({
+      type: f.type,
+      index: f.index,
+      price: f.price,
+      processed_index: f.processedIndex,
+    })),
+    pens: pens.map((p) => ({
+      type: p.type,
+      start_index: p.startIndex,
+      end_index: p.endIndex,
+      start_price: p.startPrice,
+      end_price: p.endPrice,
+    })),
+  };
+});
+
+process.stdout.write(JSON.stringify(cases));
@@ -1,5 +1,11 @@
 import axios from "axios";
-import type { StockData, StockInfo } from "../types/stock";
+import type {
+  CompareResult,
+  StockData,
+  StockInfo,
+  Watchlist,
+  WatchlistSnapshotItem,
+} from "../types/stock";
 
 const API_BASE_URL = "http://localhost:8000";
 
@@ -14,6 +20,13 @@ export interface GetIndexParams {
   endDate?: string;
 }
 
+export interface CompareParams {
+  benchmark?: string;
+  startDate?: string;
+  endDate?: string;
+  window?: number;
+}
+
 export const stockApi = {
   // 获取上证指数数据
   getShangHaiIndex: async (params?: GetIndexParams): Promise<StockData> => {
@@ -74,4 +87,77 @@ export const stockApi = {
     const response = await apiClient.get<{ stocks: StockInfo[] }>(url);
     return response.data.stocks;
   },
+
+  // 多股票对比分析
+  compareStocks: async (
+    codes: string[],
+    params?: CompareParams
+  ): Promise<CompareResult> => {
+    const queryParams = new URLSearchParams();
+    queryParams.append("codes", codes.join(","));
+
+    if (params?.benchmark) {
+      queryParams.append("benchmark", params.benchmark);
+    }
+    if (params?.startDate) {
+      queryParams.append("start_date", params.startDate);
+    }
+    if (params?.endDate) {
+      queryParams.append("end_date", params.endDate);
+    }
+    if (params?.window) {
+      queryParams.append("window", params.window.toString());
+    }
+
+    const response = await apiClient.get<CompareResult>(
+      `/api/compare?${queryParams.toString()}`
+    );
+    return response.data;
+  },
+
+  // 获取自选股分组列表
+  getWatchlists: async (userId: string = "default"): Promise<Watchlist[]> => {
+    const response = await apiClient.get<{ watchlists: Watchlist[] }>(
+      `/api/watchlists?user_id=${encodeURIComponent(userId)}`
+    );
+    return response.data.watchlists;
+  },
+
+  // 创建自选股分组
+  createWatchlist: async (
+    name: string,
+    userId: string = "default"
+  ): Promise<number> => {
+    const response = await apiClient.post<{ id: number }>(
+      `/api/watchlists?name=${encodeURIComponent(
+        name
+      )}&user_id=${encodeURIComponent(userId)}`
+    );
+    return response.data.id;
+  },
+
+  // 删除自选股分组
+  deleteWatchlist: async (watchlistId: number): Promise<void> => {
+    await apiClient.delete(`/api/watchlists/${watchlistId}`);
+  },
+
+  // 添加自选股
+  addWatchlistStock: async (watchlistId: number, code: string) => {
+    await apiClient.post(`/api/watchlists/${watchlistId}/stocks/${code}`);
+  },
+
+  // 移除自选股
+  removeWatchlistStock: async (watchlistId: number, code: string) => {
+    await apiClient.delete(`/api/watchlists/${watchlistId}/stocks/${code}`);
+  },
+
+  // 获取自选股快照（最新价、涨跌幅、MACD状态、最新笔方向）
+  getWatchlistSnapshot: async (
+    watchlistId: number
+  ): Promise<WatchlistSnapshotItem[]> => {
+    const response = await apiClient.get<{ stocks: WatchlistSnapshotItem[] }>(
+      `/api/watchlists/${watchlistId}/snapshot`
+    );
+    return response.data.stocks;
+  },
 };
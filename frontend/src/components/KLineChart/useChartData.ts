@@ -11,8 +11,9 @@ import type {
   LineData,
   HistogramData,
 } from "lightweight-charts";
-import { calculateMACDFromKLineData } from "../../utils/indicators";
+import { calculateMACDFromStore } from "../../utils/indicators";
 import { analyzeChanLun } from "../../utils/chanlun";
+import { getKLineStore, getStoreView } from "../../utils/klineStore";
 import {
   convertToStandardChartData,
   convertToChanChartData,
@@ -172,24 +173,42 @@ export const useChartData = ({
     const volumeData = convertToVolumeData(data);
     volumeSeriesRef.current.setData(volumeData);
 
-    // 计算MACD数据
-    const macdData = calculateMACDFromKLineData(data);
+    // 计算MACD数据（列式结果，与K线存储按索引对齐）
+    const store = getKLineStore(data);
+    const macdData = calculateMACDFromStore(store);
 
-    const difLineData: LineData[] = macdData.map((item) => ({
-      time: item.time as any,
-      value: item.dif,
-    }));
-
-    const deaLineData: LineData[] = macdData.map((item) => ({
-      time: item.time as any,
-      value: item.dea,
-    }));
+    const difLineData = getStoreView(store, "macd:dif", ({ time }) => {
+      const result: LineData[] = new Array(time.length);
+      for (let i = 0; i < time.length; i++) {
+        result[i] = { time: time[i] as any, value: macdData.dif[i] };
+      }
+      return result;
+    });
 
-    const macdHistogramData: HistogramData[] = macdData.map((item) => ({
-      time: item.time as any,
-      value: item.macd,
-      color: item.macd >= 0 ? "#ef5350" : "#26a69a",
-    }));
+    const deaLineData = getStoreView(store, "macd:dea", ({ time }) => {
+      const result: LineData[] = new Array(time.length);
+      for (let i = 0; i < time.length; i++) {
+        result[i] = { time: time[i] as any, value: macdData.dea[i] };
+      }
+      return result;
+    });
+
+    const macdHistogramData = getStoreView(
+      store,
+      "macd:histogram",
+      ({ time }) => {
+        const result: HistogramData[] = new Array(time.length);
+        for (let i = 0; i < time.length; i++) {
+          const value = macdData.macd[i];
+          result[i] = {
+            time: time[i] as any,
+            value,
+            color: value >= 0 ? "#ef5350" : "#26a69a",
+          };
+        }
+        return result;
+      }
+    );
 
     macdLineRef.current.setData(difLineData);
     signalLineRef.current.setData(deaLineData);
@@ -199,31 +218,26 @@ export const useChartData = ({
     const updateDisplayData = (param: any) => {
       if (!param.time || !param.point) {
         // 鼠标移出图表，显示最后一根K线的数据
-        const lastIndex = macdData.length - 1;
+        const lastIndex = store.length - 1;
         if (lastIndex >= 0) {
           setMacdDisplay({
-            dif: macdData[lastIndex].dif.toFixed(4),
-            dea: macdData[lastIndex].dea.toFixed(4),
-            macd: macdData[lastIndex].macd.toFixed(4),
+            dif: macdData.dif[lastIndex].toFixed(4),
+            dea: macdData.dea[lastIndex].toFixed(4),
+            macd: macdData.macd[lastIndex].toFixed(4),
           });
+          setVolumeDisplay(formatVolume(store.volume[lastIndex]));
         }
 
-        const lastVolumeIndex = data.length - 1;
-        if (lastVolumeIndex >= 0) {
-          setVolumeDisplay(formatVolume(data[lastVolumeIndex].volume));
-        }
-
-        if (data.length >= 2) {
-          const lastData = data[data.length - 1];
-          const prevData = data[data.length - 2];
-          const change = lastData.close - prevData.close;
-          const changePercent = (change / prevData.close) * 100;
+        if (store.length >= 2) {
+          const prevClose = store.close[lastIndex - 1];
+          const change = store.close[lastIndex] - prevClose;
+          const changePercent = (change / prevClose) * 100;
 
           setKlineDisplay({
-            open: formatPrice(lastData.open),
-            high: formatPrice(lastData.high),
-            low: formatPrice(lastData.low),
-            close: formatPrice(lastData.close),
+            open: formatPrice(store.open[lastIndex]),
+            high: formatPrice(store.high[lastIndex]),
+            low: formatPrice(store.low[lastIndex]),
+            close: formatPrice(store.close[lastIndex]),
             change: (change >= 0 ? "+" : "") + formatPrice(change),
             changePercent:
               (change >= 0 ? "+" : "") + formatPercent(changePercent),
@@ -4,6 +4,7 @@
 
 import type { KLineData } from "../../types/stock";
 import type { CandlestickData, HistogramData } from "lightweight-charts";
+import { getKLineStore, getStoreView } from "../../utils/klineStore";
 
 /**
  * 格式化成交量显示
@@ -34,17 +35,24 @@ export const formatPercent = (percent: number): string => {
 
 /**
  * 转换K线数据为图表数据（标准模式）
+ * 基于列式存储生成并缓存，同一份数据重复调用不会重新分配
  */
 export const convertToStandardChartData = (
   data: KLineData[]
 ): CandlestickData[] => {
-  return data.map((item) => ({
-    time: item.date as any,
-    open: item.open,
-    high: item.high,
-    low: item.low,
-    close: item.close,
-  }));
+  return getStoreView(getKLineStore(data), "candlestick:standard", (store) => {
+    const result: CandlestickData[] = new Array(store.length);
+    for (let i = 0; i < store.length; i++) {
+      result[i] = {
+        time: store.time[i] as any,
+        open: store.open[i],
+        high: store.high[i],
+        low: store.low[i],
+        close: store.close[i],
+      };
+    }
+    return result;
+  });
 };
 
 /**
@@ -53,29 +61,42 @@ export const convertToStandardChartData = (
 export const convertToChanChartData = (
   data: KLineData[]
 ): CandlestickData[] => {
-  return data.map((item) => ({
-    time: item.date as any,
-    open: item.low,
-    high: item.high,
-    low: item.low,
-    close: item.high,
-  }));
+  return getStoreView(getKLineStore(data), "candlestick:chan", (store) => {
+    const result: CandlestickData[] = new Array(store.length);
+    for (let i = 0; i < store.length; i++) {
+      result[i] = {
+        time: store.time[i] as any,
+        open: store.low[i],
+        high: store.high[i],
+        low: store.low[i],
+        close: store.high[i],
+      };
+    }
+    return result;
+  });
 };
 
 /**
  * 转换成交量数据
  */
 export const convertToVolumeData = (data: KLineData[]): HistogramData[] => {
-  return data.map((item, index) => ({
-    time: item.date as any,
-    value: item.volume,
-    color:
-      index === 0
-        ? "#26a69a"
-        : item.close >= data[index - 1]?.close
-        ? "#ef5350"
-        : "#26a69a",
-  }));
+  return getStoreView(getKLineStore(data), "volume", (store) => {
+    const { time, volume, close } = store;
+    const result: HistogramData[] = new Array(store.length);
+    for (let i = 0; i < store.length; i++) {
+      result[i] = {
+        time: time[i] as any,
+        value: volume[i],
+        color:
+          i === 0
+            ? "#26a69a"
+            : close[i] >= close[i - 1]
+            ? "#ef5350"
+            : "#26a69a",
+      };
+    }
+    return result;
+  });
 };
 
 /**
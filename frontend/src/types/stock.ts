@@ -21,3 +21,54 @@ export interface StockInfo {
   market: string;
   type: string;
 }
+
+export interface Watchlist {
+  id: number;
+  name: string;
+  total: number; // 成员数量
+}
+
+export interface WatchlistSnapshotItem {
+  code: string;
+  name: string | null;
+  last_date: string | null; // 最新K线日期
+  last_close: number | null; // 最新收盘价
+  change_pct: number | null; // 涨跌幅（%）
+  dif: number | null;
+  dea: number | null;
+  macd: number | null;
+  macd_state: "golden_cross" | "dead_cross" | "bullish" | "bearish" | null;
+  pen_direction: "up" | "down" | null; // 最新笔方向
+  pen_start_date: string | null;
+  pivot_type: "up" | "down" | null; // 日线当前中枢方向（没有当前中枢时为 null）
+  pivot_zg: number | null; // 中枢上沿 ZG
+  pivot_zd: number | null; // 中枢下沿 ZD
+}
+
+export interface CompareResult {
+  dates: string[]; // 对齐后的交易日
+  codes: string[];
+  benchmark: string; // 基准指数代码
+  window: number; // 滚动窗口
+  rebased: Record<string, (number | null)[]>; // 归一化走势（首个有效收盘价为1）
+  correlation: (number | null)[][]; // 全区间收益率相关系数矩阵
+  window_correlation: (number | null)[][]; // 最近一个窗口的相关系数矩阵
+  beta: Record<string, number | null>; // 全区间 Beta
+  return_dates: string[]; // 收益率序列对应的日期
+  rolling_correlation: Record<string, (number | null)[]>; // 相对基准的滚动相关系数
+  rolling_beta: Record<string, (number | null)[]>; // 相对基准的滚动 Beta
+}
+
+/**
+ * 列式K线存储：同一份K线数据只转换一次，供图表转换、指标和缠论计算共享
+ */
+export interface KLineStore {
+  length: number; // K线数量
+  time: string[]; // 时间索引（YYYY-MM-DD）
+  open: Float64Array; // 开盘价
+  high: Float64Array; // 最高价
+  low: Float64Array; // 最低价
+  close: Float64Array; // 收盘价
+  volume: Float64Array; // 成交量
+  views: Map<string, unknown>; // 惰性生成的派生视图缓存
+}
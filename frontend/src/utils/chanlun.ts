@@ -9,6 +9,7 @@ import type {
   FractalType,
   Pen,
 } from "../types/chanlun";
+import { getKLineStore, getStoreView } from "./klineStore";
 
 /**
  * 处理K线包含关系
@@ -25,31 +26,34 @@ import type {
 export function processKLineContainment(klines: KLineData[]): ProcessedKLine[] {
   if (klines.length === 0) return [];
 
+  // 直接读取列式存储，避免逐根访问对象属性
+  const { time, open, high, low, close, volume } = getKLineStore(klines);
   const result: ProcessedKLine[] = [];
 
   // 第一根K线直接添加
   result.push({
     index: 0,
-    timestamp: klines[0].date,
-    open: klines[0].open,
-    high: klines[0].high,
-    low: klines[0].low,
-    close: klines[0].close,
-    volume: klines[0].volume,
+    timestamp: time[0],
+    open: open[0],
+    high: high[0],
+    low: low[0],
+    close: close[0],
+    volume: volume[0],
     highIndex: 0,
-    highTimestamp: klines[0].date,
+    highTimestamp: time[0],
     lowIndex: 0,
-    lowTimestamp: klines[0].date,
+    lowTimestamp: time[0],
   });
 
   for (let i = 1; i < klines.length; i++) {
-    const current = klines[i];
+    const currentHigh = high[i];
+    const currentLow = low[i];
     const previous = result[result.length - 1];
 
     // 检查是否存在包含关系
     const isContained =
-      (current.high <= previous.high && current.low >= previous.low) || // 当前K线被包含
-      (current.high >= previous.high && current.low <= previous.low); // 当前K线包含前一根
+      (currentHigh <= previous.high && currentLow >= previous.low) || // 当前K线被包含
+      (currentHigh >= previous.high && currentLow <= previous.low); // 当前K线包含前一根
 
     if (isContained) {
       // 判断走势方向：如果有至少两根K线，则通过比较来判断方向
@@ -59,42 +63,42 @@ export function processKLineContainment(klines: KLineData[]): ProcessedKLine[] {
         isUpTrend = previous.high >= beforePrevious.high;
       } else {
         // 如果只有一根K线，通过当前K线的收盘价和开盘价判断
-        isUpTrend = current.close >= current.open;
+        isUpTrend = close[i] >= open[i];
       }
 
       // 根据走势方向合并K线
       if (isUpTrend) {
         // 向上走势：取高点中的较高值和低点中的较高值
-        const newHigh = Math.max(previous.high, current.high);
-        const newLow = Math.max(previous.low, current.low);
+        const newHigh = Math.max(previous.high, currentHigh);
+        const newLow = Math.max(previous.low, currentLow);
 
         // 如果当前K线的高点更高，则更新高点位置
-        if (current.high > previous.high) {
+        if (currentHigh > previous.high) {
           previous.highIndex = i;
-          previous.highTimestamp = current.date;
+          previous.highTimestamp = time[i];
         }
         // 如果当前K线的低点更高，则更新低点位置
-        if (current.low > previous.low) {
+        if (currentLow > previous.low) {
           previous.lowIndex = i;
-          previous.lowTimestamp = current.date;
+          previous.lowTimestamp = time[i];
         }
 
         previous.high = newHigh;
         previous.low = newLow;
       } else {
         // 向下走势：取高点中的较低值和低点中的较低值
-        const newHigh = Math.min(previous.high, current.high);
-        const newLow = Math.min(previous.low, current.low);
+        const newHigh = Math.min(previous.high, currentHigh);
+        const newLow = Math.min(previous.low, currentLow);
 
         // 如果当前K线的高点更低，则更新高点位置
-        if (current.high < previous.high) {
+        if (currentHigh < previous.high) {
           previous.highIndex = i;
-          previous.highTimestamp = current.date;
+          previous.highTimestamp = time[i];
         }
         // 如果当前K线的低点更低，则更新低点位置
-        if (current.low < previous.low) {
+        if (currentLow < previous.low) {
           previous.lowIndex = i;
-          previous.lowTimestamp = current.date;
+          previous.lowTimestamp = time[i];
         }
 
         previous.high = newHigh;
@@ -103,24 +107,24 @@ export function processKLineContainment(klines: KLineData[]): ProcessedKLine[] {
 
       // 更新时间戳、收盘价和成交量
       // 时间戳更新为最新的K线时间
-      previous.timestamp = current.date;
+      previous.timestamp = time[i];
       previous.index = i; // 同时更新索引为当前K线的索引
-      previous.close = current.close;
-      previous.volume += current.volume;
+      previous.close = close[i];
+      previous.volume += volume[i];
     } else {
       // 不存在包含关系，直接添加
       result.push({
         index: i,
-        timestamp: current.date,
-        open: current.open,
-        high: current.high,
-        low: current.low,
-        close: current.close,
-        volume: current.volume,
+        timestamp: time[i],
+        open: open[i],
+        high: currentHigh,
+        low: currentLow,
+        close: close[i],
+        volume: volume[i],
         highIndex: i,
-        highTimestamp: current.date,
+        highTimestamp: time[i],
         lowIndex: i,
-        lowTimestamp: current.date,
+        lowTimestamp: time[i],
       });
     }
   }
@@ -325,6 +329,8 @@ export function identifyPens(klines: KLineData[], fractals: Fractal[]): Pen[] {
 
   if (fractals.length < 2) return pens;
 
+  const { high, low } = getKLineStore(klines);
+
   // 遍历相邻的分型对，构建笔
   for (let i = 0; i < fractals.length - 1; i++) {
     const currentFractal = fractals[i];
@@ -347,8 +353,7 @@ export function identifyPens(klines: KLineData[], fractals: Fractal[]): Pen[] {
       endPrice = nextFractal.price; // 顶分型的高点
 
       // 检查有效性：顶分型的高点必须 > 底分型的高点
-      const bottomHigh =
-        klines[currentFractal.index]?.high || currentFractal.price;
+      const bottomHigh = high[currentFractal.index] || currentFractal.price;
       if (endPrice <= bottomHigh) {
         continue; // 不是有效的向上笔
       }
@@ -359,7 +364,7 @@ export function identifyPens(klines: KLineData[], fractals: Fractal[]): Pen[] {
       endPrice = nextFractal.price; // 底分型的低点
 
       // 检查有效性：底分型的低点必须 < 顶分型的低点
-      const topLow = klines[currentFractal.index]?.low || currentFractal.price;
+      const topLow = low[currentFractal.index] || currentFractal.price;
       if (endPrice >= topLow) {
         continue; // 不是有效的向下笔
       }
@@ -397,14 +402,17 @@ export function analyzeChanLun(klines: KLineData[]): {
   fractals: Fractal[];
   pens: Pen[];
 } {
-  // 1. 识别分型
-  const fractals = identifyFractals(klines);
-
-  // 2. 识别笔
-  const pens = identifyPens(klines, fractals);
-
-  return {
-    fractals,
-    pens,
-  };
+  // 分析结果缓存在列式存储上，同一份数据切换模式或重复渲染时不再重算
+  return getStoreView(getKLineStore(klines), "chanlun", () => {
+    // 1. 识别分型
+    const fractals = identifyFractals(klines);
+
+    // 2. 识别笔
+    const pens = identifyPens(klines, fractals);
+
+    return {
+      fractals,
+      pens,
+    };
+  });
 }
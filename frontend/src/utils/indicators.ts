@@ -2,6 +2,9 @@
  * 技术指标计算工具
  */
 
+import type { KLineStore } from "../types/stock";
+import { getStoreView } from "./klineStore";
+
 export interface MACDResult {
   time: string;
   dif: number; // DIF线（差离值）= 快线EMA - 慢线EMA
@@ -9,13 +12,25 @@ export interface MACDResult {
   macd: number; // MACD柱状图 = DIF - DEA
 }
 
+/**
+ * MACD 列式结果（与K线存储按索引对齐）
+ */
+export interface MACDColumns {
+  dif: Float64Array;
+  dea: Float64Array;
+  macd: Float64Array;
+}
+
 /**
  * 计算EMA（指数移动平均）
  * @param data 价格数据
  * @param period 周期
  */
-function calculateEMA(data: number[], period: number): number[] {
-  const ema: number[] = [];
+function calculateEMA(
+  data: ArrayLike<number>,
+  period: number
+): Float64Array {
+  const ema = new Float64Array(data.length);
   if (data.length === 0) return ema;
 
   const multiplier = 2 / (period + 1);
@@ -33,21 +48,21 @@ function calculateEMA(data: number[], period: number): number[] {
 
 /**
  * 计算MACD指标
- * @param prices 收盘价数组
+ * @param prices 收盘价数组（支持普通数组或 Float64Array 列）
  * @param fastPeriod 快线周期，默认12
  * @param slowPeriod 慢线周期，默认26
  * @param signalPeriod DEA周期，默认9
  */
 export function calculateMACD(
-  prices: number[],
+  prices: ArrayLike<number>,
   fastPeriod: number = 12,
   slowPeriod: number = 26,
   signalPeriod: number = 9
-): { dif: number[]; dea: number[]; macd: number[] } {
-  const result: { dif: number[]; dea: number[]; macd: number[] } = {
-    dif: [],
-    dea: [],
-    macd: [],
+): MACDColumns {
+  const result: MACDColumns = {
+    dif: new Float64Array(0),
+    dea: new Float64Array(0),
+    macd: new Float64Array(0),
   };
 
   if (prices.length === 0) {
@@ -60,7 +75,7 @@ export function calculateMACD(
 
   // 计算DIF（差离值）= 快线EMA - 慢线EMA
   // 从第一个数据点就开始计算
-  const difLine: number[] = [];
+  const difLine = new Float64Array(prices.length);
   for (let i = 0; i < prices.length; i++) {
     difLine[i] = emaFast[i] - emaSlow[i];
   }
@@ -70,7 +85,7 @@ export function calculateMACD(
 
   // 计算MACD柱状图 = (DIF - DEA) * 2
   // 注意：很多软件中MACD柱状图会乘以2来放大显示
-  const macdHistogram: number[] = [];
+  const macdHistogram = new Float64Array(prices.length);
   for (let i = 0; i < prices.length; i++) {
     macdHistogram[i] = (difLine[i] - deaLine[i]) * 2;
   }
@@ -113,3 +128,19 @@ export function calculateMACDFromKLineData(
 
   return results;
 }
+
+/**
+ * 从列式K线存储计算MACD（默认参数的结果缓存在存储上，多处调用共享）
+ */
+export function calculateMACDFromStore(
+  store: KLineStore,
+  fastPeriod: number = 12,
+  slowPeriod: number = 26,
+  signalPeriod: number = 9
+): MACDColumns {
+  return getStoreView(
+    store,
+    `macd:${fastPeriod}:${slowPeriod}:${signalPeriod}`,
+    ({ close }) => calculateMACD(close, fastPeriod, slowPeriod, signalPeriod)
+  );
+}
@@ -0,0 +1,77 @@
+/**
+ * 列式K线存储
+ *
+ * 每份加载的K线数组只在首次使用时转换为 Float64Array 列，
+ * 之后图表转换、MACD 和缠论计算都复用同一份列数据，
+ * 派生视图（图表数据、指标结果）按需生成并缓存在存储上，避免每次渲染重复分配。
+ */
+
+import type { KLineData, KLineStore } from "../types/stock";
+
+// 以原始数组引用为键缓存，数组被回收时存储随之释放
+const storeCache = new WeakMap<KLineData[], KLineStore>();
+
+/**
+ * 由K线数组构建列式存储
+ */
+export function createKLineStore(data: KLineData[]): KLineStore {
+  const length = data.length;
+  const time: string[] = new Array(length);
+  const open = new Float64Array(length);
+  const high = new Float64Array(length);
+  const low = new Float64Array(length);
+  const close = new Float64Array(length);
+  const volume = new Float64Array(length);
+
+  for (let i = 0; i < length; i++) {
+    const item = data[i];
+    time[i] = item.date;
+    open[i] = item.open;
+    high[i] = item.high;
+    low[i] = item.low;
+    close[i] = item.close;
+    volume[i] = item.volume;
+  }
+
+  return {
+    length,
+    time,
+    open,
+    high,
+    low,
+    close,
+    volume,
+    views: new Map(),
+  };
+}
+
+/**
+ * 获取K线数组对应的列式存储（同一数组引用只构建一次）
+ */
+export function getKLineStore(data: KLineData[]): KLineStore {
+  let store = storeCache.get(data);
+  if (!store) {
+    store = createKLineStore(data);
+    storeCache.set(data, store);
+  }
+  return store;
+}
+
+/**
+ * 获取存储上的派生视图，不存在时调用 build 生成并缓存
+ * @param store 列式存储
+ * @param key 视图名称
+ * @param build 视图构建函数
+ */
+export function getStoreView<T>(
+  store: KLineStore,
+  key: string,
+  build: (store: KLineStore) => T
+): T {
+  if (store.views.has(key)) {
+    return store.views.get(key) as T;
+  }
+  const view = build(store);
+  store.views.set(key, view);
+  return view;
+}